@@ -0,0 +1,16 @@
+"""
+pytest configuration. Tests live next to the code they test: the apps
+(`gestao_produtos3`, `gestao_viaturas3`) import their own modules as
+top level modules (pytest puts the directory of each test file in
+`sys.path`) and `gestao_comum` from this directory.
+"""
+
+import pathlib
+import sys
+
+
+ROOT_DIR = str(pathlib.Path(__file__).resolve().parent)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+collect_ignore_glob = ['.venv/*']
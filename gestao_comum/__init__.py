@@ -0,0 +1,15 @@
+"""
+The record engine and utilities shared by the apps (`gestao_produtos3`
+and `gestao_viaturas3`):
+
+- `record_store`: keyed, indexed, in memory storage of records
+
+- `record_codec`: CSV parsing and formatting of records from a schema
+
+- `exporters`: streaming export of records to several formats
+
+- `background_save`: saving of a snapshot in a background thread
+
+- `utils`, `console_utils`: file system, memory and console utilities
+
+"""
@@ -0,0 +1,134 @@
+"""
+Saves (exports) records in a background thread, so that a console
+client stays responsive while a large collection is written to disk.
+This module provides:
+
+- `BackgroundSave`: exports a snapshot of the records to a file in a
+  background thread, tracking its progress
+
+- `SaveProgress`: rows written, throughput and ETA of a save
+
+"""
+
+from collections import namedtuple
+import os
+import threading
+import time
+from typing import Iterable
+
+from .exporters import Formatter, export
+from .record_store import StoreSnapshot
+
+
+__all__ = [
+    'BackgroundSave',
+    'SaveProgress',
+]
+
+
+SaveProgress = namedtuple('SaveProgress', 'rows total bytes elapsed mb_per_sec eta')
+
+
+class BackgroundSave:
+    """
+    Exports `records` to `file_path` with `formatter`. The save writes
+    a consistent snapshot even if the collection changes while it runs:
+    `records` should be a `StoreSnapshot` (see `RecordStore.snapshot`);
+    other iterables are copied when the save is created. Data is
+    written to a temporary file that only replaces `file_path` if the
+    export succeeds.
+    """
+    def __init__(
+            self,
+            records: Iterable,
+            file_path: str,
+            formatter: Formatter,
+            encoding = 'UTF-8',
+    ):
+        self.file_path = file_path
+        self._records = records if isinstance(records, StoreSnapshot) else list(records)
+        self._formatter = formatter
+        self._encoding = encoding
+        self._rows = 0
+        self._bytes = 0
+        self._start = 0.0
+        self._end: float | None = None
+        self.error: Exception | None = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target = self._run, daemon = True)
+    #:
+
+    def start(self) -> 'BackgroundSave':
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+    #:
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits for the save to finish. Returns `True` if it finished.
+        """
+        return self._done.wait(timeout)
+    #:
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+    #:
+
+    @property
+    def succeeded(self) -> bool:
+        return self.done and self.error is None
+    #:
+
+    def progress(self) -> SaveProgress:
+        rows, num_bytes, total = self._rows, self._bytes, len(self._records)
+        end = self._end if self._end is not None else time.perf_counter()
+        elapsed = max(end - self._start, 1e-9)
+        rows_per_sec = rows / elapsed
+        eta = (total - rows) / rows_per_sec if rows_per_sec else None
+        return SaveProgress(rows, total, num_bytes, elapsed, num_bytes / elapsed / 2**20, eta)
+    #:
+
+    def status_msg(self) -> str:
+        prog = self.progress()
+        if self.done:
+            if self.error is not None:
+                return f"Erro ao guardar {self.file_path}: {self.error}"
+            return (
+                f"Guardados {prog.rows} registos em {self.file_path} "
+                f"({prog.elapsed:.1f}s, {prog.mb_per_sec:.1f} MB/s)"
+            )
+        percent = 100 * prog.rows / prog.total if prog.total else 100
+        eta = f"{prog.eta:.0f}s" if prog.eta is not None else "?"
+        return (
+            f"A guardar {self.file_path}: {prog.rows}/{prog.total} registos "
+            f"({percent:.0f}%, {prog.mb_per_sec:.1f} MB/s, ETA {eta})"
+        )
+    #:
+
+    def _run(self):
+        tmp_path = f'{self.file_path}.tmp'
+        try:
+            export(
+                self._records,
+                tmp_path,
+                self._formatter,
+                encoding = self._encoding,
+                progress_fn = self._update_progress,
+            )
+            os.replace(tmp_path, self.file_path)
+        except Exception as ex:
+            self.error = ex
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            self._end = time.perf_counter()
+            self._done.set()
+    #:
+
+    def _update_progress(self, rows: int, num_bytes: int):
+        self._rows = rows
+        self._bytes = num_bytes
+    #:
+#:
@@ -13,9 +13,11 @@ __all__ = [
     'show_msg',
     'confirm',
     'ask',
-    'show_msg',
     'show_msgs',
     'show_table',
+    'table_header',
+    'table_row_formatter',
+    'progress_bar',
     'pause',
     'cls',
 ]
@@ -144,7 +146,7 @@ def confirm(msg: str, default = '', indent = DEFAULT_INDENTATION) -> bool:
                     return default == 'Y'
                 show_msg("An explicit answer is required. Please answer Y or N.", indent = indent)
             case _:
-                print("Please answer Y or N.")
+                show_msg("Please answer Y or N.", indent = indent)
 #:
 
 def ask(msg: str, indent = DEFAULT_INDENTATION) -> str:
@@ -167,6 +169,22 @@ def show_table(
         *show_args, 
         **show_kargs
 ):
+    format_row = table_row_formatter(col_defs)
+    data_lines = [format_row(elem) for elem in elements]
+
+    if not data_lines:
+        raise ValueError('Asked to generate table for empty collection/iterable.')
+
+    # Now show everything 
+    show_msgs(table_header(col_defs), *show_args, **show_kargs)
+    show_msgs(data_lines, *show_args, **show_kargs)
+#:
+
+def table_header(col_defs: dict[str, dict]) -> list[str]:
+    """
+    The HEADER line of a table with columns `col_defs` (see
+    `show_table`) and the SEPARATOR line between HEADER and DATA.
+    """
     # Generate HEADER
     header_fmt = ' | '.join(f"{{:^{col['width']}}}" for col in col_defs.values())
     header = header_fmt.format(*(col['name'] for col in col_defs.values()))
@@ -183,38 +201,47 @@ def show_table(
             f"{'-' * (col_defs_values[-1]['width'] + 1)}",
         ]
     )
+    return [header, sep]
+#:
 
-    # Generate DATA LINES
+def table_row_formatter(col_defs: dict[str, dict]):
+    """
+    Returns a function that generates the DATA line of a table with
+    columns `col_defs` (see `show_table`) for one element.
+    """
     def data_field_fmt_spec(col_def: dict) -> str:
         align = f"{col_def['align']}"
         width = f"{col_def['width']}"
         return f"{{:{align}{width}}}"
     #:
     data_line_fmt = ' | '.join(
-        data_field_fmt_spec(col_def) for col_def in col_defs_values
+        data_field_fmt_spec(col_def) for col_def in col_defs.values()
     )
 
-    data_lines = []
-    for elem in elements:
+    def format_row(elem) -> str:
         args = []
         for attr, col_def in col_defs.items():
             val = getattr(elem, attr)
             convert_fn = col_def.get('convert_fn', lambda x: x)
             val = convert_fn(val)
             if 'decimal_places' in col_def:
-                decimal_places_fmt = f'{{:.{col_def['decimal_places']}f}}' 
+                decimal_places_fmt = f'{{:.{col_def["decimal_places"]}f}}' 
                 val = decimal_places_fmt.format(val)
             unit = col_def.get('unit', '')
             args.append(f'{val}{unit}')
-        data_lines.append(data_line_fmt.format(*args))
-
-    if not data_lines:
-        raise ValueError('Asked to generate table for empty collection/iterable.')
+        return data_line_fmt.format(*args)
+    #:
+    return format_row
+#:
 
-    # Now show everything 
-    show_msg(header, *show_args, **show_kargs)
-    show_msg(sep, *show_args, **show_kargs)
-    show_msgs(data_lines, *show_args, **show_kargs)
+def progress_bar(fraction: float, width = 30) -> str:
+    """
+    >>> progress_bar(0.5, width = 10)
+    '[#####-----]  50%'
+    """
+    fraction = min(max(fraction, 0.0), 1.0)
+    done = round(fraction * width)
+    return f"[{'#' * done}{'-' * (width - done)}] {fraction:4.0%}"
 #:
 
 def pause(msg: str="Pressione ENTER para continuar...", indent = DEFAULT_INDENTATION):
@@ -246,84 +273,3 @@ def cls():
 def posix_shell_in_use() -> str:
     return os.environ.get('SHELL', '/bin/sh')
 #:
-
-
-"""
-PROGRAMAÇÃO FUNCIONAL (INTRO);
-
-# def filtra_pares(nums: Iterable) -> list:
-#     encontrados = []
-#     for num in nums:
-#         if num % 2 == 0:
-#             encontrados.append(num)
-#     return encontrados
-# #:
-
-# def filtra_positivos(nums: Iterable) -> list:
-#     encontrados = []
-#     for num in nums:
-#         if num > 0:
-#             encontrados.append(num)
-#     return encontrados
-# #:
-
-# criterio -> função que recebe um elemento e devolve ou True ou False
-#             (ou seja, é uma função booleana)
-
-nums = [10, -20, 31, 44, 73]
-nomes = ('Alberto', 'Ana', 'Arnaldo', 'Zé')
-
-def filtra(elems: Iterable, criterio) -> list:
-    encontrados = []
-    for elem in elems:
-        if criterio(elem):
-            encontrados.append(elem)
-    return encontrados
-#:
-
-def is_positive(num) -> bool:
-    return num > 0
-#:
-
-def cinco_ou_mais(txt: str) -> bool:
-    return len(txt) >= 5
-#:
-
-filtra(nums, is_positive)
-filtra(nomes, cinco_ou_mais)
-
-filtra(nums, lambda num: num > 0)
-filtra(nomes, lambda nome: len(nome) >= 5)
-
-
-# EM PSEUDO-JS:
-# 
-# filtra(nums, (num) => num > 0)
-# filtra(nums, function(num) { 
-#     return num > 0;
-# })
-
-"""
-
-# col_defs1 = [
-#     {'attr': 'id','name': 'ID', 'align': '^', 'width': 8},
-#     {'attr': 'name','name': 'Nome', 'align': '<', 'width': 26},
-#     {'attr': 'prod_type','name': 'Tipo', 'align': '<', 'width': 8},
-#     {'attr': 'quantity','name': 'Quantidade', 'align': '>', 'width': 16},
-#     {'attr': 'price','name': 'Preço', 'align': '>', 'width': 14, 'decimal_places': 2},
-# ]
-
-# import products
-# elements1 = products.ProductCollection.from_csv('products.csv')
-# show_table(elements1, col_defs1)
-
-# col_defs2 = [
-#     {'attr': 'firstname', 'name': 'First Name', 'align': '^', 'width': 10},
-# ]
-# class Person:
-#     def __init__(self, firstname):
-#         self.firstname = firstname
-
-# elements2 = [Person('Manel'), Person('Fernando')]
-# show_table(elements2, col_defs2)
-
@@ -0,0 +1,172 @@
+"""
+Streams records (from a collection, a view, a search generator, ...)
+to a file in one of several formats. Records are formatted and written
+in batches, so memory use doesn't depend on the number of records.
+This module provides:
+
+- `Formatter`: the interface of a format; `CSVFormatter`,
+  `JSONLinesFormatter` and `FixedWidthFormatter` implement it
+
+- `FORMATS`: maps a format name to a function that creates its
+  formatter (see `register_format` to add new formats)
+
+- `export`: writes records to a file with a formatter
+
+"""
+
+from abc import ABC, abstractmethod
+from collections import namedtuple
+import json
+import time
+from typing import Iterable
+
+from .console_utils import table_header, table_row_formatter
+from .record_codec import RecordCodec
+
+
+__all__ = [
+    'Formatter',
+    'CSVFormatter',
+    'JSONLinesFormatter',
+    'FixedWidthFormatter',
+    'FORMATS',
+    'register_format',
+    'make_formatter',
+    'ExportStats',
+    'export',
+]
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+ExportStats = namedtuple('ExportStats', 'rows bytes elapsed')
+
+
+class Formatter(ABC):
+    """
+    Converts records to lines of text. Subclasses must implement
+    `format` and may implement `header` and `footer` (the lines written
+    before and after the records). Lines have no line terminator.
+    """
+    def header(self) -> list[str]:
+        return []
+    #:
+
+    @abstractmethod
+    def format(self, rec) -> str:
+        pass
+    #:
+
+    def footer(self) -> list[str]:
+        return []
+    #:
+#:
+
+class CSVFormatter(Formatter):
+    def __init__(self, codec: RecordCodec):
+        self._format = codec.format
+    #:
+
+    def format(self, rec) -> str:
+        return self._format(rec)
+    #:
+#:
+
+class JSONLinesFormatter(Formatter):
+    """
+    One JSON object per record with the fields of `codec`. Values
+    without a JSON type (eg, `Decimal` or dates) are written as text.
+    """
+    def __init__(self, codec: RecordCodec):
+        self._names = tuple(field.name for field in codec.fields)
+        self._encode = json.JSONEncoder(ensure_ascii = False, default = str).encode
+    #:
+
+    def format(self, rec) -> str:
+        return self._encode({name: getattr(rec, name) for name in self._names})
+    #:
+#:
+
+class FixedWidthFormatter(Formatter):
+    """
+    The layout of `console_utils.show_table` (one column per entry of
+    `col_defs`), ready to be printed.
+    """
+    def __init__(self, col_defs: dict[str, dict]):
+        self._col_defs = col_defs
+        self._format = table_row_formatter(col_defs)
+    #:
+
+    def format(self, rec) -> str:
+        return self._format(rec)
+    #:
+
+    def header(self) -> list[str]:
+        return table_header(self._col_defs)
+    #:
+#:
+
+FORMATS = {
+    'csv': lambda codec, col_defs: CSVFormatter(codec),
+    'jsonl': lambda codec, col_defs: JSONLinesFormatter(codec),
+    'txt': lambda codec, col_defs: FixedWidthFormatter(col_defs),
+}
+
+
+def register_format(name: str, make_fn):
+    """
+    Adds (or replaces) the format `name`. `make_fn` is called with the
+    `RecordCodec` of the records and the column definitions used by
+    `show_table`, and must return a `Formatter`.
+    """
+    FORMATS[name] = make_fn
+#:
+
+def make_formatter(name: str, codec: RecordCodec, col_defs: dict[str, dict]) -> Formatter:
+    if name not in FORMATS:
+        raise ValueError(f"Formato {name} desconhecido (deve ser um de {tuple(FORMATS)})")
+    return FORMATS[name](codec, col_defs)
+#:
+
+def export(
+        records: Iterable,
+        file_path: str,
+        formatter: Formatter,
+        encoding = 'UTF-8',
+        batch_size = DEFAULT_BATCH_SIZE,
+        progress_fn = None,
+) -> ExportStats:
+    """
+    Writes `records` to `file_path` in the format of `formatter`.
+    Records are written in batches of `batch_size` lines. After each
+    batch, `progress_fn` (if given) is called with the number of rows
+    and bytes written so far.
+    """
+    start = time.perf_counter()
+    rows = num_bytes = 0
+    format_ = formatter.format
+    with open(file_path, 'wb') as file:
+        def write_lines(lines: list[str]):
+            nonlocal num_bytes
+            data = ''.join(f'{line}\n' for line in lines).encode(encoding)
+            file.write(data)
+            num_bytes += len(data)
+        #:
+
+        write_lines(formatter.header())
+        batch = []
+        for rec in records:
+            batch.append(format_(rec))
+            if len(batch) >= batch_size:
+                write_lines(batch)
+                rows += len(batch)
+                batch.clear()
+                if progress_fn:
+                    progress_fn(rows, num_bytes)
+        write_lines(batch)
+        rows += len(batch)
+        write_lines(formatter.footer())
+    if progress_fn:
+        progress_fn(rows, num_bytes)
+    return ExportStats(rows, num_bytes, time.perf_counter() - start)
+#:
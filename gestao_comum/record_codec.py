@@ -0,0 +1,101 @@
+"""
+Parses and formats records from/to delimited text (eg, a CSV line).
+Records are described by a schema, a sequence of `Field`s. The
+converter and formatter of each field are chosen only once, when the
+codec is created (typically, at import time). This module provides:
+
+- `Field`: describes one field of a record
+
+- `RecordCodec`: parses and formats the records of a schema for a
+  delimiter
+
+"""
+
+from collections import namedtuple
+from decimal import Decimal
+from operator import call
+
+
+__all__ = [
+    'Field',
+    'RecordCodec',
+]
+
+
+# Converters that ignore whitespace around the text themselves, so the
+# text of their fields isn't stripped before
+SELF_STRIPPING_CONVERTERS = (int, float, Decimal)
+
+Field = namedtuple('Field', 'name type converter formatter strip', defaults = (None, None, True))
+Field.__doc__ = """
+A field of a record:
+    - name: name of the record attribute with the field value
+    - type: type of the value given to the record (`str`, `int`, ...)
+    - converter: converts the text to the value; defaults to `type`
+      (no conversion for `str`)
+    - formatter: converts the value to text; defaults to `str` (no
+      conversion for `str`)
+    - strip: whether to strip whitespace around the text of the field
+"""
+
+
+class RecordCodec:
+    def __init__(self, fields: tuple[Field, ...], delim: str):
+        if not fields:
+            raise ValueError("Esquema sem campos")
+        self.fields = tuple(fields)
+        self.delim = delim
+        self._converters = tuple(_field_converter(field) for field in self.fields)
+        self._formatters = tuple(
+            (field.name, field.formatter or str) for field in self.fields
+        )
+        self._by_delim = {delim: self}
+    #:
+
+    def for_delim(self, delim: str) -> 'RecordCodec':
+        """
+        The codec for the same schema but another delimiter (created on
+        the first request and cached).
+        """
+        codec = self._by_delim.get(delim)
+        if codec is None:
+            codec = self._by_delim[delim] = RecordCodec(self.fields, delim)
+        return codec
+    #:
+
+    def parse(self, line: str) -> tuple:
+        """
+        Returns a tuple with the values of the fields in `line`, in
+        schema order.
+        """
+        texts = line.split(self.delim)
+        if len(texts) != len(self._converters):
+            raise ValueError(
+                f"Linha com número de campos inválido (esperados {len(self._converters)}): {line!r}"
+            )
+        return tuple(map(call, self._converters, texts))
+    #:
+
+    def format(self, rec) -> str:
+        return self.delim.join([format_(getattr(rec, name)) for name, format_ in self._formatters])
+    #:
+
+    def __repr__(self) -> str:
+        cls_name = self.__class__.__name__
+        return f'{cls_name}({list(self.fields)!r}, {self.delim!r})'
+    #:
+#:
+
+def _field_converter(field: Field):
+    """
+    The function that converts the text of `field` to its value.
+    Fields converted by one of the `SELF_STRIPPING_CONVERTERS` aren't
+    stripped first.
+    """
+    converter = field.converter or (None if field.type is str else field.type)
+    if converter is None:
+        return str.strip if field.strip else str
+    if not field.strip or converter in SELF_STRIPPING_CONVERTERS:
+        return converter
+    return lambda text: converter(text.strip())
+#:
@@ -0,0 +1,925 @@
+"""
+A generic, in memory, store of records (eg, products or vehicles)
+identified by a key field. The kind of record kept by a store is
+declared by a schema. This modules provides:
+
+- `StoreSchema`: declares the record type, the key field, the typed
+  fields (through a `RecordCodec`), validators and indexes
+
+- `RecordStore`: keyed storage of records with secondary indexes,
+  iteration, search, bulk import and CSV I/O. Concrete collections
+  subclass it and define their `schema`.
+
+- `HashIndex`: a secondary index mapping a value to the records with
+  that value
+
+- `SortedIndex`: a secondary index, sorted by value, for range queries
+
+- `StoreSnapshot`: an immutable view of the records of a store, taken
+  in constant time (see `RecordStore.snapshot`)
+
+- `CancelToken`: allows other threads to cancel a load
+
+"""
+
+import bisect
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import math
+from operator import attrgetter
+import os
+import sys
+import threading
+import time
+from typing import Iterable, TextIO
+
+from .record_codec import RecordCodec
+from .utils import memory_usage_report
+
+
+__all__ = [
+    'StoreSchema',
+    'RecordStore',
+    'StoreSnapshot',
+    'HashIndex',
+    'hash_index',
+    'SortedIndex',
+    'sorted_index',
+    'ImportReport',
+    'GetManyResult',
+    'IMPORT_POLICIES',
+    'LoadProgress',
+    'CancelToken',
+    'DuplicateValue',
+    'InvalidLine',
+    'LoadCancelled',
+    'relevant_lines',
+    'parsed_records',
+]
+
+
+IMPORT_POLICIES = ('insert', 'update', 'skip')
+PROGRESS_EVERY = 10_000
+# Up to this many new entries are inserted into a `SortedIndex` one by
+# one; more are merged with a single sort
+SORTED_INSERT_MAX = 16
+
+ImportReport = namedtuple('ImportReport', 'inserted updated skipped')
+
+GetManyResult = namedtuple('GetManyResult', 'found missing')
+GetManyResult.__doc__ = """
+Result of a `get_many`: `found` maps each key found to its record, in
+the order of the requested keys; `missing` lists the keys not found
+(each once, in the order requested).
+"""
+
+LoadProgress = namedtuple('LoadProgress', 'bytes_read total_bytes rows rows_per_sec')
+
+StoreSchema = namedtuple(
+    'StoreSchema',
+    'record_type key codec validators indexes comment_prefixes duplicate_msg',
+    defaults = ((), {}, ('#',), 'Registo já existe com chave {}'),
+)
+StoreSchema.__doc__ = """
+Declares the records kept by a `RecordStore`:
+    - record_type: the class of the records; it's called with the
+      values parsed by `codec` (in schema order) to build a record
+    - key: name of the attribute that identifies a record
+    - codec: `RecordCodec` with the (typed) fields of a record
+    - validators: functions called with each record added to the
+      store; they should raise an exception if the record is invalid
+    - indexes: maps the name of each secondary index to a function
+      that creates an empty index (see `HashIndex`)
+    - comment_prefixes: CSV lines starting with these are ignored
+    - duplicate_msg: message for `DuplicateValue` (`{}` is the key)
+"""
+
+
+class HashIndex:
+    """
+    Maps `key_fn(record)` to the records with that value (in insertion
+    order). Query values are converted with `convert_fn` (the same
+    conversion `key_fn` applies to the record fields, eg,
+    `str.casefold`). Every index used by a `RecordStore` provides the
+    methods `add`, `remove`, `clear` and `memory_usage` (and `swap`,
+    for stores that replace records without holding the store lock).
+    """
+    def __init__(self, key_fn, convert_fn = None):
+        self.key_fn = key_fn
+        self.convert_fn = convert_fn or (lambda value: value)
+        self._buckets: dict[object, dict] = {}
+    #:
+
+    def add(self, key, rec):
+        self._buckets.setdefault(self.key_fn(rec), {})[key] = rec
+    #:
+
+    def remove(self, key, rec):
+        value = self.key_fn(rec)
+        bucket = self._buckets[value]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[value]
+    #:
+
+    def swap(self, key, old_rec, new_rec):
+        """
+        Replaces `old_rec` by `new_rec`, which must have the same value,
+        in place. Unlike `remove` and `add`, no bucket is created or
+        dropped, so it's safe while other keys are being changed.
+        """
+        self._buckets[self.key_fn(old_rec)][key] = new_rec
+    #:
+
+    def clear(self):
+        self._buckets.clear()
+    #:
+
+    def get(self, value) -> list:
+        bucket = self._buckets.get(self.convert_fn(value))
+        return list(bucket.values()) if bucket else []
+    #:
+
+    def count(self, value) -> int:
+        bucket = self._buckets.get(self.convert_fn(value))
+        return len(bucket) if bucket else 0
+    #:
+
+    def counts(self) -> dict:
+        """
+        Maps each (converted) value to its number of records.
+        """
+        return {value: len(bucket) for value, bucket in self._buckets.items()}
+    #:
+
+    def values(self) -> list:
+        return list(self._buckets)
+    #:
+
+    def memory_usage(self) -> int:
+        return sys.getsizeof(self._buckets) + sum(
+            sys.getsizeof(bucket) for bucket in self._buckets.values()
+        )
+    #:
+#:
+
+def hash_index(*field_names: str, convert_fn = None):
+    """
+    Returns a function that creates a `HashIndex` over `field_names`,
+    to be used in `StoreSchema.indexes`. With more than one field, the
+    index values (and query values) are tuples. If given, `convert_fn`
+    is applied to each field (eg, `str.casefold` for case insensitive
+    lookups).
+    """
+    get_fields = attrgetter(*field_names)
+    if convert_fn is None:
+        return lambda: HashIndex(get_fields)
+    if len(field_names) == 1:
+        return lambda: HashIndex(lambda rec: convert_fn(get_fields(rec)), convert_fn)
+
+    def convert_all(values: tuple) -> tuple:
+        return tuple(map(convert_fn, values))
+    #:
+    return lambda: HashIndex(lambda rec: convert_all(get_fields(rec)), convert_all)
+#:
+
+class SortedIndex:
+    """
+    Keeps `(key_fn(record), key, record)` entries sorted by value (and
+    then by key), for range queries with `bisect`. Query values are
+    converted with `convert_fn` (the same function `key_fn` applies to
+    the record field, eg, `date.toordinal`). New entries are kept
+    unsorted, by `(value, key)`, and merged, with one sort, on the next
+    query; thus, building the index or bulk loading costs O(n log n),
+    and not a list insertion per record, and removing a pending entry
+    costs O(1).
+    Queries may run without the store lock, while records are added or
+    removed by another thread, so changes and queries (merge included)
+    hold the index lock.
+    """
+    def __init__(self, key_fn, convert_fn = None):
+        self.key_fn = key_fn
+        self.convert_fn = convert_fn or (lambda value: value)
+        self._entries: list[tuple] = []
+        self._pending: dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+    #:
+
+    def add(self, key, rec):
+        value = self.key_fn(rec)
+        with self._lock:
+            self._pending[value, key] = (value, key, rec)
+    #:
+
+    def remove(self, key, rec):
+        # The entry is either still pending or among the sorted entries
+        # (no need to merge them first)
+        entry = (self.key_fn(rec), key)
+        with self._lock:
+            if self._pending.pop(entry, None) is not None:
+                return
+            entries = self._entries
+            pos = bisect.bisect_left(entries, entry)
+            if pos < len(entries) and entries[pos][:2] == entry:
+                del entries[pos]
+                return
+        raise KeyError(key)
+    #:
+
+    def swap(self, key, old_rec, new_rec):
+        """
+        Replaces `old_rec` by `new_rec`, which must have the same value,
+        in place (the entry keeps its position).
+        """
+        value = self.key_fn(old_rec)
+        entry = (value, key)
+        with self._lock:
+            if entry in self._pending:
+                self._pending[entry] = (value, key, new_rec)
+                return
+            entries = self._entries
+            pos = bisect.bisect_left(entries, entry)
+            if pos < len(entries) and entries[pos][:2] == entry:
+                entries[pos] = (value, key, new_rec)
+                return
+        raise KeyError(key)
+    #:
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+    #:
+
+    def get(self, value) -> list:
+        return self.range(value, value)
+    #:
+
+    def range(self, low, high) -> list:
+        """
+        Records with `low <= value <= high`, sorted by value. `None`
+        means no lower (or upper) limit.
+        """
+        with self._lock:
+            entries = self._sorted_entries()
+            start, end = self._bounds(entries, low, high)
+            return [rec for _, _, rec in entries[start:end]]
+    #:
+
+    def sorted_records(self, descending = False) -> list:
+        """
+        All records, sorted by value (ascending or descending) and then
+        by key (always ascending).
+        """
+        with self._lock:
+            entries = self._sorted_entries()
+            if not descending:
+                return [rec for _, _, rec in entries]
+            # Runs of entries with the same value, from the last to the
+            # first
+            records = []
+            end = len(entries)
+            while end:
+                value = entries[end - 1][0]
+                if end == 1 or entries[end - 2][0] != value:
+                    # A run of one entry (the usual case for unique values)
+                    records.append(entries[end - 1][2])
+                    end -= 1
+                    continue
+                start = bisect.bisect_left(entries, (value,), 0, end)
+                records.extend([rec for _, _, rec in entries[start:end]])
+                end = start
+            return records
+    #:
+
+    def count_range(self, low, high) -> int:
+        with self._lock:
+            entries = self._sorted_entries()
+            start, end = self._bounds(entries, low, high)
+            return max(end - start, 0)
+    #:
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            return (
+                sys.getsizeof(self._entries) + sys.getsizeof(self._pending)
+                + sum(sys.getsizeof(entry) for entry in self._entries)
+                + sum(sys.getsizeof(entry) for entry in self._pending.values())
+            )
+    #:
+
+    def _bounds(self, entries: list[tuple], low, high) -> tuple[int, int]:
+        # Values are compared as 1-tuples, which sort before any entry
+        # with the same value (low) and `(value, INF)` after any of
+        # them (high)
+        start = 0 if low is None else bisect.bisect_left(entries, (self.convert_fn(low),))
+        end = (
+            len(entries) if high is None
+            else bisect.bisect_left(entries, (self.convert_fn(high), _INF))
+        )
+        return start, end
+    #:
+
+    def _sorted_entries(self) -> list[tuple]:
+        # Called with the index lock held
+        pending = self._pending
+        if len(pending) <= SORTED_INSERT_MAX:
+            # A few changes: cheaper to insert them in place
+            for entry in pending.values():
+                bisect.insort(self._entries, entry)
+        else:
+            self._entries.extend(pending.values())
+            # Keys are unique, so records are never compared
+            self._entries.sort()
+        pending.clear()
+        return self._entries
+    #:
+#:
+
+def sorted_index(field_name: str, convert_fn = None):
+    """
+    Returns a function that creates a `SortedIndex` over `field_name`
+    (whose values are converted with `convert_fn`, if given), to be
+    used in `StoreSchema.indexes`.
+    """
+    get_field = attrgetter(field_name)
+    if convert_fn is None:
+        return lambda: SortedIndex(get_field)
+    return lambda: SortedIndex(lambda rec: convert_fn(get_field(rec)), convert_fn)
+#:
+
+class _Infinity:
+    """
+    Greater than anything else.
+    """
+    def __lt__(self, other) -> bool:
+        return False
+    #:
+
+    def __gt__(self, other) -> bool:
+        return True
+    #:
+#:
+
+_INF = _Infinity()
+
+class CancelToken:
+    """
+    Passed to a long running operation (eg, `RecordStore.from_csv`),
+    which periodically checks it and stops if it was cancelled. Safe to
+    cancel from any thread.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+    #:
+
+    def cancel(self):
+        self._event.set()
+    #:
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+    #:
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits until cancelled, or for `timeout` seconds. Returns whether
+        it was cancelled.
+        """
+        return self._event.wait(timeout)
+    #:
+#:
+
+class StoreSnapshot:
+    """
+    The records of a `RecordStore` as they were when
+    `RecordStore.snapshot` was called. The snapshot shares the
+    dictionary of the store, which the store copies before its next
+    change (copy-on-write), so a snapshot never changes. Records
+    themselves are shared with the store, not copied.
+    `version` is the number of changes made to the store before the
+    snapshot was taken: snapshots of a store with the same version
+    have the same records (eg, data derived from one snapshot may be
+    reused for the other).
+    """
+    __slots__ = ('_records', 'version')
+
+    def __init__(self, records: dict, version = 0):
+        self._records = records
+        self.version = version
+    #:
+
+    def search_by_id(self, key):
+        return self._records.get(key)
+    #:
+
+    def search(self, find_fn):
+        for rec in self._records.values():
+            if find_fn(rec):
+                yield rec
+    #:
+
+    def __iter__(self):
+        return iter(self._records.values())
+    #:
+
+    def __len__(self) -> int:
+        return len(self._records)
+    #:
+
+    def __contains__(self, key) -> bool:
+        return key in self._records
+    #:
+#:
+
+class RecordStore:
+    """
+    Subclasses must define the class attribute `schema`.
+    Changes to a store are serialized by a lock, so a store may be
+    shared between threads. Threads that iterate a store while others
+    change it should iterate a `snapshot` instead.
+    """
+    schema: StoreSchema
+
+    def __init__(self, records: Iterable = ()):
+        self._records: dict = {}
+        # Secondary indexes are only built when first used (see `index`)
+        # and then kept up to date
+        self._indexes: dict[str, object] = {}
+        self._lock = threading.RLock()
+        # Whether `_records` is shared with a snapshot (and must be
+        # copied before being changed)
+        self._shared = False
+        # Number of changes so far (see `StoreSnapshot.version`)
+        self._version = 0
+        for rec in records:
+            self.append(rec)
+    #:
+
+    @classmethod
+    def from_csv(
+            cls,
+            csv_path: str,
+            csv_delim: str | None = None,
+            encoding = 'UTF-8',
+            progress_fn = None,
+            progress_every = PROGRESS_EVERY,
+            cancel_token: CancelToken | None = None,
+    ):
+        """
+        Loads a store from a CSV file.
+        Every `progress_every` rows (and at the end), `progress_fn` is
+        called with a `LoadProgress` and `cancel_token` is checked: if
+        it was cancelled (possibly by another thread), the load stops
+        by raising `LoadCancelled`.
+        """
+        store = cls()
+        record_type = cls.schema.record_type
+        parse = cls._codec(csv_delim).parse
+        append = store.append
+        with open(csv_path, 'rt', encoding = encoding) as file:
+            lines = relevant_lines(file, cls.schema.comment_prefixes)
+            if progress_fn is None and cancel_token is None:
+                for line in lines:
+                    append(record_type(*parse(line)))
+                return store
+
+            # Rows are loaded in chunks of `progress_every` rows so that
+            # the inner loop stays the same as above
+            total_bytes = os.fstat(file.fileno()).st_size
+            start = time.perf_counter()
+            while True:
+                before = len(store)
+                for line in itertools.islice(lines, progress_every):
+                    append(record_type(*parse(line)))
+                finished = len(store) - before < progress_every
+                if progress_fn:
+                    rows = len(store)
+                    elapsed = max(time.perf_counter() - start, 1e-9)
+                    bytes_read = total_bytes if finished else file.buffer.tell()
+                    progress_fn(LoadProgress(bytes_read, total_bytes, rows, rows / elapsed))
+                if cancel_token and cancel_token.cancelled:
+                    raise LoadCancelled(f"Carregamento de {csv_path} cancelado")
+                if finished:
+                    return store
+    #:
+
+    def export_to_csv(self, csv_path: str, csv_delim: str | None = None, encoding = 'UTF-8'):
+        if len(self._records) == 0:
+            raise ValueError("Coleccção vazia")
+        format_ = self._codec(csv_delim).format
+        with open(csv_path, 'wt', encoding = encoding) as file:
+            for rec in self._records.values():
+                print(format_(rec), file=file)
+    #:
+
+    def import_csv(
+            self,
+            csv_path: str,
+            policy = 'skip',
+            csv_delim: str | None = None,
+            encoding = 'UTF-8',
+    ) -> ImportReport:
+        """
+        Imports the records in `csv_path` with `bulk_import`. An invalid
+        line raises `InvalidLine` and nothing is imported.
+        """
+        record_type = self.schema.record_type
+        parse = self._codec(csv_delim).parse
+        with open(csv_path, 'rt', encoding = encoding) as file:
+            return self.bulk_import(
+                parsed_records(
+                    file,
+                    lambda line: record_type(*parse(line)),
+                    self.schema.comment_prefixes,
+                ),
+                policy,
+            )
+    #:
+
+    def bulk_import(self, records: Iterable, policy = 'skip') -> ImportReport:
+        """
+        Imports many records at once, in linear time, using the key to
+        detect conflicts. `policy` decides what happens to a record
+        whose key is already in the store:
+
+            - 'insert': nothing is imported and `DuplicateValue` is raised
+            - 'update': the existing record is replaced by the imported one
+            - 'skip': the imported record is ignored
+
+        Duplicate keys within `records` follow the same policy.
+        """
+        if policy not in IMPORT_POLICIES:
+            raise ValueError(f"{policy=} inválida (deve ser uma de {IMPORT_POLICIES})")
+
+        key_of = attrgetter(self.schema.key)
+        records = list(records)
+        for rec in records:
+            self._validate(rec)
+        with self._lock:
+            if policy == 'insert':
+                seen = set(self._records)
+                for rec in records:
+                    key = key_of(rec)
+                    if key in seen:
+                        raise DuplicateValue(self.schema.duplicate_msg.format(key))
+                    seen.add(key)
+
+            inserted = updated = skipped = 0
+            for rec in records:
+                key = key_of(rec)
+                existing = self._records.get(key)
+                if existing is None:
+                    self._insert(key, rec)
+                    inserted += 1
+                elif policy == 'update':
+                    self._replace(key, existing, rec)
+                    updated += 1
+                else:
+                    skipped += 1
+        return ImportReport(inserted, updated, skipped)
+    #:
+
+    def append(self, rec):
+        self._validate(rec)
+        key = getattr(rec, self.schema.key)
+        with self._lock:
+            if key in self._records:
+                raise DuplicateValue(self.schema.duplicate_msg.format(key))
+            self._insert(key, rec)
+    #:
+
+    def snapshot(self) -> StoreSnapshot:
+        """
+        A consistent, immutable, view of the records in this store,
+        taken in O(1). Readers iterate the snapshot while writers keep
+        changing the store: the first change after a snapshot copies
+        the key -> record dictionary (once, not per snapshot).
+        """
+        with self._lock:
+            self._shared = True
+            return StoreSnapshot(self._records, self._version)
+    #:
+
+    def search_by_id(self, key):
+        return self._records.get(key)
+    #:
+
+    def get_many(self, keys: Iterable) -> GetManyResult:
+        """
+        Looks up many keys at once, while holding the lock (so all keys
+        see the same state of the store). The keys are collected before
+        taking the lock, so `keys` may be a slow iterator (eg, reading a
+        file) without blocking writers. The lookups cost about the same
+        as a loop of `search_by_id`.
+        """
+        keys = list(keys)
+        found = {}
+        missing = {}
+        with self._lock:
+            get = self._records.get
+            for key in keys:
+                rec = get(key)
+                if rec is None:
+                    missing[key] = None
+                else:
+                    found[key] = rec
+        return GetManyResult(found, list(missing))
+    #:
+
+    def search(self, find_fn):
+        for rec in self._records.values():
+            if find_fn(rec):
+                yield rec
+    #:
+
+    def search_by(self, index_name: str, value) -> list:
+        """
+        Records with `value` in the secondary index `index_name`.
+        """
+        return self.index(index_name).get(value)
+    #:
+
+    def count_by(self, index_name: str, value) -> int:
+        """
+        Number of records with `value` in the `HashIndex` `index_name`.
+        """
+        return self.index(index_name).count(value)
+    #:
+
+    def search_range(self, index_name: str, low, high) -> list:
+        """
+        Records with `low <= value <= high` in the `SortedIndex`
+        `index_name`, sorted by value. `None` means no limit.
+        """
+        return self.index(index_name).range(low, high)
+    #:
+
+    def sorted_by(self, *index_names: str) -> list:
+        """
+        All records sorted by the values in the `SortedIndex`es
+        `index_names`, the first being the most significant. A name
+        prefixed with '-' sorts by that index in descending order. Ties
+        are sorted by key.
+        The sorted index of the last name already holds the records in
+        order (the index is kept up to date as records change, and is
+        only sorted again after bulk changes); each other name is a
+        stable pass that groups records by value, in O(n), plus a sort
+        of the distinct values. So no `n log n` sort of records is
+        done per call.
+        """
+        if not index_names:
+            raise ValueError("Indique pelo menos um índice")
+        with self._lock:
+            *outer_names, inner_name = index_names
+            records = self.index(inner_name.lstrip('-')).sorted_records(inner_name.startswith('-'))
+            for name in reversed(outer_names):
+                index = self.index(name.lstrip('-'))
+                records = _group_by_value(records, index.key_fn, name.startswith('-'))
+            return records
+    #:
+
+    def parallel_search(
+            self,
+            find_fn,
+            max_workers: int | None = None,
+            chunk_size: int | None = None,
+            limit: int | None = None,
+    ) -> list:
+        """
+        Like `search`, but for expensive (CPU-bound) `find_fn`s. The
+        store is split into chunks of `chunk_size` records which are
+        searched by a pool of `max_workers` processes (by default, one
+        per CPU, and four chunks per worker). `find_fn` must be
+        picklable (eg, a module level function, not a lambda).
+        Results are returned in store order. If `limit` is given, only
+        the first `limit` matches are returned and pending chunks are
+        cancelled as soon as they are found.
+        """
+        records = list(self._records.values())
+        if not records or limit == 0:
+            return []
+        max_workers = max_workers or os.cpu_count() or 1
+        if chunk_size is None:
+            chunk_size = math.ceil(len(records) / (max_workers * 4))
+        if chunk_size <= 0:
+            raise ValueError(f"{chunk_size=} inválido (deve ser > 0)")
+
+        found = []
+        starts = range(0, len(records), chunk_size)
+        executor = ProcessPoolExecutor(max_workers = max_workers)
+        try:
+            futures = [
+                executor.submit(_search_chunk, find_fn, records[start:start + chunk_size], limit)
+                for start in starts
+            ]
+            for start, future in zip(starts, futures):
+                found.extend(records[start + i] for i in future.result())
+                if limit is not None and len(found) >= limit:
+                    return found[:limit]
+        finally:
+            executor.shutdown(cancel_futures = True)
+        return found
+    #:
+
+    def __iter__(self):
+        for rec in self._records.values():
+            yield rec
+    #:
+
+    def __len__(self) -> int:
+        return len(self._records)
+    #:
+
+    def remove_by_id(self, key):
+        with self._lock:
+            if key not in self._records:
+                return None
+            self._unshare()
+            rec = self._records.pop(key)
+            self._version += 1
+            for index in self._indexes.values():
+                index.remove(key, rec)
+        return rec
+    #:
+
+    def index(self, name: str):
+        """
+        The secondary index `name` (built on first use).
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(name)
+                if index is None:
+                    index = self.schema.indexes[name]()
+                    for key, rec in self._records.items():
+                        index.add(key, rec)
+                    self._indexes[name] = index
+        return index
+    #:
+
+    def memory_usage(self, deep = True) -> dict:
+        """
+        Bytes used by this store, broken down as described in
+        `utils.memory_usage_report`. Indexes: 'key_index' (the key ->
+        record dictionary) and each secondary index built so far.
+        """
+        indexes = {'key_index': sys.getsizeof(self._records)}
+        for name, index in self._indexes.items():
+            indexes[name] = index.memory_usage()
+        return memory_usage_report(self._records.values(), indexes, deep)
+    #:
+
+    def __getstate__(self) -> dict:
+        # Locks can't be pickled (eg, to return a store from a worker
+        # process). Secondary indexes are rebuilt when first used.
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_shared'] = False
+        state['_indexes'] = {}
+        return state
+    #:
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+    #:
+
+    def _unshare(self):
+        """
+        Copies `_records` if a snapshot shares it. Must be called, with
+        the lock held, before changing `_records`.
+        """
+        if self._shared:
+            self._records = dict(self._records)
+            self._shared = False
+    #:
+
+    def _insert(self, key, rec):
+        self._unshare()
+        self._records[key] = rec
+        self._version += 1
+        for index in self._indexes.values():
+            index.add(key, rec)
+    #:
+
+    def _replace(self, key, old_rec, new_rec):
+        self._unshare()
+        self._records[key] = new_rec
+        self._version += 1
+        for index in self._indexes.values():
+            index.remove(key, old_rec)
+            index.add(key, new_rec)
+    #:
+
+    def _validate(self, rec):
+        if not isinstance(rec, self.schema.record_type):
+            raise TypeError(f"{rec!r} não é do tipo {self.schema.record_type.__name__}")
+        for validator in self.schema.validators:
+            validator(rec)
+    #:
+
+    @classmethod
+    def _codec(cls, csv_delim: str | None) -> RecordCodec:
+        codec = cls.schema.codec
+        return codec if csv_delim is None else codec.for_delim(csv_delim)
+    #:
+
+    def _dump(self):
+        for rec in self._records.values():
+            print(rec)
+    #:
+#:
+
+def _search_chunk(find_fn, records: list, limit: int | None) -> list[int]:
+    """
+    Runs in a worker process. Returns the positions, within `records`,
+    of the records matching `find_fn` (at most `limit` of them).
+    """
+    found = []
+    for i, rec in enumerate(records):
+        if find_fn(rec):
+            found.append(i)
+            if limit is not None and len(found) >= limit:
+                break
+    return found
+#:
+
+def _group_by_value(records: list, value_fn, descending = False) -> list:
+    """
+    Stable sort of `records` by `value_fn(record)`, grouping the records
+    by value (so only the distinct values are sorted).
+    """
+    groups: dict = {}
+    for rec in records:
+        value = value_fn(rec)
+        group = groups.get(value)
+        if group is None:
+            groups[value] = [rec]
+        else:
+            group.append(rec)
+    sorted_records = []
+    for value in sorted(groups, reverse = descending):
+        sorted_records.extend(groups[value])
+    return sorted_records
+#:
+
+def relevant_lines(file: TextIO, comment_prefixes: tuple[str, ...] = ('#',)):
+    for line in file:
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        if line.startswith(comment_prefixes):
+            continue
+        yield line
+#:
+
+def parsed_records(file: TextIO, make_record, comment_prefixes: tuple[str, ...] = ('#',)):
+    """
+    The records built by `make_record` from the relevant lines of `file`
+    (see `relevant_lines`). A line rejected by `make_record` (with a
+    `ValueError`, eg, a wrong number of fields, or an `ArithmeticError`,
+    eg, an invalid decimal) raises `InvalidLine`.
+    """
+    for line_no, line in enumerate(file, 1):
+        line = line.strip()
+        if len(line) == 0 or line.startswith(comment_prefixes):
+            continue
+        try:
+            yield make_record(line)
+        except (ValueError, ArithmeticError) as ex:
+            raise InvalidLine(file.name, line_no, line, ex) from ex
+#:
+
+class DuplicateValue(Exception):
+    """
+    If there is a duplicate record (ie, with the same key) in a
+    RecordStore.
+    """
+#:
+
+class InvalidLine(ValueError):
+    """
+    A line of a CSV file that couldn't be parsed into a valid record.
+    The original error is in `error` (and `__cause__`).
+    """
+    def __init__(self, file_path: str, line_no: int, line: str, error: Exception):
+        # The messages of arithmetic errors (eg, `decimal.InvalidOperation`)
+        # aren't meant for users
+        detail = f"valor numérico inválido: {line!r}" if isinstance(error, ArithmeticError) else error
+        super().__init__(f"{file_path}, linha {line_no}: {detail}")
+        self.file_path = file_path
+        self.line_no = line_no
+        self.line = line
+        self.error = error
+    #:
+#:
+
+class LoadCancelled(Exception):
+    """
+    A load was cancelled through its `CancelToken`.
+    """
+#:
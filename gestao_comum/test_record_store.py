@@ -0,0 +1,203 @@
+"""
+Tests of `record_store.RecordStore` and its indexes, with a minimal
+record type.
+"""
+
+import threading
+
+import pytest
+
+from gestao_comum.record_codec import Field, RecordCodec
+from gestao_comum.record_store import (
+    DuplicateValue,
+    GetManyResult,
+    ImportReport,
+    RecordStore,
+    StoreSchema,
+    hash_index,
+    sorted_index,
+)
+
+
+class Item:
+    def __init__(self, code: int, group: str, size: int):
+        self.code = code
+        self.group = group
+        self.size = size
+    #:
+
+    def __repr__(self) -> str:
+        return f'Item({self.code}, {self.group!r}, {self.size})'
+    #:
+#:
+
+class ItemStore(RecordStore):
+    schema = StoreSchema(
+        record_type = Item,
+        key = 'code',
+        codec = RecordCodec((Field('code', int), Field('group', str), Field('size', int)), ','),
+        indexes = {
+            'group': hash_index('group'),
+            'size': sorted_index('size'),
+        },
+    )
+#:
+
+def make_store(count = 10) -> ItemStore:
+    return ItemStore(Item(code, 'par' if code % 2 == 0 else 'impar', code * 10) for code in range(count))
+#:
+
+
+def test_snapshot_is_isolated_from_later_changes():
+    store = make_store(5)
+    snapshot = store.snapshot()
+    store.append(Item(100, 'par', 1000))
+    store.remove_by_id(0)
+    store.bulk_import([Item(1, 'outro', 1)], 'update')
+
+    assert len(snapshot) == 5
+    assert 100 not in snapshot
+    assert snapshot.search_by_id(0).code == 0
+    assert snapshot.search_by_id(1).group == 'impar'
+    assert sorted(item.code for item in snapshot) == [0, 1, 2, 3, 4]
+
+    assert len(store) == 5
+    assert store.search_by_id(0) is None
+    assert store.search_by_id(1).group == 'outro'
+    assert store.snapshot().version > snapshot.version
+#:
+
+def test_snapshots_share_the_records_until_a_change():
+    store = make_store(3)
+    first = store.snapshot()
+    second = store.snapshot()
+    assert first.version == second.version
+    store.append(Item(50, 'par', 500))
+    third = store.snapshot()
+    assert len(first) == len(second) == 3
+    assert len(third) == 4
+#:
+
+def test_get_many_reports_missing_keys_once_in_request_order():
+    store = make_store(5)
+    result = store.get_many(iter([3, 99, 1, 3, 42, 99, 0]))
+    assert isinstance(result, GetManyResult)
+    assert list(result.found) == [3, 1, 0]
+    assert result.found[1] is store.search_by_id(1)
+    assert result.missing == [99, 42]
+#:
+
+def test_get_many_without_keys():
+    assert make_store(3).get_many([]) == GetManyResult({}, [])
+#:
+
+def test_sorted_index_range_and_counts():
+    store = make_store(10)
+    assert [item.code for item in store.search_range('size', 20, 50)] == [2, 3, 4, 5]
+    store.remove_by_id(3)
+    store.append(Item(33, 'impar', 35))
+    assert [item.code for item in store.search_range('size', 20, 50)] == [2, 33, 4, 5]
+    assert store.index('size').count_range(20, 50) == 4
+#:
+
+def test_sorted_index_range_under_concurrent_inserts():
+    store = make_store(0)
+    index = store.index('size')
+    num_threads = 4
+    per_thread = 500
+    errors = []
+    done = threading.Event()
+
+    def insert(first_code: int):
+        for code in range(first_code, first_code + per_thread):
+            store.append(Item(code, 'g', code))
+    #:
+
+    def query():
+        while not done.is_set():
+            sizes = [item.size for item in index.range(0, num_threads * per_thread)]
+            if sizes != sorted(sizes) or len(set(sizes)) != len(sizes):
+                errors.append(sizes)
+                return
+    #:
+
+    reader = threading.Thread(target = query)
+    reader.start()
+    writers = [
+        threading.Thread(target = insert, args = (n * per_thread,))
+        for n in range(num_threads)
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    done.set()
+    reader.join()
+
+    assert not errors
+    total = num_threads * per_thread
+    assert [item.size for item in index.range(0, total)] == list(range(total))
+    assert index.count_range(0, total) == total
+#:
+
+def test_bulk_import_insert_rejects_everything_on_a_conflict():
+    store = make_store(3)
+    with pytest.raises(DuplicateValue):
+        store.bulk_import([Item(10, 'par', 1), Item(2, 'par', 2)], 'insert')
+    assert len(store) == 3
+    assert store.search_by_id(10) is None
+#:
+
+def test_bulk_import_insert_rejects_duplicates_within_the_records():
+    store = make_store(3)
+    with pytest.raises(DuplicateValue):
+        store.bulk_import([Item(10, 'par', 1), Item(11, 'impar', 2), Item(10, 'par', 3)], 'insert')
+    assert len(store) == 3
+#:
+
+def test_bulk_import_update_last_record_wins():
+    store = make_store(3)
+    report = store.bulk_import(
+        [Item(1, 'a', 1), Item(10, 'b', 2), Item(10, 'c', 3), Item(1, 'd', 4)],
+        'update',
+    )
+    assert report == ImportReport(inserted = 1, updated = 3, skipped = 0)
+    assert store.search_by_id(1).group == 'd'
+    assert store.search_by_id(10).group == 'c'
+    assert [item.code for item in store.search_by('group', 'c')] == [10]
+    assert store.search_by('group', 'b') == []
+#:
+
+def test_bulk_import_skip_first_record_wins():
+    store = make_store(3)
+    report = store.bulk_import(
+        [Item(1, 'a', 1), Item(10, 'b', 2), Item(10, 'c', 3)],
+        'skip',
+    )
+    assert report == ImportReport(inserted = 1, updated = 0, skipped = 2)
+    assert store.search_by_id(1).group == 'impar'
+    assert store.search_by_id(10).group == 'b'
+#:
+
+def test_bulk_import_invalid_policy():
+    with pytest.raises(ValueError):
+        make_store(1).bulk_import([], 'replace')
+#:
+
+def test_import_csv_policies(tmp_path):
+    csv_path = tmp_path / 'items.csv'
+    csv_path.write_text('# code,group,size\n1,a,10\n7,b,70\n7,c,71\n', encoding = 'UTF-8')
+
+    store = make_store(3)
+    assert store.import_csv(str(csv_path), 'skip') == ImportReport(1, 0, 2)
+    assert store.search_by_id(7).group == 'b'
+
+    store = make_store(3)
+    assert store.import_csv(str(csv_path), 'update') == ImportReport(1, 2, 0)
+    assert store.search_by_id(7).group == 'c'
+
+    store = make_store(3)
+    with pytest.raises(DuplicateValue):
+        store.import_csv(str(csv_path), 'insert')
+    assert len(store) == 3
+#:
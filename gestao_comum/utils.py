@@ -3,10 +3,16 @@ Common general utilities.
 """
 
 from collections import namedtuple
+from datetime import date
+from decimal import Decimal
 import os
 import pathlib
 import subprocess
+import sys
 import tempfile
+import time
+import tracemalloc
+from typing import Iterable
 
 
 __all__ = [
@@ -17,7 +23,10 @@ __all__ = [
     'valid_path_for_file',
     'is_readable',
     'is_writable',
-    'is_special_entry'
+    'is_special_entry',
+    'AllocStats',
+    'measure_allocations',
+    'memory_usage_report',
 ]
 
 ################################################################################
@@ -210,4 +219,83 @@ def is_writable(path: pathlib.Path | str) -> bool:
 
 def path_exists(path: pathlib.Path | str) -> bool:
     return os.path.exists(path)
-#:
\ No newline at end of file
+#:
+
+################################################################################
+#
+#   MEMORY UTILS
+#
+################################################################################
+
+AllocStats = namedtuple('AllocStats', 'result allocated peak elapsed')
+
+
+def measure_allocations(fn, *args, **kargs) -> AllocStats:
+    """
+    Calls `fn(*args, **kargs)` while tracing memory allocations with
+    `tracemalloc`. Returns the result of the call, the number of bytes
+    allocated by the call and still alive when it returns, the peak
+    number of bytes allocated during the call and the elapsed time (in
+    seconds). Note that tracing slows down the call considerably.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        result = fn(*args, **kargs)
+        elapsed = time.perf_counter() - start
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return AllocStats(result, after - before, peak - before, elapsed)
+#:
+
+def memory_usage_report(
+        records: Iterable,
+        indexes: dict[str, int],
+        deep = True,
+) -> dict:
+    """
+    Builds the report returned by the `memory_usage` method of the
+    collections. `records` are objects with a `__dict__` and `indexes`
+    maps the name of each index, cache or container of the collection
+    to its (shallow) size in bytes. The report includes the bytes used
+    by:
+        - 'records': the record objects and their `__dict__`s
+    and, if `deep` is `True`, by their attributes:
+        - 'strings': `str` attributes
+        - 'numbers': numeric (`int`, `float`, `Decimal`) and date attributes
+        - 'other': any other attribute
+    Values shared by several records (eg, interned strings) are only
+    counted once. Sizes are given in bytes and 'total' adds them all.
+    """
+    report = {'records': 0}
+    if deep:
+        report.update(strings = 0, numbers = 0, other = 0)
+        seen = set()
+        for rec in records:
+            attrs = rec.__dict__
+            report['records'] += sys.getsizeof(rec) + sys.getsizeof(attrs)
+            for val in attrs.values():
+                if id(val) in seen:
+                    continue
+                seen.add(id(val))
+                if isinstance(val, str):
+                    category = 'strings'
+                elif isinstance(val, (int, float, Decimal, date)):
+                    category = 'numbers'
+                else:
+                    category = 'other'
+                report[category] += sys.getsizeof(val)
+    else:
+        getsizeof = sys.getsizeof
+        report['records'] = sum(getsizeof(rec) + getsizeof(rec.__dict__) for rec in records)
+    report['indexes'] = dict(indexes)
+    report['total'] = sum(report.get(cat, 0) for cat in ('records', 'strings', 'numbers', 'other'))
+    report['total'] += sum(indexes.values())
+    return report
+#:
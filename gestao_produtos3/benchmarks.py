@@ -0,0 +1,425 @@
+"""
+Benchmarks for the products module. Each benchmark runs over a
+synthetic catalog. Usage:
+
+    python benchmarks.py                  # lists available benchmarks
+    python benchmarks.py NAME [N]         # runs benchmark NAME with N products
+
+"""
+
+from decimal import Decimal as dec
+import os
+import pathlib
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+
+# `gestao_comum` is imported from the parent directory (see
+# `console_client`)
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+from products import (
+    ProductCollection,
+    Product,
+    InsufficientStock,
+    PRODUCT_TYPES,
+    PRODUCT_CODEC,
+    CSV_DELIM,
+    NUM_STOCK_STRIPES,
+)
+from sharded_products import ShardedProductCollection
+from gestao_comum.utils import measure_allocations
+
+
+WORDS = (
+    'pão', 'leite', 'queijo', 'fiambre', 'arroz', 'massa', 'azeite',
+    'sabão', 'detergente', 'ameixa', 'pêra', 'laranja', 'cenoura',
+    'batata', 'cebola', 'alho', 'iogurte', 'manteiga', 'bolacha',
+    'café', 'chá', 'milho', 'trigo', 'aveia', 'limão',
+)
+DEFAULT_NUM_PRODUCTS = 50_000
+
+
+def make_products(num_products: int, seed = 0) -> ProductCollection:
+    """
+    Generates a catalog with `num_products` valid products (at most
+    90000, the number of five digit ids).
+    """
+    rnd = random.Random(seed)
+    ids = rnd.sample(range(10_000, 100_000), num_products)
+    prod_types = tuple(PRODUCT_TYPES)
+    return ProductCollection(
+        Product(
+            id_,
+            ' '.join(rnd.choices(WORDS, k = rnd.randint(2, 4))),
+            rnd.choice(prod_types),
+            rnd.randint(0, 500),
+            dec(rnd.randint(10, 10_000)) / 100,
+        )
+        for id_ in ids
+    )
+#:
+
+def timed(fn, *args, **kargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args, **kargs)
+    return time.perf_counter() - start, result
+#:
+
+################################################################################
+#
+#   PARALLEL SEARCH
+#
+################################################################################
+
+def expensive_predicate(prod: Product) -> bool:
+    """
+    A deliberately slow predicate: normalizes the product name (over
+    and over) before comparing it.
+    """
+    name = prod.name
+    for _ in range(50):
+        name = unicodedata.normalize('NFKD', name)
+        name = ''.join(ch for ch in name if not unicodedata.combining(ch)).casefold()
+    return 'pao' in name and prod.quantity > 100
+#:
+
+def bench_parallel_search(num_products = DEFAULT_NUM_PRODUCTS):
+    prods = make_products(num_products)
+    print(f"parallel_search: {num_products} produtos, {os.cpu_count()} CPUs")
+
+    elapsed, expected = timed(list, prods.search(expensive_predicate))
+    print(f"  search (sequencial)      : {elapsed:8.3f}s  ({len(expected)} encontrados)")
+
+    base = None
+    for workers in range(1, (os.cpu_count() or 1) + 1):
+        elapsed, found = timed(prods.parallel_search, expensive_predicate, max_workers = workers)
+        assert found == expected
+        base = base or elapsed
+        print(f"  parallel_search {workers:2d} proc. : {elapsed:8.3f}s  (speedup {base / elapsed:5.2f}x)")
+
+    elapsed, found = timed(prods.parallel_search, expensive_predicate, limit = 10)
+    assert found == expected[:10]
+    print(f"  parallel_search limit=10 : {elapsed:8.3f}s")
+#:
+
+################################################################################
+#
+#   MEMORY
+#
+################################################################################
+
+def bench_load_memory(num_products = DEFAULT_NUM_PRODUCTS):
+    """
+    Memory allocated by each load path and the `memory_usage` report
+    of the loaded collection.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp_dir, 'products.csv')
+        make_products(num_products).export_to_csv(csv_path)
+        shards_dir = os.path.join(tmp_dir, 'shards')
+        ShardedProductCollection.from_csv(csv_path, shards_dir, shard_width = 1000)
+
+        def load_sharded():
+            prods = ShardedProductCollection.open(shards_dir)
+            prods.load_all()
+            return prods
+        #:
+
+        print(f"load_memory: {num_products} produtos")
+        for label, load_fn in (
+                ('ProductCollection.from_csv', lambda: ProductCollection.from_csv(csv_path)),
+                ('ShardedProductCollection', load_sharded),
+        ):
+            stats = measure_allocations(load_fn)
+            usage = stats.result.memory_usage(deep = True)
+            print(f"  {label}")
+            print(f"    alocado: {stats.allocated / 2**20:8.2f} MB  pico: {stats.peak / 2**20:8.2f} MB")
+            for category in ('records', 'strings', 'numbers', 'other'):
+                print(f"    {category:<20}: {usage[category] / 2**20:8.2f} MB")
+            for index, size in usage['indexes'].items():
+                print(f"    {index:<20}: {size / 2**20:8.2f} MB")
+            print(f"    {'total':<20}: {usage['total'] / 2**20:8.2f} MB")
+    finally:
+        shutil.rmtree(tmp_dir)
+#:
+
+################################################################################
+#
+#   CSV CODEC
+#
+################################################################################
+
+def legacy_parse(csv: str, csv_delim = CSV_DELIM) -> tuple:
+    """
+    How `Product.from_csv` parsed a line before `PRODUCT_CODEC`.
+    """
+    attrs = csv.split(csv_delim)
+    return (
+        int(attrs[0].strip()),
+        attrs[1].strip(),
+        attrs[2].strip(),
+        int(attrs[3].strip()),
+        dec(attrs[4].strip()),
+    )
+#:
+
+def legacy_format(prod: Product, csv_delim = CSV_DELIM) -> str:
+    """
+    How `Product.to_csv` formatted a product before `PRODUCT_CODEC`.
+    """
+    return csv_delim.join((
+        str(prod.id),
+        prod.name,
+        prod.prod_type,
+        str(prod.quantity),
+        str(prod.price),
+    ))
+#:
+
+CODEC_REPEATS = 5
+
+
+def bench_codec(num_products = DEFAULT_NUM_PRODUCTS):
+    """
+    Per line cost of parsing and formatting with `RecordCodec` vs the
+    hand-written code it replaced (best of `CODEC_REPEATS` runs).
+    """
+    prods = list(make_products(num_products))
+    lines = [legacy_format(prod) for prod in prods]
+    codec = PRODUCT_CODEC
+    assert [codec.format(prod) for prod in prods] == lines
+    assert [codec.parse(line) for line in lines] == [legacy_parse(line) for line in lines]
+
+    print(f"codec: {num_products} produtos (ns por linha)")
+    for label, fn, data in (
+            ('parse (manual)', legacy_parse, lines),
+            ('parse (RecordCodec)', codec.parse, lines),
+            ('format (manual)', legacy_format, prods),
+            ('format (RecordCodec)', codec.format, prods),
+            ('Product(*manual)', lambda line: Product(*legacy_parse(line)), lines),
+            ('Product.from_csv', Product.from_csv, lines),
+    ):
+        elapsed = min(
+            timed(lambda: [fn(item) for item in data])[0] for _ in range(CODEC_REPEATS)
+        )
+        print(f"  {label:<22}: {elapsed / len(data) * 1e9:8.0f} ns")
+#:
+
+################################################################################
+#
+#   STOCK RESERVATIONS
+#
+################################################################################
+
+STOCK_OPS = 200_000
+STOCK_THREADS = (1, 2, 4, 8, 16, 32)
+
+
+def bench_stock(num_products = DEFAULT_NUM_PRODUCTS):
+    """
+    `STOCK_OPS` reservations (each followed by its release) of random
+    products, split among 1 to 32 threads, with a single lock for all
+    products (`num_stripes = 1`) and with striped locks.
+    """
+    prods = list(make_products(num_products))
+    ids = [prod.id for prod in prods]
+    gil = 'com' if getattr(sys, '_is_gil_enabled', lambda: True)() else 'sem'
+    print(f"stock: {num_products} produtos, {STOCK_OPS} reservas (ops/s), {gil} GIL")
+    print(f"  {'threads':>7}  {'1 lock':>12}  {f'{NUM_STOCK_STRIPES} locks':>12}")
+    for num_threads in STOCK_THREADS:
+        results = []
+        for num_stripes in (1, NUM_STOCK_STRIPES):
+            coll = ProductCollection(prods, num_stripes = num_stripes)
+            ops_per_thread = STOCK_OPS // num_threads
+
+            def work(seed: int):
+                rnd = random.Random(seed)
+                for id_ in rnd.choices(ids, k = ops_per_thread):
+                    try:
+                        coll.reserve(id_, 1)
+                    except InsufficientStock:
+                        continue
+                    coll.release(id_, 1)
+            #:
+
+            threads = [threading.Thread(target = work, args = (i,)) for i in range(num_threads)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            assert [prod.quantity for prod in coll] == [prod.quantity for prod in prods]
+            results.append(ops_per_thread * num_threads / elapsed)
+        print(f"  {num_threads:>7}  {results[0]:12.0f}  {results[1]:12.0f}")
+#:
+
+################################################################################
+#
+#   SNAPSHOTS
+#
+################################################################################
+
+SNAPSHOT_SECONDS = 2.0
+SNAPSHOT_READERS = 2
+
+
+def bench_snapshot(num_products = DEFAULT_NUM_PRODUCTS):
+    """
+    One writer thread removes and re-appends products while
+    `SNAPSHOT_READERS` reader threads scan the whole collection, for
+    `SNAPSHOT_SECONDS`. Readers either lock out the writer for the
+    whole scan (global lock) or iterate a `snapshot`.
+    """
+    format_ = PRODUCT_CODEC.format
+    coll = make_products(num_products)
+    keys = [rec.id for rec in coll]
+    print(f"snapshot: {num_products} produtos, {SNAPSHOT_READERS} leitores, 1 escritor")
+    for mode in ('lock global', 'snapshot'):
+        lock = threading.Lock()
+        stop = threading.Event()
+        scans = [0] * SNAPSHOT_READERS
+        writes = 0
+        max_wait = 0.0
+
+        def read(reader_no: int):
+            # Like an export, formats every record
+            while not stop.is_set():
+                if mode == 'snapshot':
+                    view = coll.snapshot()
+                    assert len([format_(rec) for rec in view]) == len(view)
+                else:
+                    with lock:
+                        assert len([format_(rec) for rec in coll]) == len(coll)
+                scans[reader_no] += 1
+        #:
+
+        def write():
+            nonlocal writes, max_wait
+            rnd = random.Random(1)
+            while not stop.is_set():
+                key = rnd.choice(keys)
+                start = time.perf_counter()
+                if mode == 'snapshot':
+                    coll.append(coll.remove_by_id(key))
+                else:
+                    with lock:
+                        coll.append(coll.remove_by_id(key))
+                max_wait = max(max_wait, time.perf_counter() - start)
+                writes += 1
+        #:
+
+        threads = [threading.Thread(target = read, args = (i,)) for i in range(SNAPSHOT_READERS)]
+        threads.append(threading.Thread(target = write))
+        for thread in threads:
+            thread.start()
+        time.sleep(SNAPSHOT_SECONDS)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(
+            f"  {mode:<12}: {writes / SNAPSHOT_SECONDS:10.0f} escritas/s  "
+            f"{sum(scans) / SNAPSHOT_SECONDS:8.1f} leituras/s  "
+            f"espera máx. escritor: {max_wait * 1000:8.1f} ms"
+        )
+#:
+
+################################################################################
+#
+#   BATCHED LOOKUPS
+#
+################################################################################
+
+GET_MANY_BATCH_SIZES = (100, 10_000)
+GET_MANY_REPEATS = 3
+
+
+def bench_get_many(num_products = DEFAULT_NUM_PRODUCTS):
+    """
+    Looking up a batch of ids (half of them in the catalog) with a loop
+    of `search_by_id` vs `get_many`, in a `ProductCollection` and in a
+    `ShardedProductCollection` (with all shards loaded). Times are per
+    id (best of `GET_MANY_REPEATS` runs).
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        prods = make_products(num_products)
+        sharded = ShardedProductCollection.create(
+            os.path.join(tmp_dir, 'shards'), prods, shard_width = 1000
+        )
+        ids = [prod.id for prod in prods]
+        rnd = random.Random(1)
+
+        def lookup_loop(collection, keys: list[int]) -> tuple[dict, list]:
+            found = {}
+            missing = []
+            for key in keys:
+                prod = collection.search_by_id(key)
+                if prod is None:
+                    missing.append(key)
+                else:
+                    found[key] = prod
+            return found, missing
+        #:
+
+        def best_time(fn, *args) -> tuple[float, object]:
+            times, results = zip(*(timed(fn, *args) for _ in range(GET_MANY_REPEATS)))
+            return min(times), results[0]
+        #:
+
+        print(f"get_many: {num_products} produtos (ns por id)")
+        print(f"  {'colecção':<26} {'lote':>7} {'ciclo':>8} {'get_many':>9} {'speedup':>8}")
+        for batch_size in GET_MANY_BATCH_SIZES:
+            half = min(batch_size // 2, len(ids))
+            # Ids above the five digit ids aren't in the catalog
+            keys = rnd.sample(ids, half) + rnd.sample(range(100_000, 200_000), batch_size - half)
+            rnd.shuffle(keys)
+            for label, collection in (
+                    ('ProductCollection', prods),
+                    ('ShardedProductCollection', sharded),
+            ):
+                loop_time, (expected_found, expected_missing) = best_time(lookup_loop, collection, keys)
+                batch_time, result = best_time(collection.get_many, keys)
+                assert result.found.keys() == expected_found.keys()
+                assert result.missing == expected_missing
+                print(
+                    f"  {label:<26} {batch_size:>7} {loop_time / batch_size * 1e9:8.0f} "
+                    f"{batch_time / batch_size * 1e9:9.0f} {loop_time / batch_time:7.2f}x"
+                )
+    finally:
+        shutil.rmtree(tmp_dir)
+#:
+
+################################################################################
+#
+#   MAIN
+#
+################################################################################
+
+BENCHMARKS = {
+    'parallel_search': bench_parallel_search,
+    'load_memory': bench_load_memory,
+    'codec': bench_codec,
+    'snapshot': bench_snapshot,
+    'stock': bench_stock,
+    'get_many': bench_get_many,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Utilização: python {sys.argv[0]} NOME [N]")
+        print(f"Benchmarks disponíveis: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+    args = [int(arg) for arg in sys.argv[2:]]
+    BENCHMARKS[sys.argv[1]](*args)
+#:
+
+if __name__ == '__main__':
+    main()
@@ -2,13 +2,29 @@
 A console client to manage a collection of products.
 """
 
+import pathlib
 import sys
+import threading
 from decimal import Decimal as dec
 
-
-from products import ProductCollection, Product, PRODUCT_TYPES, InvalidProdAttr
-from console_utils import accept, ask, show_msg, cls, pause, show_table, confirm
-from utils import is_float, valid_path_for_file, path_exists
+# Meant to be run from the app's directory: `gestao_comum`, the engine
+# shared with the vehicles app, is imported from the parent directory
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+from products import (
+    ProductCollection,
+    Product,
+    PRODUCT_TYPES,
+    IMPORT_POLICIES,
+    InvalidProdAttr,
+    DuplicateValue,
+    relevant_lines,
+)
+from gestao_comum.record_store import CancelToken, LoadCancelled, LoadProgress
+from gestao_comum.console_utils import accept, ask, show_msg, progress_bar, cls, pause, show_table, confirm
+from gestao_comum.exporters import FORMATS, make_formatter
+from gestao_comum.background_save import BackgroundSave
+from gestao_comum.utils import is_float, valid_path_for_file, path_exists
 
 ################################################################################
 ##
@@ -17,14 +33,25 @@ from utils import is_float, valid_path_for_file, path_exists
 ################################################################################
 
 PRODUCTS_CSV_PATH = 'products.csv'
+PRODS_COL_DEFS = {
+    'id': {'name': 'ID', 'align': '^', 'width': 8},
+    'name': {'name': 'Nome', 'align': '<', 'width': 26},
+    'prod_type': {'name': 'Tipo', 'align': '<', 'width': 8},
+    'quantity': {'name': 'Quantidade', 'align': '>', 'width': 16},
+    'price' : {'name': 'Preço', 'align': '>', 'width': 14,
+               'decimal_places': 2, 'unit': '€'},
+}
+# IDs not found (when searching IDs from a file) shown at most
+MAX_MISSING_SHOWN = 20
 
 prods_collection: ProductCollection
+save_job: BackgroundSave | None = None
 
 
 def main():
     global prods_collection
     try:
-        prods_collection = ProductCollection.from_csv(PRODUCTS_CSV_PATH)
+        prods_collection = load_catalog(PRODUCTS_CSV_PATH)
         exec_menu()
     except KeyboardInterrupt:
         exec_end()
@@ -33,18 +60,78 @@ def main():
         show_msg(ex)
 #:
 
+def load_catalog(csv_path: str) -> ProductCollection:
+    """
+    Loads the catalog in a background thread while showing a progress
+    bar. CTRL-C cancels the load; the user may then continue with an
+    empty catalog.
+    """
+    show_msg(f"A carregar catálogo de {csv_path} (CTRL-C para cancelar)...")
+    cancel_token = CancelToken()
+    outcome = {}
+
+    def load():
+        try:
+            outcome['catalog'] = ProductCollection.from_csv(
+                csv_path,
+                progress_fn = show_load_progress,
+                cancel_token = cancel_token,
+            )
+        except Exception as ex:
+            outcome['error'] = ex
+    #:
+
+    loader = threading.Thread(target = load, daemon = True)
+    loader.start()
+    try:
+        while loader.is_alive():
+            loader.join(timeout = 0.1)
+    except KeyboardInterrupt:
+        cancel_token.cancel()
+        loader.join()
+    print()
+
+    error = outcome.get('error')
+    if isinstance(error, LoadCancelled):
+        show_msg("Carregamento cancelado.")
+        if not confirm("Continuar com um catálogo vazio? "):
+            exec_end()
+        return ProductCollection()
+    if error:
+        raise error
+    return outcome['catalog']
+#:
+
+def show_load_progress(progress: LoadProgress):
+    fraction = progress.bytes_read / progress.total_bytes if progress.total_bytes else 1.0
+    show_msg(
+        f"{progress_bar(fraction)} {progress.rows} registos ({progress.rows_per_sec:.0f}/s)",
+        end = '\r',
+        flush = True,
+    )
+#:
+
 def exec_menu():
+    global save_job
     while True:
         cls()
         print()
+        if save_job:
+            show_msg(save_job.status_msg())
+            if save_job.done:
+                save_job = None
+            print()
         show_msg("┏━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┓")
         show_msg("┃                                           ┃")
         show_msg("┃   L  - Listar catálogo                    ┃")
         show_msg("┃   P  - Pesquisar por id                   ┃")
         show_msg("┃   PT - Pesquisar por tipo                 ┃")
+        show_msg("┃   PV - Pesquisar ids de ficheiro          ┃")
         show_msg("┃   A  - Acrescentar produto                ┃")
         show_msg("┃   E  - Eliminar produto                   ┃")
+        show_msg("┃   I  - Importar produtos de ficheiro      ┃")
         show_msg("┃   G  - Guardar catálogo em ficheiro       ┃")
+        show_msg("┃   S  - Estado da gravação                 ┃")
         show_msg("┃                                           ┃")
         show_msg("┃   T  - Terminar programa                  ┃")
         show_msg("┃                                           ┃")
@@ -62,12 +149,18 @@ def exec_menu():
                 exec_search_by_id()
             case 'PT' | 'TIPO':
                 exec_search_by_type()
+            case 'PV' | 'VARIOS' | 'VÁRIOS':
+                exec_search_from_file()
             case 'A' | 'NOVO':
                 exec_add_new_product()
             case 'E' | 'R' | 'ELIMINAR' | 'REMOVER':
                 exec_remove_product()
+            case 'I' | 'IMPORTAR':
+                exec_import()
             case 'G' | 'GUARDAR':
                 exec_save()
+            case 'S' | 'ESTADO':
+                exec_save_status()
             case  'T' | 'TERMINAR':
                 exec_end()
             case _:
@@ -77,7 +170,7 @@ def exec_menu():
 
 def exec_list_products():
     enter_menu("PRODUTOS")
-    show_table_with_prods(prods_collection)
+    show_table_with_prods(prods_collection.snapshot())
     print()
     pause()
 #:
@@ -111,7 +204,7 @@ def exec_search_by_type():
     )
     print()
 
-    if prods := prods_collection.search(lambda prod: prod.prod_type == prod_type):
+    if prods := prods_collection.search_by_type(prod_type):
         show_msg("Foram encontrados os seguintes produtos:")
         print()
         show_table_with_prods(ProductCollection(prods))
@@ -122,6 +215,42 @@ def exec_search_by_type():
     pause()
 #:
 
+def exec_search_from_file():
+    enter_menu("PESQUISA DE IDS DE FICHEIRO")
+    show_msg("Ficheiro com um ID por linha.")
+    file_path = accept(
+        msg = "Caminho para o ficheiro com os IDs: ",
+        error_msg = "Caminho {} inválido",
+        check_fn = lambda p: valid_path_for_file(p, check_r = True),
+    )
+    print()
+
+    with open(file_path, 'rt', encoding = 'UTF-8') as file:
+        lines = list(relevant_lines(file))
+    # Lines that aren't IDs can't be found
+    ids = [int(line) for line in lines if line.isdigit()]
+    invalid = [line for line in lines if not line.isdigit()]
+    result = prods_collection.get_many(ids)
+
+    if result.found:
+        show_msg(f"Foram encontrados {len(result.found)} produtos:")
+        print()
+        show_table_with_prods(ProductCollection(result.found.values()))
+    else:
+        show_msg("Não foi encontrado nenhum produto.")
+
+    if missing := [*result.missing, *invalid]:
+        print()
+        show_msg(f"IDs não encontrados ({len(missing)}):")
+        for id_ in missing[:MAX_MISSING_SHOWN]:
+            show_msg(f"  {id_}")
+        if len(missing) > MAX_MISSING_SHOWN:
+            show_msg(f"  ... e mais {len(missing) - MAX_MISSING_SHOWN}")
+
+    print()
+    pause()
+#:
+
 def exec_add_new_product():
     enter_menu("ADICIONAR NOVO PRODUTO")
     show_msg("Insira os seguintes valores")
@@ -191,8 +320,49 @@ def exec_remove_product():
     pause()
 #:
 
+def exec_import():
+    enter_menu("IMPORTAR PRODUTOS DE FICHEIRO")
+    file_path = accept(
+        msg = "Caminho para o ficheiro CSV a importar: ",
+        error_msg = "Caminho {} inválido",
+        check_fn = lambda p: valid_path_for_file(p, check_r = True),
+    )
+    policy = accept(
+        msg = f"Em caso de conflito ({'/'.join(IMPORT_POLICIES)}): ",
+        error_msg = "Opção {} inválida! Tente novamente.",
+        check_fn = lambda p: p.strip().lower() in IMPORT_POLICIES,
+        convert_fn = lambda p: p.strip().lower(),
+    )
+    print()
+
+    try:
+        report = prods_collection.import_csv(file_path, policy)
+    # Invalid lines raise `InvalidLine` (a `ValueError` with the file
+    # and line number); other invalid values raise a `ValueError` or an
+    # `ArithmeticError` (eg, `decimal.InvalidOperation`)
+    except (ValueError, ArithmeticError, DuplicateValue) as ex:
+        show_msg("Erro ao importar produtos:")
+        show_msg(ex)
+    else:
+        show_msg(f"Importação de {file_path} concluída.")
+        show_msg(f"  Inseridos  : {report.inserted}")
+        show_msg(f"  Alterados  : {report.updated}")
+        show_msg(f"  Ignorados  : {report.skipped}")
+
+    print()
+    pause()
+#:
+
 def exec_save():
+    global save_job
     enter_menu("GUARDAR CATÁLOGO DE PRODUTOS")
+    if save_job and not save_job.done:
+        show_msg("Já existe uma gravação em curso:")
+        show_msg(save_job.status_msg())
+        print()
+        pause()
+        return
+
     file_path = accept(
         msg = "Caminho para o ficheiro onde guardar o catálogo: ",
         error_msg = "Caminho {} inválido",
@@ -201,8 +371,37 @@ def exec_save():
     if path_exists(file_path) and not confirm("Caminho existe. Deseja escrever por cima? "):
         pause("Volte a tentar novamente...")
         return 
-    prods_collection.export_to_csv(file_path)
-    show_msg(f"Colecção de produtos exportada para {file_path}")
+    format_name = accept(
+        msg = f"Formato ({'/'.join(FORMATS)}) [csv]: ",
+        error_msg = "Formato {} inválido! Tente novamente.",
+        check_fn = lambda f: f.strip().lower() in ('', *FORMATS),
+        convert_fn = lambda f: f.strip().lower() or 'csv',
+    )
+    formatter = make_formatter(format_name, ProductCollection.schema.codec, PRODS_COL_DEFS)
+    save_job = BackgroundSave(prods_collection.snapshot(), file_path, formatter).start()
+    show_msg(f"A guardar colecção de produtos em {file_path} em segundo plano.")
+    show_msg("Pode continuar a usar o programa (opção S para acompanhar a gravação).")
+
+    print()
+    pause()
+#:
+
+def exec_save_status():
+    global save_job
+    enter_menu("ESTADO DA GRAVAÇÃO")
+    if not save_job:
+        show_msg("Não há nenhuma gravação em curso.")
+        print()
+        pause()
+        return
+
+    status_width = 0
+    while not save_job.wait(timeout = 0.2):
+        status = save_job.status_msg()
+        status_width = max(status_width, len(status))
+        show_msg(status.ljust(status_width), end = '\r', flush = True)
+    show_msg(save_job.status_msg().ljust(status_width))
+    save_job = None
 
     print()
     pause()
@@ -211,23 +410,17 @@ def exec_save():
 def exec_end():
     cls()
     print()
+    if save_job and not save_job.done:
+        show_msg("A aguardar que a gravação termine...", indent = 0)
+        save_job.wait()
+        show_msg(save_job.status_msg(), indent = 0)
     show_msg("O programa vai terminar...", indent = 0)
     print()
     sys.exit(0)
 #:
 
 def show_table_with_prods(prods: ProductCollection):
-    show_table(
-        prods,
-        col_defs = {
-            'id': {'name': 'ID', 'align': '^', 'width': 8},
-            'name': {'name': 'Nome', 'align': '<', 'width': 26},
-            'prod_type': {'name': 'Tipo', 'align': '<', 'width': 8},
-            'quantity': {'name': 'Quantidade', 'align': '>', 'width': 16},
-            'price' : {'name': 'Preço', 'align': '>', 'width': 14,
-                       'decimal_places': 2, 'unit': '€'},
-        }
-    )
+    show_table(prods, col_defs = PRODS_COL_DEFS)
 #:
 
 def enter_menu(title: str):
@@ -6,14 +6,33 @@ products in memory:
 - `Product`: a product in memory
 
 - `ProductCollection`: manages a collection of products in memory. This
-  collection can be loaded/updated from/to a CSV file.
+  collection can be loaded/updated from/to a CSV file. It's a
+  `record_store.RecordStore` of products keyed by id. Stock quantities
+  may be reserved, released and adjusted concurrently from several
+  threads.
 
 """
 
+import contextlib
 from decimal import Decimal as dec
 import re
+import threading
 from typing import Iterable, TextIO
 
+from gestao_comum.record_codec import RecordCodec, Field
+from gestao_comum import record_store
+from gestao_comum.record_store import (
+    RecordStore,
+    StoreSchema,
+    StoreSnapshot,
+    hash_index,
+    ImportReport,
+    GetManyResult,
+    IMPORT_POLICIES,
+    DuplicateValue,
+    InvalidLine,
+)
+
 
 CSV_DELIM = ','
 PRODUCT_TYPES = {
@@ -21,6 +40,12 @@ PRODUCT_TYPES = {
     "DL": "Detergentes p/ Loiça",
     "FRL": "Frutas e Legumes",
 }
+COMMENT_PREFIXES = ('#',)
+NUM_STOCK_STRIPES = 64
+_ACCENTED = 'ñãàáâäåéèêęēëóõôòöōíîìïįīúüùûūÑÃÀÁÂÄÅÉÈÊĘĒËÓÕÔÒÖŌÍÎÌÏĮĪÚÜÙÛŪ'
+# Compiled once: building the pattern for each name cost more than
+# matching it
+NAME_RE = re.compile(rf"[a-zA-Z{_ACCENTED}]{{2,}}(\s+[a-zA-Z{_ACCENTED}]{{2,}})*")
 
 
 class Product:
@@ -59,24 +84,13 @@ class Product:
 
     @classmethod
     def from_csv(cls, csv: str, csv_delim = CSV_DELIM) -> 'Product':
-        attrs = csv.split(csv_delim)
-        return cls(
-            id_= int(attrs[0].strip()),
-            name = attrs[1].strip(),
-            prod_type = attrs[2].strip(),
-            quantity = int(attrs[3].strip()),
-            price = dec(attrs[4].strip())
-        )
+        codec = PRODUCT_CODEC if csv_delim == CSV_DELIM else PRODUCT_CODEC.for_delim(csv_delim)
+        return cls(*codec.parse(csv))
     #:
 
     def to_csv(self, csv_delim = CSV_DELIM) -> str:
-        return csv_delim.join((
-            str(self.id),
-            self.name,
-            self.prod_type,
-            str(self.quantity),
-            str(self.price),
-        ))
+        codec = PRODUCT_CODEC if csv_delim == CSV_DELIM else PRODUCT_CODEC.for_delim(csv_delim)
+        return codec.format(self)
     #:
 
     def __str__(self) -> str:
@@ -101,95 +115,196 @@ class Product:
 
     @staticmethod
     def validate_name(name: str) -> bool:
-        com_acento = 'ñãàáâäåéèêęēëóõôòöōíîìïįīúüùûūÑÃÀÁÂÄÅÉÈÊĘĒËÓÕÔÒÖŌÍÎÌÏĮĪÚÜÙÛŪ'
-        return bool(re.fullmatch(rf"[a-zA-Z{com_acento}]{{2,}}(\s+[a-zA-Z{com_acento}]{{2,}})*", name))
+        return bool(NAME_RE.fullmatch(name))
     #:
 #:
 
 
+PRODUCT_CODEC = RecordCodec(
+    (
+        Field('id', int),
+        Field('name', str),
+        Field('prod_type', str),
+        Field('quantity', int),
+        Field('price', dec),
+    ),
+    CSV_DELIM,
+)
+
+
 class InvalidProdAttr(ValueError):
     """
     Invalid Product Attribute.
     """
 #:
 
-class ProductCollection:
-    def __init__(self, initial_values: Iterable[Product] = ()):
-        self._products: list[Product] = []
-        for prod in initial_values:
-            self.append(prod)
+class InsufficientStock(Exception):
+    """
+    A reservation (or adjustment) asked for more units than in stock.
+    """
+#:
+
+class ProductCollection(RecordStore):
+    """
+    Besides the `RecordStore` operations, provides `reserve`, `release`
+    and `adjust_quantity` to change stock quantities from several
+    threads. Stock changes only take one of `num_stripes` locks (chosen
+    by the id of the product), and not the lock of the store, so
+    changes to products of different stripes don't wait for each other
+    (with the GIL, they still don't run in parallel). Products are
+    never changed in place (snapshots may be reading them): a changed
+    copy replaces the product. For that to be safe without the lock of
+    the store:
+        - operations that replace or remove a product also take its
+          stripe (after the lock of the store)
+        - operations that need every product to stay put (taking a
+          snapshot, building an index) take all the stripes
+        - `quantity` isn't indexed, so the indexes only need to point
+          to the new copy (see `HashIndex.swap`)
+    """
+    schema = StoreSchema(
+        record_type = Product,
+        key = 'id',
+        codec = PRODUCT_CODEC,
+        indexes = {'prod_type': hash_index('prod_type')},
+        comment_prefixes = COMMENT_PREFIXES,
+        duplicate_msg = 'Produto já existe com id {}',
+    )
+
+    def __init__(self, records: Iterable = (), num_stripes = NUM_STOCK_STRIPES):
+        self._stripes = [threading.Lock() for _ in range(num_stripes)]
+        # Serializes copying the records shared with a snapshot: stock
+        # changes may need to copy them without the lock of the store
+        self._unshare_lock = threading.Lock()
+        super().__init__(records)
     #:
 
-    @classmethod
-    def from_csv(cls, csv_path: str, csv_delim = CSV_DELIM, encoding = 'UTF-8') -> 'ProductCollection':
-        prods = ProductCollection()
-        with open(csv_path, 'rt', encoding = encoding) as file:
-            for line in relevant_lines(file):
-                prods.append(Product.from_csv(line, csv_delim))
-        return prods
+    def search_by_type(self, prod_type: str) -> list[Product]:
+        return self.search_by('prod_type', prod_type)
     #:
 
-    def export_to_csv(self, csv_path: str, csv_delim = CSV_DELIM, encoding = 'UTF-8'):
-        if len(self._products) == 0:
-            raise ValueError("Coleccção vazia")
-        with open(csv_path, 'wt', encoding = encoding) as file:
-            for prod in self._products:
-                print(prod.to_csv(csv_delim), file=file)
+    def reserve(self, id_: int, quantity: int) -> int:
+        """
+        Takes `quantity` units of product `id_` from stock. Raises
+        `InsufficientStock` (and reserves nothing) if there aren't
+        enough units. Returns the quantity left in stock.
+        """
+        if quantity <= 0:
+            raise ValueError(f"{quantity=} inválida (deve ser > 0)")
+        return self.adjust_quantity(id_, -quantity)
     #:
 
-    def append(self, novo_prod: Product):
-        if self.search_by_id(novo_prod.id):
-            raise DuplicateValue(f'Produto já existe com id {novo_prod.id}')
-        self._products.append(novo_prod)
+    def release(self, id_: int, quantity: int) -> int:
+        """
+        Returns `quantity` units of product `id_` to stock (eg, from a
+        cancelled reservation). Returns the quantity in stock.
+        """
+        if quantity <= 0:
+            raise ValueError(f"{quantity=} inválida (deve ser > 0)")
+        return self.adjust_quantity(id_, quantity)
     #:
 
-    def search_by_id(self, id_: int) -> Product | None:
-        for prod in self._products:
-            if prod.id == id_:
-                return prod
-        return None
+    def adjust_quantity(self, id_: int, delta: int) -> int:
+        """
+        Adds `delta` (possibly negative) units to the stock of product
+        `id_`. Raises `InsufficientStock` if the stock would become
+        negative, or `KeyError` if there's no such product. Returns the
+        new quantity.
+        """
+        with self._stripe(id_):
+            prod = self._records.get(id_)
+            if prod is None:
+                raise KeyError(f"Produto com id {id_} não existe")
+            quantity = prod.quantity + delta
+            if quantity < 0:
+                raise InsufficientStock(
+                    f"Produto {id_}: {prod.quantity} unidades em stock, pedidas {-delta}"
+                )
+            # A shallow copy, without `copy.copy` (several times slower)
+            new_prod = object.__new__(prod.__class__)
+            new_prod.__dict__.update(prod.__dict__)
+            new_prod.quantity = quantity
+            # While the stripe is held, the product can't be replaced or
+            # removed, nor a snapshot taken (see the class docstring)
+            self._unshare()
+            self._records[id_] = new_prod
+            # Not atomic: a concurrent change may be counted only once.
+            # Still, the version of the next snapshot differs from that
+            # of the previous one (none is taken meanwhile).
+            self._version += 1
+            for index in self._indexes.values():
+                index.swap(id_, prod, new_prod)
+            return quantity
     #:
 
-    def search(self, find_fn):
-        for prod in self._products:
-            if find_fn(prod):
-                yield prod
+    def remove_by_id(self, id_: int) -> Product | None:
+        with self._lock, self._stripe(id_):
+            return super().remove_by_id(id_)
     #:
 
-    def __iter__(self):
-        for prod in self._products:
-            yield prod
+    def snapshot(self) -> StoreSnapshot:
+        with self._lock, self._all_stripes():
+            return super().snapshot()
     #:
 
-    def __len__(self) -> int:
-        return len(self._products)
+    def index(self, name: str):
+        index = self._indexes.get(name)
+        if index is None:
+            with self._lock, self._all_stripes():
+                index = super().index(name)
+        return index
     #:
 
-    def remove_by_id(self, id_: int) -> Product | None:
-        prod = self.search_by_id(id_)
-        if prod:
-            self._products.remove(prod)
-        return prod
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        state['_stripes'] = len(self._stripes)
+        del state['_unshare_lock']
+        return state
     #:
 
-    def _dump(self):
-        for prod in self._products:
-            print(prod)
+    def __setstate__(self, state: dict):
+        state['_stripes'] = [threading.Lock() for _ in range(state['_stripes'])]
+        state['_unshare_lock'] = threading.Lock()
+        super().__setstate__(state)
+    #:
+
+    def _stripe(self, id_: int) -> threading.Lock:
+        return self._stripes[hash(id_) % len(self._stripes)]
+    #:
+
+    @contextlib.contextmanager
+    def _all_stripes(self):
+        # Only taken with the lock of the store held, so two threads
+        # never take them at once (in whatever order)
+        for stripe in self._stripes:
+            stripe.acquire()
+        try:
+            yield
+        finally:
+            for stripe in self._stripes:
+                stripe.release()
+    #:
+
+    def _replace(self, key, old_rec, new_rec):
+        # Called with the lock of the store held
+        with self._stripe(key):
+            super()._replace(key, old_rec, new_rec)
+    #:
+
+    def _unshare(self):
+        # `_shared` is only set with all the stripes held, so a thread
+        # holding a stripe (or the lock of the store) that sees it clear
+        # needs no copy
+        if self._shared:
+            with self._unshare_lock:
+                super()._unshare()
     #:
 #:
 
 def relevant_lines(file: TextIO):
-    for line in file:
-        line = line.strip()
-        if len(line) == 0:
-            continue
-        if line.startswith('#'):
-            continue
-        yield line
+    return record_store.relevant_lines(file, COMMENT_PREFIXES)
 #:
 
-class DuplicateValue(Exception):
-    """
-    If there is a duplicate product in a ProductCollection.
-    """
-
+def parsed_records(file: TextIO, make_record):
+    return record_store.parsed_records(file, make_record, COMMENT_PREFIXES)
+#:
@@ -0,0 +1,404 @@
+"""
+Splits a product catalog into several CSV files (shards), each one
+holding a contiguous range of product ids. A small JSON manifest
+records the shard width and, for each shard, its file, id range and
+number of products. This module provides:
+
+- `ShardedProductCollection`: presents the `ProductCollection` API on
+  top of a directory of shards. Shards are only loaded when needed
+  (eg, `search_by_id` only reads the shard where the id would be),
+  can be loaded in parallel, and only modified shards are written
+  back on `save`.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal as dec
+import itertools
+import json
+import os
+import pathlib
+import sys
+from typing import Iterable
+
+from products import (
+    ProductCollection,
+    Product,
+    ImportReport,
+    GetManyResult,
+    IMPORT_POLICIES,
+    DuplicateValue,
+    parsed_records,
+    CSV_DELIM,
+)
+from gestao_comum.utils import memory_usage_report
+
+
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_SHARD_WIDTH = 10_000
+
+
+class ShardedProductCollection:
+    def __init__(self, dir_path: str, shard_width = DEFAULT_SHARD_WIDTH):
+        if shard_width <= 0:
+            raise ValueError(f"{shard_width=} inválida (deve ser > 0)")
+        self._dir = pathlib.Path(dir_path)
+        self._shard_width = shard_width
+        # shard number -> file name, for every shard stored on disk
+        self._files: dict[int, str] = {}
+        # shard number -> number of products, for shards not yet loaded
+        self._counts: dict[int, int] = {}
+        self._shards: dict[int, ProductCollection] = {}
+        self._dirty: set[int] = set()
+    #:
+
+    @classmethod
+    def open(cls, dir_path: str) -> 'ShardedProductCollection':
+        """
+        Opens an existing sharded catalog. Only the manifest is read;
+        shards are loaded on demand.
+        """
+        dir_ = pathlib.Path(dir_path)
+        with open(dir_ / MANIFEST_NAME, 'rt', encoding = 'UTF-8') as file:
+            manifest = json.load(file)
+        prods = cls(dir_path, manifest['shard_width'])
+        for shard in manifest['shards']:
+            prods._files[shard['shard']] = shard['file']
+            prods._counts[shard['shard']] = shard['count']
+        return prods
+    #:
+
+    @classmethod
+    def create(
+            cls,
+            dir_path: str,
+            prods: Iterable[Product],
+            shard_width = DEFAULT_SHARD_WIDTH,
+    ) -> 'ShardedProductCollection':
+        """
+        Creates a new sharded catalog in `dir_path` with the given
+        products and saves it.
+        """
+        os.makedirs(dir_path, exist_ok = True)
+        sharded = cls(dir_path, shard_width)
+        for prod in prods:
+            sharded.append(prod)
+        sharded.save()
+        return sharded
+    #:
+
+    @classmethod
+    def from_csv(
+            cls,
+            csv_path: str,
+            dir_path: str,
+            shard_width = DEFAULT_SHARD_WIDTH,
+            csv_delim = CSV_DELIM,
+            encoding = 'UTF-8',
+    ) -> 'ShardedProductCollection':
+        """
+        Splits the (single file) catalog in `csv_path` into shards
+        stored in `dir_path`.
+        """
+        prods = ProductCollection.from_csv(csv_path, csv_delim, encoding)
+        return cls.create(dir_path, prods, shard_width)
+    #:
+
+    def load_all(self, max_workers: int | None = None):
+        """
+        Loads every shard not yet in memory. Shards are parsed in
+        parallel by a pool of processes.
+        """
+        missing = [shard_no for shard_no in self._files if shard_no not in self._shards]
+        if not missing:
+            return
+        if len(missing) == 1:
+            self._shard(missing[0])
+            return
+        paths = [str(self._dir / self._files[shard_no]) for shard_no in missing]
+        with ProcessPoolExecutor(max_workers = max_workers) as executor:
+            for shard_no, rows in zip(missing, executor.map(_parse_shard, paths)):
+                self._shards[shard_no] = _to_shard(rows)
+                self._counts.pop(shard_no, None)
+    #:
+
+    def save(self):
+        """
+        Writes back the shards modified since they were loaded (or since
+        the last save) and the manifest.
+        """
+        for shard_no in sorted(self._dirty):
+            shard = self._shards[shard_no]
+            file_name = self._files.get(shard_no) or self._shard_file_name(shard_no)
+            path = self._dir / file_name
+            if len(shard) == 0:
+                if path.exists():
+                    path.unlink()
+                self._files.pop(shard_no, None)
+                continue
+            tmp_path = path.with_name(f'{path.name}.tmp')
+            shard.export_to_csv(str(tmp_path))
+            os.replace(tmp_path, path)
+            self._files[shard_no] = file_name
+        self._dirty.clear()
+        self._write_manifest()
+    #:
+
+    def export_to_csv(self, csv_path: str, csv_delim = CSV_DELIM, encoding = 'UTF-8'):
+        if len(self) == 0:
+            raise ValueError("Coleccção vazia")
+        with open(csv_path, 'wt', encoding = encoding) as file:
+            for prod in self:
+                print(prod.to_csv(csv_delim), file=file)
+    #:
+
+    def import_csv(
+            self,
+            csv_path: str,
+            policy = 'skip',
+            csv_delim = CSV_DELIM,
+            encoding = 'UTF-8',
+    ) -> ImportReport:
+        with open(csv_path, 'rt', encoding = encoding) as file:
+            return self.bulk_import(
+                parsed_records(file, lambda line: Product.from_csv(line, csv_delim)),
+                policy,
+            )
+    #:
+
+    def bulk_import(self, prods: Iterable[Product], policy = 'skip') -> ImportReport:
+        """
+        Same as `ProductCollection.bulk_import`. Products are grouped by
+        shard and each group is imported into its own shard.
+        """
+        if policy not in IMPORT_POLICIES:
+            raise ValueError(f"{policy=} inválida (deve ser uma de {IMPORT_POLICIES})")
+
+        groups: dict[int, list[Product]] = {}
+        for prod in prods:
+            groups.setdefault(self._shard_no(prod.id), []).append(prod)
+
+        if policy == 'insert':
+            for shard_no, group in groups.items():
+                shard = self._shard(shard_no, create = True)
+                seen = set()
+                for prod in group:
+                    if prod.id in seen or shard.search_by_id(prod.id):
+                        raise DuplicateValue(f'Produto já existe com id {prod.id}')
+                    seen.add(prod.id)
+
+        inserted = updated = skipped = 0
+        for shard_no, group in groups.items():
+            report = self._shard(shard_no, create = True).bulk_import(group, policy)
+            if report.inserted or report.updated:
+                self._dirty.add(shard_no)
+            inserted += report.inserted
+            updated += report.updated
+            skipped += report.skipped
+        return ImportReport(inserted, updated, skipped)
+    #:
+
+    def append(self, novo_prod: Product):
+        shard_no = self._shard_no(novo_prod.id)
+        self._shard(shard_no, create = True).append(novo_prod)
+        self._dirty.add(shard_no)
+    #:
+
+    def search_by_id(self, id_: int) -> Product | None:
+        shard = self._shard(self._shard_no(id_))
+        return shard.search_by_id(id_) if shard else None
+    #:
+
+    def get_many(self, ids: Iterable[int]) -> GetManyResult:
+        """
+        Same as `ProductCollection.get_many`. Each shard is looked up
+        (and loaded, if needed) once per call, instead of once per id:
+        the ids are probed, in one pass, with the lookup function of
+        their shard. (Grouping the ids by shard in a first pass was
+        slower: most batches hit many shards with a few ids each.)
+        """
+        shard_width = self._shard_width
+        # shard number -> lookup function of the shard
+        lookups = {}
+        found = {}
+        missing = {}
+        for id_ in ids:
+            shard_no = id_ // shard_width
+            lookup = lookups.get(shard_no)
+            if lookup is None:
+                shard = self._shard(shard_no)
+                lookup = lookups[shard_no] = _no_product if shard is None else shard.search_by_id
+            prod = lookup(id_)
+            if prod is None:
+                missing[id_] = None
+            else:
+                found[id_] = prod
+        return GetManyResult(found, list(missing))
+    #:
+
+    def search(self, find_fn):
+        for prod in self:
+            if find_fn(prod):
+                yield prod
+    #:
+
+    def __iter__(self):
+        self.load_all()
+        for shard_no in sorted(self._shards):
+            yield from self._shards[shard_no]
+    #:
+
+    def __len__(self) -> int:
+        return sum(self._counts.values()) + sum(len(shard) for shard in self._shards.values())
+    #:
+
+    def remove_by_id(self, id_: int) -> Product | None:
+        shard_no = self._shard_no(id_)
+        shard = self._shard(shard_no)
+        if shard is None:
+            return None
+        prod = shard.remove_by_id(id_)
+        if prod:
+            self._dirty.add(shard_no)
+        return prod
+    #:
+
+    def memory_usage(self, deep = True) -> dict:
+        """
+        Bytes used by the shards loaded in memory (unloaded shards use
+        no memory), broken down as described in
+        `utils.memory_usage_report`. Indexes: 'shards' (the indexes of
+        all loaded shards) and 'manifest' (the in memory copy of the
+        manifest and the set of dirty shards).
+        """
+        shards = self._shards.values()
+        return memory_usage_report(
+            itertools.chain.from_iterable(shards),
+            indexes = {
+                'shards': sum(
+                    sum(shard.memory_usage(deep = False)['indexes'].values()) for shard in shards
+                ),
+                'manifest': sum(
+                    sys.getsizeof(container)
+                    for container in (self._files, self._counts, self._shards, self._dirty)
+                ),
+            },
+            deep = deep,
+        )
+    #:
+
+    @property
+    def loaded_shards(self) -> list[int]:
+        return sorted(self._shards)
+    #:
+
+    @property
+    def dirty_shards(self) -> list[int]:
+        return sorted(self._dirty)
+    #:
+
+    def _shard_no(self, id_: int) -> int:
+        return id_ // self._shard_width
+    #:
+
+    def _shard(self, shard_no: int, create = False) -> ProductCollection | None:
+        """
+        Returns shard `shard_no`, loading it from disk if needed. If
+        the shard doesn't exist, returns `None` or, if `create` is
+        `True`, a new empty shard.
+        """
+        if shard_no in self._shards:
+            return self._shards[shard_no]
+        if shard_no in self._files:
+            shard = _load_shard(str(self._dir / self._files[shard_no]))
+            self._counts.pop(shard_no, None)
+        elif create:
+            shard = ProductCollection()
+        else:
+            return None
+        self._shards[shard_no] = shard
+        return shard
+    #:
+
+    def _shard_file_name(self, shard_no: int) -> str:
+        return f'shard_{shard_no:05d}.csv'
+    #:
+
+    def _write_manifest(self):
+        shards = []
+        for shard_no in sorted(self._files):
+            if shard_no in self._shards:
+                count = len(self._shards[shard_no])
+            else:
+                count = self._counts[shard_no]
+            shards.append({
+                'shard': shard_no,
+                'file': self._files[shard_no],
+                'min_id': shard_no * self._shard_width,
+                'max_id': (shard_no + 1) * self._shard_width - 1,
+                'count': count,
+            })
+        manifest = {'shard_width': self._shard_width, 'shards': shards}
+        path = self._dir / MANIFEST_NAME
+        tmp_path = path.with_name(f'{path.name}.tmp')
+        with open(tmp_path, 'wt', encoding = 'UTF-8') as file:
+            json.dump(manifest, file, indent = 2)
+        os.replace(tmp_path, path)
+    #:
+
+    def _dump(self):
+        for prod in self:
+            print(prod)
+    #:
+#:
+
+def _no_product(id_: int) -> None:
+    """
+    Lookup function of a shard that doesn't exist.
+    """
+    return None
+#:
+
+def _load_shard(csv_path: str) -> ProductCollection:
+    return ProductCollection.from_csv(csv_path)
+#:
+
+def _parse_shard(csv_path: str) -> list[tuple]:
+    """
+    Runs in a worker process. The products in `csv_path`, as `(id,
+    name, prod_type, quantity, price text)` rows. Rows of ints and
+    strings are several times cheaper to send back to the parent
+    process than `Product` objects, whose unpickling would otherwise
+    limit the speedup of adding workers.
+    """
+    return [
+        (prod.id, prod.name, prod.prod_type, prod.quantity, str(prod.price))
+        for prod in ProductCollection.from_csv(csv_path)
+    ]
+#:
+
+def _to_shard(rows: list[tuple]) -> ProductCollection:
+    # The rows were validated by the worker, so the `Product`s are built
+    # without validating them again
+    new_prod = Product.__new__
+    # Prices repeat a lot, and `Decimal`s are immutable, so each distinct
+    # price is converted (and stored) once
+    prices: dict[str, dec] = {}
+    prods = []
+    for id_, name, prod_type, quantity, price_text in rows:
+        price = prices.get(price_text)
+        if price is None:
+            price = prices[price_text] = dec(price_text)
+        prod = new_prod(Product)
+        prod.__dict__.update(
+            id = id_,
+            name = name,
+            prod_type = prod_type,
+            quantity = quantity,
+            price = price,
+        )
+        prods.append(prod)
+    shard = ProductCollection()
+    shard.bulk_import(prods)
+    return shard
+#:
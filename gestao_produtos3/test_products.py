@@ -0,0 +1,133 @@
+"""
+Tests of `products.ProductCollection`: stock changes and CSV imports.
+"""
+
+from decimal import Decimal as dec
+import threading
+
+import pytest
+
+from products import (
+    DuplicateValue,
+    ImportReport,
+    InsufficientStock,
+    Product,
+    ProductCollection,
+)
+
+
+def make_prods() -> ProductCollection:
+    return ProductCollection([
+        Product(10001, 'Arroz Agulha', 'AL', 10, dec('1.5')),
+        Product(10002, 'Detergente Lavagem', 'DL', 3, dec('2.25')),
+        Product(10003, 'Laranja Algarve', 'FRL', 0, dec('0.9')),
+    ])
+#:
+
+
+def test_adjust_quantity_returns_the_new_quantity():
+    prods = make_prods()
+    assert prods.adjust_quantity(10001, -4) == 6
+    assert prods.adjust_quantity(10001, 2) == 8
+    assert prods.search_by_id(10001).quantity == 8
+#:
+
+def test_adjust_quantity_replaces_the_product():
+    prods = make_prods()
+    before = prods.search_by_id(10002)
+    snapshot = prods.snapshot()
+    prods.adjust_quantity(10002, 5)
+    after = prods.search_by_id(10002)
+    assert after is not before
+    assert before.quantity == 3
+    assert snapshot.search_by_id(10002).quantity == 3
+    assert after.quantity == 8
+    assert prods.search_by_type('DL') == [after]
+#:
+
+def test_insufficient_stock_leaves_the_quantity_unchanged():
+    prods = make_prods()
+    with pytest.raises(InsufficientStock):
+        prods.adjust_quantity(10002, -4)
+    with pytest.raises(InsufficientStock):
+        prods.reserve(10003, 1)
+    assert prods.search_by_id(10002).quantity == 3
+    assert prods.search_by_id(10003).quantity == 0
+#:
+
+def test_adjust_quantity_of_missing_product():
+    with pytest.raises(KeyError):
+        make_prods().adjust_quantity(99999, 1)
+#:
+
+def test_reserve_and_release():
+    prods = make_prods()
+    assert prods.reserve(10001, 10) == 0
+    assert prods.release(10001, 3) == 3
+    for quantity in (0, -1):
+        with pytest.raises(ValueError):
+            prods.reserve(10001, quantity)
+        with pytest.raises(ValueError):
+            prods.release(10001, quantity)
+#:
+
+def test_concurrent_reservations_never_oversell():
+    prods = make_prods()
+    prods.release(10001, 990)      # 1000 units
+    reserved = []
+
+    def reserve_all():
+        count = 0
+        while True:
+            try:
+                prods.reserve(10001, 1)
+            except InsufficientStock:
+                break
+            count += 1
+        reserved.append(count)
+    #:
+
+    threads = [threading.Thread(target = reserve_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(reserved) == 1000
+    assert prods.search_by_id(10001).quantity == 0
+#:
+
+@pytest.fixture
+def import_csv_path(tmp_path) -> str:
+    csv_path = tmp_path / 'import.csv'
+    csv_path.write_text(
+        '# id, designacao,tipo/categoria,quantidade,preco unitário\n'
+        '10001,Arroz Carolino,AL,20,1.6\n'
+        '20001,Feijão Preto,AL,5,1.1\n'
+        '20001,Feijão Frade,AL,6,1.2\n',
+        encoding = 'UTF-8',
+    )
+    return str(csv_path)
+#:
+
+def test_import_csv_update(import_csv_path):
+    prods = make_prods()
+    assert prods.import_csv(import_csv_path, 'update') == ImportReport(1, 2, 0)
+    assert prods.search_by_id(10001).name == 'Arroz Carolino'
+    assert prods.search_by_id(20001).name == 'Feijão Frade'
+    assert len(prods) == 4
+#:
+
+def test_import_csv_skip(import_csv_path):
+    prods = make_prods()
+    assert prods.import_csv(import_csv_path, 'skip') == ImportReport(1, 0, 2)
+    assert prods.search_by_id(10001).name == 'Arroz Agulha'
+    assert prods.search_by_id(20001).name == 'Feijão Preto'
+#:
+
+def test_import_csv_insert(import_csv_path):
+    prods = make_prods()
+    with pytest.raises(DuplicateValue):
+        prods.import_csv(import_csv_path, 'insert')
+    assert len(prods) == 3
+    assert prods.search_by_id(20001) is None
+#:
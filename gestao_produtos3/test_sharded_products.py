@@ -0,0 +1,74 @@
+"""
+Tests of `sharded_products.ShardedProductCollection`: saving and
+reopening a catalog through its manifest.
+"""
+
+from decimal import Decimal as dec
+import json
+
+from products import Product
+from sharded_products import MANIFEST_NAME, ShardedProductCollection
+
+
+def make_prods() -> list[Product]:
+    return [
+        Product(10001, 'Arroz Agulha', 'AL', 10, dec('1.5')),
+        Product(10500, 'Arroz Carolino', 'AL', 7, dec('1.6')),
+        Product(23456, 'Detergente Lavagem', 'DL', 3, dec('2.25')),
+        Product(45678, 'Laranja Algarve', 'FRL', 0, dec('0.9')),
+    ]
+#:
+
+def read_manifest(dir_path) -> dict:
+    with open(dir_path / MANIFEST_NAME, 'rt', encoding = 'UTF-8') as file:
+        return json.load(file)
+#:
+
+
+def test_create_and_open(tmp_path):
+    ShardedProductCollection.create(tmp_path, make_prods(), shard_width = 10_000)
+    manifest = read_manifest(tmp_path)
+    assert manifest['shard_width'] == 10_000
+    assert [(shard['shard'], shard['count']) for shard in manifest['shards']] == [(1, 2), (2, 1), (4, 1)]
+    for shard in manifest['shards']:
+        assert (tmp_path / shard['file']).exists()
+
+    prods = ShardedProductCollection.open(tmp_path)
+    assert len(prods) == 4
+    assert prods.loaded_shards == []
+    prod = prods.search_by_id(10500)
+    assert (prod.name, prod.quantity, prod.price) == ('Arroz Carolino', 7, dec('1.6'))
+    assert prods.loaded_shards == [1]
+    assert prods.search_by_id(30000) is None
+    assert len(prods) == 4
+#:
+
+def test_get_many_across_shards(tmp_path):
+    ShardedProductCollection.create(tmp_path, make_prods(), shard_width = 10_000)
+    prods = ShardedProductCollection.open(tmp_path)
+    result = prods.get_many([45678, 99999, 10001, 35000, 10001])
+    assert list(result.found) == [45678, 10001]
+    assert result.missing == [99999, 35000]
+    assert prods.loaded_shards == [1, 4]
+#:
+
+def test_save_writes_only_the_changes(tmp_path):
+    ShardedProductCollection.create(tmp_path, make_prods(), shard_width = 10_000)
+    prods = ShardedProductCollection.open(tmp_path)
+    prods.append(Product(31000, 'Pera Rocha', 'FRL', 4, dec('1.2')))
+    prods.remove_by_id(23456)
+    assert prods.dirty_shards == [2, 3]
+    prods.save()
+    assert prods.dirty_shards == []
+    assert prods.loaded_shards == [2, 3]
+
+    manifest = read_manifest(tmp_path)
+    assert [(shard['shard'], shard['count']) for shard in manifest['shards']] == [(1, 2), (3, 1), (4, 1)]
+    assert not (tmp_path / 'shard_00002.csv').exists()
+
+    prods = ShardedProductCollection.open(tmp_path)
+    assert len(prods) == 4
+    assert prods.search_by_id(23456) is None
+    assert prods.search_by_id(31000).name == 'Pera Rocha'
+    assert sorted(prod.id for prod in prods) == [10001, 10500, 31000, 45678]
+#:
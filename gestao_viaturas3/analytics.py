@@ -0,0 +1,191 @@
+"""
+Fleet reports (age distribution, vehicles per make and year, median
+age per model) computed over NumPy columns instead of `Vehicle`
+objects. The registration dates (as ordinals) and the make and model
+codes (see `fleet_columns.ValueDictionary`) of every vehicle are kept
+in arrays by the collections, as vehicles are added and removed (see
+`fleet_columns.FleetColumns`); each report is then a few vectorized
+group-by/count/percentile operations. This module provides:
+
+- `FleetAnalytics`: a copy of the columns and the reports
+
+- `AgeBin`, `MakeYearCount`, `ModelAge`: the rows of the reports
+
+"""
+
+from collections import namedtuple
+import datetime
+from typing import Iterable
+
+import numpy as np
+
+from compact_vehicles import CompactVehicleCollection
+from fleet_columns import FleetColumns, ValueDictionary
+
+
+__all__ = [
+    'FleetAnalytics',
+    'AgeBin',
+    'MakeYearCount',
+    'ModelAge',
+]
+
+
+DAYS_PER_YEAR = 365.2425
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+AgeBin = namedtuple('AgeBin', 'min_age max_age count percent')
+MakeYearCount = namedtuple('MakeYearCount', 'make year count')
+ModelAge = namedtuple('ModelAge', 'make model count median_age')
+
+
+class FleetAnalytics:
+    """
+    A columnar copy of a vehicle registry as of `today` (by default,
+    the current date). Changes to the registry after the copy is made
+    are not seen by the reports.
+    """
+    def __init__(
+            self,
+            dates: np.ndarray,
+            make_codes: np.ndarray,
+            model_codes: np.ndarray,
+            makes: ValueDictionary,
+            models: ValueDictionary,
+            today: datetime.date | None = None,
+    ):
+        self.today = today or datetime.date.today()
+        self._dates = dates
+        self._make_codes = make_codes
+        self._model_codes = model_codes
+        self._makes = makes
+        self._models = models
+        # Derived columns used by most reports
+        self._years = (
+            (dates - EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[Y]').astype(np.int32)
+            + 1970
+        )
+        self._ages = (self.today.toordinal() - dates) / DAYS_PER_YEAR
+    #:
+
+    @classmethod
+    def from_columns(
+            cls,
+            columns: FleetColumns,
+            today: datetime.date | None = None,
+    ) -> 'FleetAnalytics':
+        """
+        Copies the columns kept by a collection (eg, by
+        `VehicleCollection.fleet_columns`). No `Vehicle` is visited.
+        """
+        return cls(*columns.columns(), columns.makes, columns.models, today)
+    #:
+
+    @classmethod
+    def from_compact(
+            cls,
+            vehicles: CompactVehicleCollection,
+            today: datetime.date | None = None,
+    ) -> 'FleetAnalytics':
+        """
+        Uses the columns of a `CompactVehicleCollection`, which are
+        already arrays of ordinals and dictionary codes (so no `Vehicle`
+        is built).
+        """
+        dates, make_codes, model_codes, makes, models = vehicles.columns()
+        return cls(
+            np.frombuffer(dates, dtype = np.dtype(dates.typecode)).astype(np.int32),
+            np.frombuffer(make_codes, dtype = np.dtype(make_codes.typecode)).astype(np.int32),
+            np.frombuffer(model_codes, dtype = np.dtype(model_codes.typecode)).astype(np.int32),
+            makes,
+            models,
+            today,
+        )
+    #:
+
+    def __len__(self) -> int:
+        return len(self._dates)
+    #:
+
+    def age_histogram(self, bin_width = 1) -> list[AgeBin]:
+        """
+        Number (and percentage) of vehicles in each age bracket of
+        `bin_width` years, from the newest to the oldest vehicles.
+        """
+        if len(self) == 0:
+            return []
+        bins = np.floor(np.maximum(self._ages, 0) / bin_width).astype(np.int64)
+        counts = np.bincount(bins)
+        total = counts.sum()
+        return [
+            AgeBin(bin_no * bin_width, (bin_no + 1) * bin_width, int(count), float(100 * count / total))
+            for bin_no, count in enumerate(counts)
+            if count
+        ]
+    #:
+
+    def age_percentiles(self, percents = (25, 50, 75, 90)) -> dict[int, float]:
+        if len(self) == 0:
+            return {}
+        return dict(zip(percents, np.percentile(self._ages, percents).tolist()))
+    #:
+
+    def counts_by_make_year(self, years: Iterable[int] | None = None) -> list[MakeYearCount]:
+        """
+        Number of vehicles registered per make and per year (only for
+        `years`, if given), sorted by make and year.
+        """
+        if len(self) == 0:
+            return []
+        first_year = int(self._years.min())
+        num_years = int(self._years.max()) - first_year + 1
+        # One counter per (make, year): a single `bincount` over a
+        # combined group number
+        groups = self._make_codes.astype(np.int64) * num_years + (self._years - first_year)
+        counts = np.bincount(groups, minlength = len(self._makes) * num_years)
+        counts = counts.reshape(len(self._makes), num_years)
+        wanted = None if years is None else set(years)
+        rows = [
+            MakeYearCount(
+                self._makes.decode(int(make_code)),
+                first_year + int(year_no),
+                int(counts[make_code, year_no]),
+            )
+            for make_code, year_no in zip(*np.nonzero(counts))
+            if wanted is None or first_year + int(year_no) in wanted
+        ]
+        rows.sort()
+        return rows
+    #:
+
+    def median_age_by_model(self) -> list[ModelAge]:
+        """
+        Number of vehicles and median age of each make and model, sorted
+        by make and model.
+        """
+        if len(self) == 0:
+            return []
+        groups = self._make_codes.astype(np.int64) * len(self._models) + self._model_codes
+        # Sort by group and then by date, with one sort of a combined
+        # integer key; the median of each group is in the middle of its
+        # (contiguous) run
+        first_date = int(self._dates.min())
+        date_span = int(self._dates.max()) - first_date + 1
+        keys = np.sort(groups * date_span + (self._dates - first_date))
+        sorted_groups, sorted_dates = np.divmod(keys, date_span)
+        sorted_ages = (self.today.toordinal() - first_date - sorted_dates) / DAYS_PER_YEAR
+        group_ids, starts, counts = np.unique(sorted_groups, return_index = True, return_counts = True)
+        medians = (sorted_ages[starts + (counts - 1) // 2] + sorted_ages[starts + counts // 2]) / 2
+        rows = [
+            ModelAge(
+                self._makes.decode(int(group) // len(self._models)),
+                self._models.decode(int(group) % len(self._models)),
+                int(count),
+                float(median),
+            )
+            for group, count, median in zip(group_ids, counts, medians)
+        ]
+        rows.sort()
+        return rows
+    #:
+#:
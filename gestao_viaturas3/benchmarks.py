@@ -0,0 +1,651 @@
+"""
+Benchmarks for the vehicles module. Each benchmark runs over a
+synthetic registry. Usage:
+
+    python benchmarks.py                  # lists available benchmarks
+    python benchmarks.py NAME [N]         # runs benchmark NAME with N vehicles
+
+"""
+
+import datetime
+from operator import attrgetter
+import os
+import pathlib
+import random
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# `gestao_comum` is imported from the parent directory (see
+# `console_client`)
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+from vehicles import VehicleCollection, Vehicle, VEHICLE_CODEC, CSV_DELIM, relevant_lines
+from compact_vehicles import CompactVehicleCollection
+from ingestion import DropFolderIngestor, CHECKPOINT_NAME
+from partitioned_vehicles import PartitionedVehicleCollection
+from analytics import FleetAnalytics
+from fleet_columns import ValueDictionary
+from gestao_comum.utils import measure_allocations
+
+
+MAKES_MODELS = {
+    'Opel': ('Corsa XL', 'Astra HDI', 'Insignia', 'Mokka'),
+    'Mercedes': ('300SL', 'Classe A', 'Classe C', 'Vito'),
+    'Porsche': ('XL', 'Cayenne', 'Macan', 'Panamera'),
+    'Tesla': ('Model T', 'Model X', 'Model S', 'Model 3'),
+    'Renault': ('Clio', 'Megane', 'Captur', 'Zoe'),
+    'Peugeot': ('208', '308', '2008', 'Partner'),
+    'Toyota': ('Yaris', 'Corolla', 'Auris', 'Hilux'),
+    'Fiat': ('Punto', 'Panda', '500', 'Tipo'),
+}
+FIRST_DATE = datetime.date(1990, 1, 1).toordinal()
+LAST_DATE = datetime.date(2024, 12, 31).toordinal()
+DEFAULT_NUM_VEHICLES = 200_000
+
+
+def make_vehicles(num_vehicles: int, seed = 0) -> VehicleCollection:
+    """
+    Generates a registry with `num_vehicles` valid vehicles, all with
+    distinct license plates (at most 6760000 of them).
+    """
+    rnd = random.Random(seed)
+    makes = tuple(MAKES_MODELS)
+    vehicles = VehicleCollection()
+    for plate_no in rnd.sample(range(100 * 26 * 26 * 100), num_vehicles):
+        make = rnd.choice(makes)
+        vehicles.append(Vehicle(
+            plate_from_number(plate_no),
+            make,
+            rnd.choice(MAKES_MODELS[make]),
+            datetime.date.fromordinal(rnd.randint(FIRST_DATE, LAST_DATE)).isoformat(),
+        ))
+    return vehicles
+#:
+
+def plate_from_number(plate_no: int) -> str:
+    plate_no, right = divmod(plate_no, 100)
+    left, letters = divmod(plate_no, 26 * 26)
+    letter1, letter2 = divmod(letters, 26)
+    return (
+        f'{left:02d}-{string.ascii_uppercase[letter1]}'
+        f'{string.ascii_uppercase[letter2]}-{right:02d}'
+    )
+#:
+
+def timed(fn, *args, **kargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args, **kargs)
+    return time.perf_counter() - start, result
+#:
+
+################################################################################
+#
+#   MEMORY
+#
+################################################################################
+
+def bench_load_memory(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    Memory allocated by each load path and the `memory_usage` report
+    of the loaded collection.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp_dir, 'vehicles.csv')
+        make_vehicles(num_vehicles).export_to_csv(csv_path)
+
+        print(f"load_memory: {num_vehicles} viaturas")
+        for label, load_fn in (
+                ('VehicleCollection.from_csv', lambda: VehicleCollection.from_csv(csv_path)),
+                ('CompactVehicleCollection', lambda: CompactVehicleCollection.from_csv(csv_path)),
+        ):
+            stats = measure_allocations(load_fn)
+            usage = stats.result.memory_usage(deep = True)
+            print(f"  {label}")
+            print(f"    alocado: {stats.allocated / 2**20:8.2f} MB  pico: {stats.peak / 2**20:8.2f} MB")
+            for category in ('records', 'strings', 'numbers', 'other'):
+                print(f"    {category:<20}: {usage.get(category, 0) / 2**20:8.2f} MB")
+            for index, size in usage['indexes'].items():
+                print(f"    {index:<20}: {size / 2**20:8.2f} MB")
+            print(f"    {'total':<20}: {usage['total'] / 2**20:8.2f} MB")
+    finally:
+        shutil.rmtree(tmp_dir)
+#:
+
+################################################################################
+#
+#   CSV CODEC
+#
+################################################################################
+
+def legacy_parse(csv: str, csv_delim = CSV_DELIM) -> tuple:
+    """
+    How `Vehicle.from_csv` parsed a line before `VEHICLE_CODEC`.
+    """
+    attrs = csv.split(csv_delim)
+    return (attrs[0], attrs[1], attrs[2], attrs[3])
+#:
+
+def legacy_format(vehicle: Vehicle, csv_delim = CSV_DELIM) -> str:
+    """
+    How `Vehicle.to_csv` formatted a vehicle before `VEHICLE_CODEC`.
+    """
+    return csv_delim.join((
+        vehicle.license_plate,
+        vehicle.make,
+        vehicle.model,
+        str(vehicle.date),
+    ))
+#:
+
+CODEC_REPEATS = 5
+
+
+def bench_codec(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    Per line cost of parsing and formatting with `RecordCodec` vs the
+    hand-written code it replaced (best of `CODEC_REPEATS` runs).
+    """
+    vehicles = list(make_vehicles(num_vehicles))
+    lines = [legacy_format(vehicle) for vehicle in vehicles]
+    codec = VEHICLE_CODEC
+    assert [codec.format(vehicle) for vehicle in vehicles] == lines
+    assert [codec.parse(line) for line in lines] == [legacy_parse(line) for line in lines]
+
+    print(f"codec: {num_vehicles} viaturas (ns por linha)")
+    for label, fn, data in (
+            ('parse (manual)', legacy_parse, lines),
+            ('parse (RecordCodec)', codec.parse, lines),
+            ('format (manual)', legacy_format, vehicles),
+            ('format (RecordCodec)', codec.format, vehicles),
+            ('Vehicle(*manual)', lambda line: Vehicle(*legacy_parse(line)), lines),
+            ('Vehicle.from_csv', Vehicle.from_csv, lines),
+    ):
+        elapsed = min(
+            timed(lambda: [fn(item) for item in data])[0] for _ in range(CODEC_REPEATS)
+        )
+        print(f"  {label:<22}: {elapsed / len(data) * 1e9:8.0f} ns")
+#:
+
+################################################################################
+#
+#   BULK LOAD
+#
+################################################################################
+
+def bench_bulk_load(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    `VehicleCollection.from_csv` vs `VehicleCollection.bulk_load` (mmap
+    and a single regex), checking that both load the same vehicles.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp_dir, 'vehicles.csv')
+        make_vehicles(num_vehicles).export_to_csv(csv_path)
+
+        print(f"bulk_load: {num_vehicles} viaturas")
+        from_csv_time, expected = timed(VehicleCollection.from_csv, csv_path)
+        bulk_time, (vehicles, errors) = timed(VehicleCollection.bulk_load, csv_path)
+        assert not errors
+        assert [
+            (veh.license_plate, veh.make, veh.model, veh.date) for veh in vehicles
+        ] == [
+            (veh.license_plate, veh.make, veh.model, veh.date) for veh in expected
+        ]
+        print(f"  from_csv : {from_csv_time:7.3f}s")
+        print(f"  bulk_load: {bulk_time:7.3f}s  (speedup {from_csv_time / bulk_time:5.2f}x)")
+    finally:
+        shutil.rmtree(tmp_dir)
+#:
+
+################################################################################
+#
+#   DICTIONARY ENCODING
+#
+################################################################################
+
+def bench_dict_encoding(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    Memory and make/model filter throughput with a string per row
+    (parsed with `legacy_parse`), with interned strings
+    (`VEHICLE_CODEC`) and with dictionary encoded columns
+    (`CompactVehicleCollection`).
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp_dir, 'vehicles.csv')
+        make_vehicles(num_vehicles).export_to_csv(csv_path)
+
+        def load_legacy():
+            with open(csv_path, 'rt', encoding = 'UTF-8') as file:
+                return VehicleCollection(
+                    Vehicle(*legacy_parse(line.strip())) for line in relevant_lines(file)
+                )
+        #:
+
+        def filter_objects(vehicles, make, model) -> list:
+            return [veh for veh in vehicles if veh.make == make and veh.model == model]
+        #:
+
+        print(f"dict_encoding: {num_vehicles} viaturas (filtro: Opel Corsa XL)")
+        for label, load_fn, filter_fn in (
+                ('str por linha', load_legacy, filter_objects),
+                ('str interned', lambda: VehicleCollection.from_csv(csv_path), filter_objects),
+                (
+                    'dicionário',
+                    lambda: CompactVehicleCollection.from_csv(csv_path),
+                    CompactVehicleCollection.search_by_make_model,
+                ),
+        ):
+            stats = measure_allocations(load_fn)
+            vehicles = stats.result
+            elapsed, found = timed(filter_fn, vehicles, 'Opel', 'Corsa XL')
+            print(
+                f"  {label:<14}: carregar {stats.elapsed:6.2f}s  "
+                f"memória {stats.allocated / 2**20:8.2f} MB  "
+                f"filtro {elapsed * 1000:8.1f} ms ({len(found)} encontradas)"
+            )
+    finally:
+        shutil.rmtree(tmp_dir)
+#:
+
+################################################################################
+#
+#   SNAPSHOTS
+#
+################################################################################
+
+SNAPSHOT_SECONDS = 2.0
+SNAPSHOT_READERS = 2
+
+
+def bench_snapshot(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    One writer thread removes and re-appends vehicles while
+    `SNAPSHOT_READERS` reader threads scan the whole collection, for
+    `SNAPSHOT_SECONDS`. Readers either lock out the writer for the
+    whole scan (global lock) or iterate a `snapshot`.
+    """
+    format_ = VEHICLE_CODEC.format
+    coll = make_vehicles(num_vehicles)
+    keys = [rec.license_plate for rec in coll]
+    print(f"snapshot: {num_vehicles} viaturas, {SNAPSHOT_READERS} leitores, 1 escritor")
+    for mode in ('lock global', 'snapshot'):
+        lock = threading.Lock()
+        stop = threading.Event()
+        scans = [0] * SNAPSHOT_READERS
+        writes = 0
+        max_wait = 0.0
+
+        def read(reader_no: int):
+            # Like an export, formats every record
+            while not stop.is_set():
+                if mode == 'snapshot':
+                    view = coll.snapshot()
+                    assert len([format_(rec) for rec in view]) == len(view)
+                else:
+                    with lock:
+                        assert len([format_(rec) for rec in coll]) == len(coll)
+                scans[reader_no] += 1
+        #:
+
+        def write():
+            nonlocal writes, max_wait
+            rnd = random.Random(1)
+            while not stop.is_set():
+                key = rnd.choice(keys)
+                start = time.perf_counter()
+                if mode == 'snapshot':
+                    coll.append(coll.remove_by_id(key))
+                else:
+                    with lock:
+                        coll.append(coll.remove_by_id(key))
+                max_wait = max(max_wait, time.perf_counter() - start)
+                writes += 1
+        #:
+
+        threads = [threading.Thread(target = read, args = (i,)) for i in range(SNAPSHOT_READERS)]
+        threads.append(threading.Thread(target = write))
+        for thread in threads:
+            thread.start()
+        time.sleep(SNAPSHOT_SECONDS)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(
+            f"  {mode:<12}: {writes / SNAPSHOT_SECONDS:10.0f} escritas/s  "
+            f"{sum(scans) / SNAPSHOT_SECONDS:8.1f} leituras/s  "
+            f"espera máx. escritor: {max_wait * 1000:8.1f} ms"
+        )
+#:
+
+################################################################################
+#
+#   INGESTION
+#
+################################################################################
+
+NUM_DROP_FILES = 16
+
+def bench_ingestion(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    Time `DropFolderIngestor.scan` takes to ingest `num_vehicles` split
+    across `NUM_DROP_FILES` files, with a growing number of workers.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        vehicles = list(make_vehicles(num_vehicles))
+        per_file = -(-len(vehicles) // NUM_DROP_FILES)
+        for file_no in range(NUM_DROP_FILES):
+            VehicleCollection(
+                vehicles[file_no * per_file:(file_no + 1) * per_file]
+            ).export_to_csv(os.path.join(tmp_dir, f'batch{file_no:03d}.csv'))
+
+        print(f"ingestion: {num_vehicles} viaturas em {NUM_DROP_FILES} ficheiros ({os.cpu_count()} CPUs)")
+        base_time = None
+        num_workers = 1
+        while num_workers <= min(os.cpu_count() or 1, NUM_DROP_FILES):
+            checkpoint_path = os.path.join(tmp_dir, CHECKPOINT_NAME)
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            ingestor = DropFolderIngestor(
+                VehicleCollection(), tmp_dir, max_workers = num_workers, settle_time = 0,
+            )
+            elapsed, reports = timed(ingestor.scan)
+            assert len(ingestor.vehicles) == len(vehicles)
+            assert not any(report.errors for report in reports)
+            base_time = base_time or elapsed
+            print(
+                f"  {num_workers:2d} worker(s): {elapsed:7.3f}s  "
+                f"{len(vehicles) / elapsed:10.0f} viaturas/s  (speedup {base_time / elapsed:5.2f}x)"
+            )
+            num_workers *= 2
+    finally:
+        shutil.rmtree(tmp_dir)
+#:
+
+################################################################################
+#
+#   SORTED LISTINGS
+#
+################################################################################
+
+SORT_SPECS = (('make',), ('-date',), ('make', '-date'), ('-model', 'make', 'date'))
+NUM_CHANGES = 100
+
+def bench_sorted_listing(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    Sorting a listing with `sorted` on every request vs
+    `VehicleCollection.sorted_by` (whose column orders are built on
+    first use and then kept up to date), before and after a few changes.
+    """
+    vehicles = make_vehicles(num_vehicles)
+    column_keys = {
+        'license_plate': attrgetter('license_plate'),
+        'make': lambda vehicle: vehicle.make.casefold(),
+        'model': lambda vehicle: vehicle.model.casefold(),
+        'date': attrgetter('date'),
+    }
+
+    def sort_listing(columns: tuple[str, ...]) -> list[Vehicle]:
+        # Stable sorts, from the least to the most significant column
+        listing = sorted(vehicles, key = column_keys['license_plate'])
+        for column in reversed(columns):
+            name = column.lstrip('-')
+            listing.sort(key = column_keys[name], reverse = column.startswith('-'))
+        return listing
+    #:
+
+    print(f"sorted_listing: {num_vehicles} viaturas")
+    print(f"  {'colunas':<24} {'sorted':>8} {'1ª vez':>8} {'cache':>8} {'alterado':>8}")
+    for columns in SORT_SPECS:
+        sort_time, expected = timed(sort_listing, columns)
+        first_time, listing = timed(vehicles.sorted_by, *columns)
+        assert listing == expected
+        cached_time, _ = timed(vehicles.sorted_by, *columns)
+        for _ in range(NUM_CHANGES):
+            vehicle = vehicles.remove_by_id(next(iter(vehicles)).license_plate)
+            vehicles.append(vehicle)
+        changed_time, _ = timed(vehicles.sorted_by, *columns)
+        print(
+            f"  {', '.join(columns):<24} {sort_time:7.3f}s {first_time:7.3f}s "
+            f"{cached_time:7.3f}s {changed_time:7.3f}s"
+        )
+#:
+
+################################################################################
+#
+#   PARTITIONS
+#
+################################################################################
+
+def bench_partitions(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    A query on one registration year, and saving after one change, with
+    a single CSV file vs a `PartitionedVehicleCollection` (one file per
+    year).
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp_dir, 'vehicles.csv')
+        dir_path = os.path.join(tmp_dir, 'partitions')
+        vehicles = make_vehicles(num_vehicles)
+        vehicles.export_to_csv(csv_path)
+        PartitionedVehicleCollection.create(dir_path, vehicles)
+        year = datetime.date.fromordinal(LAST_DATE).year - 5
+        new_vehicle = Vehicle('99-ZZ-99', 'Opel', 'Corsa', f'{year}-06-01')
+
+        def single_file_query() -> list[Vehicle]:
+            return VehicleCollection.from_csv(csv_path).search_by_year(year)
+        #:
+
+        def partitioned_query() -> list[Vehicle]:
+            return PartitionedVehicleCollection.open(dir_path).search_by_year(year)
+        #:
+
+        print(f"partitions: {num_vehicles} viaturas, pesquisa do ano {year}")
+        single_time, expected = timed(single_file_query)
+        partitioned_time, found = timed(partitioned_query)
+        assert [vehicle.license_plate for vehicle in found] == [
+            vehicle.license_plate for vehicle in expected
+        ]
+        print(f"  ficheiro único  : {single_time:7.3f}s")
+        print(f"  partições       : {partitioned_time:7.3f}s  (speedup {single_time / partitioned_time:5.2f}x)")
+
+        vehicles.append(new_vehicle)
+        single_save_time, _ = timed(vehicles.export_to_csv, csv_path)
+        # `append` loads every partition (to check the plate), but only
+        # the partition of the new vehicle is written back
+        partitioned = PartitionedVehicleCollection.open(dir_path)
+        partitioned.append(new_vehicle)
+        partitioned_save_time, _ = timed(partitioned.save)
+        print("gravação após uma alteração")
+        print(f"  ficheiro único  : {single_save_time:7.3f}s")
+        print(
+            f"  partições       : {partitioned_save_time:7.3f}s  "
+            f"(speedup {single_save_time / partitioned_save_time:5.2f}x)"
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
+#:
+
+################################################################################
+#
+#   BATCHED LOOKUPS
+#
+################################################################################
+
+GET_MANY_BATCH_SIZES = (100, 10_000, 100_000)
+GET_MANY_REPEATS = 3
+
+
+def bench_get_many(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    Looking up a batch of plates (about half of them registered) with a
+    loop of `search_by_id` vs `get_many`, in a `VehicleCollection` and in
+    a `CompactVehicleCollection`. Times are per plate (best of
+    `GET_MANY_REPEATS` runs).
+    """
+    vehicles = make_vehicles(num_vehicles)
+    compact = CompactVehicleCollection(vehicles)
+    plates = [vehicle.license_plate for vehicle in vehicles]
+    rnd = random.Random(1)
+
+    def lookup_loop(collection, keys: list[str]) -> tuple[dict, list]:
+        found = {}
+        missing = []
+        for key in keys:
+            vehicle = collection.search_by_id(key)
+            if vehicle is None:
+                missing.append(key)
+            else:
+                found[key] = vehicle
+        return found, missing
+    #:
+
+    def best_time(fn, *args) -> tuple[float, object]:
+        times, results = zip(*(timed(fn, *args) for _ in range(GET_MANY_REPEATS)))
+        return min(times), results[0]
+    #:
+
+    print(f"get_many: {num_vehicles} viaturas (ns por matrícula)")
+    print(f"  {'colecção':<26} {'lote':>7} {'ciclo':>8} {'get_many':>9} {'speedup':>8}")
+    for batch_size in GET_MANY_BATCH_SIZES:
+        half = batch_size // 2
+        keys = rnd.sample(plates, min(half, len(plates))) + [
+            plate_from_number(rnd.randrange(100 * 26 * 26 * 100))
+            for _ in range(batch_size - half)
+        ]
+        # Distinct plates, as `get_many` drops repeated ones
+        keys = list(dict.fromkeys(keys))
+        rnd.shuffle(keys)
+        for label, collection in (
+                ('VehicleCollection', vehicles),
+                ('CompactVehicleCollection', compact),
+        ):
+            loop_time, (expected_found, expected_missing) = best_time(lookup_loop, collection, keys)
+            batch_time, result = best_time(collection.get_many, keys)
+            assert result.found.keys() == expected_found.keys()
+            assert result.missing == expected_missing
+            print(
+                f"  {label:<26} {len(keys):>7} {loop_time / len(keys) * 1e9:8.0f} "
+                f"{batch_time / len(keys) * 1e9:9.0f} {loop_time / batch_time:7.2f}x"
+            )
+#:
+
+################################################################################
+#
+#   REPORTS
+#
+################################################################################
+
+REPORTS_VISITS = 5
+REPORTS_YEARS = range(2015, 2025)
+
+
+def analytics_from_vehicles(vehicles, today: datetime.date) -> FleetAnalytics:
+    """
+    How the columns of `FleetAnalytics` were built before the
+    collections kept them: by visiting every vehicle.
+    """
+    makes, models = ValueDictionary(), ValueDictionary()
+    dates, make_codes, model_codes = [], [], []
+    for vehicle in vehicles:
+        dates.append(vehicle.date.toordinal())
+        make_codes.append(makes.encode(vehicle.make))
+        model_codes.append(models.encode(vehicle.model))
+    return FleetAnalytics(
+        np.array(dates, dtype = np.int32),
+        np.array(make_codes, dtype = np.int32),
+        np.array(model_codes, dtype = np.int32),
+        makes,
+        models,
+        today,
+    )
+#:
+
+def bench_reports(num_vehicles = DEFAULT_NUM_VEHICLES):
+    """
+    `REPORTS_VISITS` visits to the fleet reports (as `exec_reports`
+    does: columns, then every report), building the columns from the
+    vehicles on every visit vs copying the columns the collection keeps
+    (`VehicleCollection.fleet_columns`), without changes to the
+    registry and with one vehicle added before each visit (after a
+    first, untimed, visit).
+    """
+    vehicles = make_vehicles(num_vehicles)
+    today = datetime.date(2025, 1, 1)
+    new_plates = iter(range(num_vehicles, 100 * 26 * 26 * 100))
+
+    def visit(analytics_fn):
+        analytics = analytics_fn()
+        analytics.age_percentiles()
+        analytics.age_histogram(bin_width = 5)
+        analytics.counts_by_make_year(REPORTS_YEARS)
+        analytics.median_age_by_model()
+    #:
+
+    def add_vehicle():
+        while True:
+            plate = plate_from_number(next(new_plates))
+            if vehicles.search_by_id(plate) is None:
+                vehicles.append(Vehicle(plate, 'Opel', 'Corsa XL', '2020-01-01'))
+                return
+    #:
+
+    print(f"reports: {num_vehicles} viaturas, {REPORTS_VISITS} visitas (ms por visita)")
+    print(f"  {'':<20} {'viaturas':>10} {'colunas':>10}")
+    for label, change_fn in (('sem alterações', None), ('1 viatura nova', add_vehicle)):
+        results = []
+        for analytics_fn in (
+                lambda: analytics_from_vehicles(vehicles.snapshot(), today),
+                lambda: FleetAnalytics.from_columns(vehicles.fleet_columns(), today),
+        ):
+            # The first visit builds the columns index
+            analytics_fn()
+            elapsed = 0.0
+            for _ in range(REPORTS_VISITS):
+                if change_fn:
+                    change_fn()
+                elapsed += timed(visit, analytics_fn)[0]
+            results.append(elapsed / REPORTS_VISITS)
+        print(f"  {label:<20} {results[0] * 1000:10.1f} {results[1] * 1000:10.1f}")
+#:
+
+################################################################################
+#
+#   MAIN
+#
+################################################################################
+
+BENCHMARKS = {
+    'load_memory': bench_load_memory,
+    'codec': bench_codec,
+    'bulk_load': bench_bulk_load,
+    'dict_encoding': bench_dict_encoding,
+    'snapshot': bench_snapshot,
+    'ingestion': bench_ingestion,
+    'sorted_listing': bench_sorted_listing,
+    'partitions': bench_partitions,
+    'get_many': bench_get_many,
+    'reports': bench_reports,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Utilização: python {sys.argv[0]} NOME [N]")
+        print(f"Benchmarks disponíveis: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+    args = [int(arg) for arg in sys.argv[2:]]
+    BENCHMARKS[sys.argv[1]](*args)
+#:
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""
+A memory efficient, column oriented, store of vehicles for very large
+registries. License plates (`DD-LL-DD`) are packed into integers (see
+`pack_plate`) kept sorted in an `array`, so a plate is found with a
+binary search. Dates are kept as ordinals in another `array`. Makes
+and models, which repeat across many rows, are dictionary encoded:
+each distinct value is stored once and rows keep small int codes.
+Vehicles are only built, and values only decoded, when returned by the
+API. This module provides:
+
+- `CompactVehicleCollection`: presents the `VehicleCollection` API on
+  top of the columns
+
+- `ValueDictionary`: assigns codes to the distinct values of a column
+  (from `fleet_columns`)
+
+- `pack_plate` and `unpack_plate`: convert a license plate to/from its
+  packed integer
+
+"""
+
+from array import array
+import bisect
+from collections import Counter
+import datetime
+from operator import eq
+import string
+import sys
+import threading
+from typing import Iterable
+
+import numpy as np
+
+from fleet_columns import ValueDictionary
+from vehicles import (
+    Vehicle,
+    VEHICLE_CODEC,
+    GetManyResult,
+    DuplicateValue,
+    relevant_lines,
+)
+from gestao_comum.utils import memory_usage_report
+
+
+__all__ = [
+    'CompactVehicleCollection',
+    'ValueDictionary',
+    'pack_plate',
+    'unpack_plate',
+]
+
+
+# Packed plates are below 100 * 26 * 26 * 100 (fit in 23 bits) and
+# date ordinals below 3652060, so 32 bit ints suffice
+INT32_TYPECODE = 'i' if array('i').itemsize == 4 else 'l'
+# Dictionary codes use 16 bits until a column has more distinct values
+CODE_TYPECODE = 'H'
+LETTERS = string.ascii_uppercase
+# The two digit and two letter groups of a plate, and their values,
+# looked up instead of parsed (or formatted)
+DIGIT_PAIR_STRS = [f'{number:02d}' for number in range(100)]
+LETTER_PAIR_STRS = [letter1 + letter2 for letter1 in LETTERS for letter2 in LETTERS]
+DIGIT_PAIRS = {digits: number for number, digits in enumerate(DIGIT_PAIR_STRS)}
+LETTER_PAIRS = {letters: number for number, letters in enumerate(LETTER_PAIR_STRS)}
+
+
+def pack_plate(plate: str) -> int:
+    """
+    Packs a (valid) license plate into an integer. The order of the
+    integers is the (alphabetical) order of the plates.
+
+    >>> pack_plate('10-XY-20')
+    738220
+    >>> unpack_plate(738220)
+    '10-XY-20'
+    """
+    return (
+        DIGIT_PAIRS[plate[0:2]] * 676 + LETTER_PAIRS[plate[3:5]]
+    ) * 100 + DIGIT_PAIRS[plate[6:8]]
+#:
+
+def unpack_plate(plate_no: int) -> str:
+    left, plate_no = divmod(plate_no, 26 * 26 * 100)
+    letters, right = divmod(plate_no, 100)
+    return f'{DIGIT_PAIR_STRS[left]}-{LETTER_PAIR_STRS[letters]}-{DIGIT_PAIR_STRS[right]}'
+#:
+
+class CompactVehicleCollection:
+    """
+    Vehicles kept by columns sorted by (packed) license plate. Lookups
+    by plate are O(log n); appends and removals shift the columns
+    (a fast `memmove` for the arrays) and are O(n). Build large
+    collections in bulk (the constructor or `from_csv`), which sorts
+    only once. Iteration is in plate order. Changes are serialized by
+    a lock.
+    Make and model filters compare codes, not strings, in one
+    vectorized pass over the code columns, and the number of vehicles
+    of each make (and make/model) is kept up to date.
+    """
+    def __init__(self, vehicles: Iterable[Vehicle] = ()):
+        self._plates = array(INT32_TYPECODE)
+        self._make_codes = array(CODE_TYPECODE)
+        self._model_codes = array(CODE_TYPECODE)
+        self._dates = array(INT32_TYPECODE)
+        self._make_dict = ValueDictionary()
+        self._model_dict = ValueDictionary()
+        # (make code, model code) -> number of vehicles
+        self._counts: Counter[tuple[int, int]] = Counter()
+        self._lock = threading.RLock()
+        self._bulk_load(vehicles)
+    #:
+
+    @classmethod
+    def from_csv(
+            cls,
+            csv_path: str,
+            csv_delim: str | None = None,
+            encoding = 'UTF-8',
+    ) -> 'CompactVehicleCollection':
+        """
+        Loads the vehicles in `csv_path`. Each line is validated through
+        a temporary `Vehicle`; only the columns are kept.
+        """
+        codec = VEHICLE_CODEC if csv_delim is None else VEHICLE_CODEC.for_delim(csv_delim)
+        parse = codec.parse
+        with open(csv_path, 'rt', encoding = encoding) as file:
+            return cls(Vehicle(*parse(line)) for line in relevant_lines(file))
+    #:
+
+    def export_to_csv(self, csv_path: str, csv_delim: str | None = None, encoding = 'UTF-8'):
+        if len(self._plates) == 0:
+            raise ValueError("Coleccção vazia")
+        codec = VEHICLE_CODEC if csv_delim is None else VEHICLE_CODEC.for_delim(csv_delim)
+        format_ = codec.format
+        with open(csv_path, 'wt', encoding = encoding) as file:
+            for vehicle in self:
+                print(format_(vehicle), file=file)
+    #:
+
+    def append(self, vehicle: Vehicle):
+        if not isinstance(vehicle, Vehicle):
+            raise TypeError(f"{vehicle!r} não é do tipo Vehicle")
+        plate_no = pack_plate(vehicle.license_plate)
+        with self._lock:
+            pos = bisect.bisect_left(self._plates, plate_no)
+            if pos < len(self._plates) and self._plates[pos] == plate_no:
+                raise DuplicateValue(f'Viatura com matricula {vehicle.license_plate} já adicionada')
+            make_code, model_code = self._encode(vehicle.make, vehicle.model)
+            self._plates.insert(pos, plate_no)
+            self._make_codes.insert(pos, make_code)
+            self._model_codes.insert(pos, model_code)
+            self._dates.insert(pos, vehicle.date.toordinal())
+            self._counts[make_code, model_code] += 1
+    #:
+
+    def search_by_id(self, license_plate: str) -> Vehicle | None:
+        pos = self._find(license_plate)
+        return None if pos is None else self._vehicle_at(pos)
+    #:
+
+    def get_many(self, license_plates: Iterable[str]) -> GetManyResult:
+        """
+        Looks up many plates at once, while holding the lock (so all
+        plates see the same state of the collection). The plates are
+        collected before taking the lock, so `license_plates` may be a
+        slow iterator (eg, reading a file).
+        """
+        plates = list(dict.fromkeys(license_plates))
+        with self._lock:
+            positions = [self._find(plate) for plate in plates]
+            vehicles = iter(self._vehicles_at([pos for pos in positions if pos is not None]))
+        found = {}
+        missing = []
+        for plate, pos in zip(plates, positions):
+            if pos is None:
+                missing.append(plate)
+            else:
+                found[plate] = next(vehicles)
+        return GetManyResult(found, missing)
+    #:
+
+    def search(self, find_fn):
+        for vehicle in self:
+            if find_fn(vehicle):
+                yield vehicle
+    #:
+
+    def search_by_make(self, make: str) -> list[Vehicle]:
+        """
+        Vehicles of `make` (ignoring case).
+        """
+        make_codes = self._make_dict.codes_where(_equals_ignoring_case(make))
+        with self._lock:
+            matches = _code_matches(self._make_codes, make_codes)
+            return self._vehicles_at(np.flatnonzero(matches).tolist())
+    #:
+
+    def search_by_make_model(self, make: str, model: str) -> list[Vehicle]:
+        make_codes = self._make_dict.codes_where(_equals_ignoring_case(make))
+        model_codes = self._model_dict.codes_where(_equals_ignoring_case(model))
+        with self._lock:
+            matches = _code_matches(self._make_codes, make_codes)
+            matches &= _code_matches(self._model_codes, model_codes)
+            return self._vehicles_at(np.flatnonzero(matches).tolist())
+    #:
+
+    def count_by_make(self, make: str) -> int:
+        make_codes = self._make_dict.codes_where(_equals_ignoring_case(make))
+        return sum(
+            count for (make_code, _), count in self._counts.items() if make_code in make_codes
+        )
+    #:
+
+    def count_by_make_model(self, make: str, model: str) -> int:
+        make_codes = self._make_dict.codes_where(_equals_ignoring_case(make))
+        model_codes = self._model_dict.codes_where(_equals_ignoring_case(model))
+        return sum(
+            count
+            for (make_code, model_code), count in self._counts.items()
+            if make_code in make_codes and model_code in model_codes
+        )
+    #:
+
+    def __iter__(self):
+        for pos in range(len(self._plates)):
+            yield self._vehicle_at(pos)
+    #:
+
+    def __len__(self) -> int:
+        return len(self._plates)
+    #:
+
+    def columns(self) -> tuple[array, array, array, ValueDictionary, ValueDictionary]:
+        """
+        Copies of the date (ordinal), make code and model code columns,
+        in plate order, and the make and model dictionaries (eg, for
+        `analytics.FleetAnalytics`).
+        """
+        with self._lock:
+            return (
+                array(self._dates.typecode, self._dates),
+                array(self._make_codes.typecode, self._make_codes),
+                array(self._model_codes.typecode, self._model_codes),
+                self._make_dict,
+                self._model_dict,
+            )
+    #:
+
+    def remove_by_id(self, license_plate: str) -> Vehicle | None:
+        with self._lock:
+            pos = self._find(license_plate)
+            if pos is None:
+                return None
+            vehicle = self._vehicle_at(pos)
+            self._counts[self._make_codes[pos], self._model_codes[pos]] -= 1
+            del self._plates[pos]
+            del self._make_codes[pos]
+            del self._model_codes[pos]
+            del self._dates[pos]
+        return vehicle
+    #:
+
+    def memory_usage(self, deep = True) -> dict:
+        """
+        Bytes used by this collection, as described in
+        `utils.memory_usage_report`. There are no record objects: the
+        columns, and the dictionaries with the distinct makes and
+        models, are reported as indexes.
+        """
+        return memory_usage_report(
+            (),
+            indexes = {
+                'plates': sys.getsizeof(self._plates),
+                'make_codes': sys.getsizeof(self._make_codes),
+                'model_codes': sys.getsizeof(self._model_codes),
+                'dates': sys.getsizeof(self._dates),
+                'dictionaries': (
+                    self._make_dict.memory_usage() + self._model_dict.memory_usage()
+                    + sys.getsizeof(self._counts)
+                ),
+            },
+            deep = deep,
+        )
+    #:
+
+    def _bulk_load(self, vehicles: Iterable[Vehicle]):
+        # Called by the constructor, with the columns still empty. The
+        # values are collected by column, and the positions, not the
+        # rows, are sorted by plate.
+        plates, make_codes, model_codes, dates = [], [], [], []
+        add_plate, add_make, add_model, add_date = (
+            plates.append, make_codes.append, model_codes.append, dates.append
+        )
+        encode_make, encode_model = self._make_dict.encode, self._model_dict.encode
+        with self._lock:
+            for vehicle in vehicles:
+                add_plate(pack_plate(vehicle.license_plate))
+                add_make(encode_make(vehicle.make))
+                add_model(encode_model(vehicle.model))
+                add_date(vehicle.date.toordinal())
+            order = sorted(range(len(plates)), key = plates.__getitem__)
+            sorted_plates = array(INT32_TYPECODE, map(plates.__getitem__, order))
+            if any(map(eq, sorted_plates, sorted_plates[1:])):
+                plate_no = next(
+                    prev for prev, plate_no in zip(sorted_plates, sorted_plates[1:])
+                    if prev == plate_no
+                )
+                raise DuplicateValue(f'Viatura com matricula {unpack_plate(plate_no)} já adicionada')
+            self._plates = sorted_plates
+            code_typecode = (
+                CODE_TYPECODE if max(len(self._make_dict), len(self._model_dict)) <= 0x10000
+                else INT32_TYPECODE
+            )
+            self._make_codes = array(code_typecode, map(make_codes.__getitem__, order))
+            self._model_codes = array(code_typecode, map(model_codes.__getitem__, order))
+            self._dates = array(INT32_TYPECODE, map(dates.__getitem__, order))
+            self._counts.update(zip(make_codes, model_codes))
+    #:
+
+    def _encode(self, make: str, model: str) -> tuple[int, int]:
+        make_code = self._make_dict.encode(make)
+        model_code = self._model_dict.encode(model)
+        # Widen the code columns when a dictionary outgrows 16 bits
+        if max(make_code, model_code) > 0xFFFF and self._make_codes.typecode == CODE_TYPECODE:
+            self._make_codes = array(INT32_TYPECODE, self._make_codes)
+            self._model_codes = array(INT32_TYPECODE, self._model_codes)
+        return make_code, model_code
+    #:
+
+    def _find(self, license_plate: str) -> int | None:
+        if not Vehicle.validate_license_plate(license_plate):
+            return None
+        plate_no = pack_plate(license_plate)
+        pos = bisect.bisect_left(self._plates, plate_no)
+        if pos < len(self._plates) and self._plates[pos] == plate_no:
+            return pos
+        return None
+    #:
+
+    def _vehicles_at(self, positions: Iterable[int]) -> list[Vehicle]:
+        """
+        Same as `_vehicle_at` for each position, but with the columns and
+        functions looked up once, and each registration date built only
+        once (many vehicles share it).
+        """
+        plates, make_codes, model_codes, date_ords = (
+            self._plates, self._make_codes, self._model_codes, self._dates
+        )
+        decode_make, decode_model = self._make_dict.decode, self._model_dict.decode
+        new_vehicle = Vehicle.__new__
+        from_ordinal = datetime.date.fromordinal
+        dates: dict[int, datetime.date] = {}
+        vehicles = []
+        for pos in positions:
+            date_ord = date_ords[pos]
+            date = dates.get(date_ord)
+            if date is None:
+                date = dates[date_ord] = from_ordinal(date_ord)
+            vehicle = new_vehicle(Vehicle)
+            vehicle.__dict__.update(
+                license_plate = unpack_plate(plates[pos]),
+                make = decode_make(make_codes[pos]),
+                model = decode_model(model_codes[pos]),
+                date = date,
+            )
+            vehicles.append(vehicle)
+        return vehicles
+    #:
+
+    def _vehicle_at(self, pos: int) -> Vehicle:
+        # The values were validated when the vehicle was added, so the
+        # `Vehicle` is built without validating them again
+        vehicle = Vehicle.__new__(Vehicle)
+        vehicle.license_plate = unpack_plate(self._plates[pos])
+        vehicle.make = self._make_dict.decode(self._make_codes[pos])
+        vehicle.model = self._model_dict.decode(self._model_codes[pos])
+        vehicle.date = datetime.date.fromordinal(self._dates[pos])
+        return vehicle
+    #:
+#:
+
+def _code_matches(column: array, codes: set[int]) -> np.ndarray:
+    """
+    Boolean mask of the rows of `column` whose code is in `codes`. Must
+    be called with the lock held: `column` can't be resized while
+    numpy views its buffer.
+    """
+    values = np.frombuffer(column, dtype = column.typecode)
+    return np.isin(values, list(codes))
+#:
+
+def _equals_ignoring_case(text: str):
+    text = text.casefold()
+    return lambda value: value.casefold() == text
+#:
@@ -1,13 +1,34 @@
 """
-A console client to manage a collection of products.
+A console client to manage a registry of vehicles.
 """
 
+from collections import namedtuple
+import datetime
+import pathlib
 import sys
+import threading
 
+# Meant to be run from the app's directory: `gestao_comum`, the engine
+# shared with the products app, is imported from the parent directory
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
 
-from vehicles import VehicleCollection, Vehicle, InvalidAttr
-from console_utils import accept, ask, show_msg, show_table, cls, pause, confirm
-from utils import valid_path_for_file, path_exists
+from vehicles import (
+    VehicleCollection,
+    Vehicle,
+    validate_plate_pattern,
+    IMPORT_POLICIES,
+    INSPECTION_WINDOW_DAYS,
+    MAX_INSPECTION_WINDOW_DAYS,
+    InvalidAttr,
+    DuplicateValue,
+    relevant_lines,
+)
+from gestao_comum.record_store import CancelToken, LoadCancelled, LoadProgress
+from gestao_comum.console_utils import accept, ask, show_msg, progress_bar, show_table, cls, pause, confirm
+from gestao_comum.exporters import FORMATS, make_formatter
+from gestao_comum.background_save import BackgroundSave
+from analytics import FleetAnalytics
+from gestao_comum.utils import valid_path_for_file, path_exists
 
 ################################################################################
 ##
@@ -16,14 +37,53 @@ from utils import valid_path_for_file, path_exists
 ################################################################################
 
 VEHICLES_CSV_PATH = 'vehicles.csv'
+AGE_BINS_COL_DEFS = {
+    'min_age': {'name': 'Idade >=', 'align': '>', 'width': 8, 'unit': ' anos'},
+    'count': {'name': 'Viaturas', 'align': '>', 'width': 10},
+    'percent': {'name': '%', 'align': '>', 'width': 6, 'decimal_places': 1},
+}
+MODEL_AGES_COL_DEFS = {
+    'make': {'name': 'Marca', 'align': '<', 'width': 20},
+    'model': {'name': 'Modelo', 'align': '<', 'width': 20},
+    'count': {'name': 'Viaturas', 'align': '>', 'width': 10},
+    'median_age': {'name': 'Idade mediana', 'align': '>', 'width': 13, 'decimal_places': 1},
+}
+# Years shown in the "vehicles per make and year" report
+REPORT_YEARS = 5
+INSPECTIONS_COL_DEFS = {
+    'due_date': {'name': 'Inspecção', 'align': '>', 'width': 12, 'convert_fn': str},
+    'age': {'name': 'Idade', 'align': '>', 'width': 8, 'unit': ' anos'},
+    'license_plate': {'name': 'Matrícula', 'align': '^', 'width': 10},
+    'make': {'name': 'Marca', 'align': '<', 'width': 20},
+    'model': {'name': 'Modelo', 'align': '<', 'width': 20},
+}
+InspectionRow = namedtuple('InspectionRow', 'due_date age license_plate make model')
+VEHICLES_COL_DEFS = {
+    'license_plate': {'name': 'Matrícula', 'align': '^', 'width': 10},
+    'make': {'name': 'Marca', 'align': '<', 'width': 20},
+    'model': {'name': 'Modelo', 'align': '<', 'width': 20},
+    'date': {'name': 'Data', 'align': '>', 'width': 12, 'convert_fn': str},
+}
+
+# Names of the columns listings can be sorted by
+SORT_COLUMNS = {
+    'matricula': 'license_plate',
+    'matrícula': 'license_plate',
+    'marca': 'make',
+    'modelo': 'model',
+    'data': 'date',
+}
+# Plates not found (when searching plates from a file) shown at most
+MAX_MISSING_SHOWN = 20
 
 vehicles_collection: VehicleCollection
+save_job: BackgroundSave | None = None
 
 
 def main():
     global vehicles_collection
     try:
-        vehicles_collection = VehicleCollection.from_csv(VEHICLES_CSV_PATH)
+        vehicles_collection = load_catalog(VEHICLES_CSV_PATH)
         exec_menu()
     except KeyboardInterrupt:
         exec_end()
@@ -32,18 +92,82 @@ def main():
         show_msg(ex)
 #:
 
+def load_catalog(csv_path: str) -> VehicleCollection:
+    """
+    Loads the catalog in a background thread while showing a progress
+    bar. CTRL-C cancels the load; the user may then continue with an
+    empty catalog.
+    """
+    show_msg(f"A carregar catálogo de {csv_path} (CTRL-C para cancelar)...")
+    cancel_token = CancelToken()
+    outcome = {}
+
+    def load():
+        try:
+            outcome['catalog'] = VehicleCollection.from_csv(
+                csv_path,
+                progress_fn = show_load_progress,
+                cancel_token = cancel_token,
+            )
+        except Exception as ex:
+            outcome['error'] = ex
+    #:
+
+    loader = threading.Thread(target = load, daemon = True)
+    loader.start()
+    try:
+        while loader.is_alive():
+            loader.join(timeout = 0.1)
+    except KeyboardInterrupt:
+        cancel_token.cancel()
+        loader.join()
+    print()
+
+    error = outcome.get('error')
+    if isinstance(error, LoadCancelled):
+        show_msg("Carregamento cancelado.")
+        if not confirm("Continuar com um catálogo vazio? "):
+            exec_end()
+        return VehicleCollection()
+    if error:
+        raise error
+    return outcome['catalog']
+#:
+
+def show_load_progress(progress: LoadProgress):
+    fraction = progress.bytes_read / progress.total_bytes if progress.total_bytes else 1.0
+    show_msg(
+        f"{progress_bar(fraction)} {progress.rows} registos ({progress.rows_per_sec:.0f}/s)",
+        end = '\r',
+        flush = True,
+    )
+#:
+
 def exec_menu():
+    global save_job
     while True:
         cls()
         print()
+        if save_job:
+            show_msg(save_job.status_msg())
+            if save_job.done:
+                save_job = None
+            print()
         show_msg("┏━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┓")
         show_msg("┃                                           ┃")
         show_msg("┃   L  - Listar catálogo                    ┃")
         show_msg("┃   P  - Pesquisar por matrícula            ┃")
-        show_msg("┃   PM - Pesquisar por marca                ┃")
+        show_msg("┃   PP - Pesquisar por matrícula parcial    ┃")
+        show_msg("┃   PM - Pesquisar por marca e modelo       ┃")
+        show_msg("┃   PD - Pesquisar por data de registo      ┃")
+        show_msg("┃   PV - Pesquisar matrículas de ficheiro   ┃")
+        show_msg("┃   IN - Inspecções a realizar              ┃")
         show_msg("┃   A  - Acrescentar viatura                ┃")
         show_msg("┃   E  - Eliminar viatura                   ┃")
+        show_msg("┃   I  - Importar viaturas de ficheiro      ┃")
         show_msg("┃   G  - Guardar catálogo em ficheiro       ┃")
+        show_msg("┃   S  - Estado da gravação                 ┃")
+        show_msg("┃   RF - Relatórios da frota                ┃")
         show_msg("┃                                           ┃")
         show_msg("┃   T  - Terminar programa                  ┃")
         show_msg("┃                                           ┃")
@@ -59,14 +183,28 @@ def exec_menu():
                 exec_list_vehicles()
             case 'P' | 'PESQUISAR':
                 exec_search_by_id()
+            case 'PP' | 'PARCIAL':
+                exec_search_by_plate_pattern()
             case 'PM' | 'MARCA':
                 exec_search_by_make()
+            case 'PD' | 'DATA':
+                exec_search_by_date()
+            case 'PV' | 'VARIAS' | 'VÁRIAS':
+                exec_search_from_file()
+            case 'IN' | 'INSPECCOES' | 'INSPECÇÕES':
+                exec_inspections_due()
             case 'A' | 'NOVO':
                 exec_add_new_vehicle()
             case 'E' | 'R' | 'ELIMINAR' | 'REMOVER':
                 exec_remove_vehicle()
+            case 'I' | 'IMPORTAR':
+                exec_import()
             case 'G' | 'GUARDAR':
                 exec_save()
+            case 'S' | 'ESTADO':
+                exec_save_status()
+            case 'RF' | 'RELATORIOS' | 'RELATÓRIOS':
+                exec_reports()
             case  'T' | 'TERMINAR':
                 exec_end()
             case _:
@@ -96,11 +234,44 @@ def exec_remove_vehicle():
 
 def exec_list_vehicles():
     enter_menu("VIATURAS")
-    show_table_with_vehicles(vehicles_collection)
+    show_msg("Ordenar por matrícula, marca, modelo ou data (ex: marca, -data).")
+    show_msg("Use - para ordem descendente. ENTER para não ordenar.")
+    sort_columns = accept(
+        msg = "Ordenar por: ",
+        error_msg = "Ordenação {} inválida! Tente novamente.",
+        check_fn = lambda value: parse_sort_columns(value) is not None,
+        convert_fn = parse_sort_columns,
+    )
+    print()
+
+    if sort_columns:
+        vehicles = vehicles_collection.sorted_by(*sort_columns)
+    else:
+        vehicles = vehicles_collection.snapshot()
+    show_table_with_vehicles(vehicles)
     print()
     pause()
 #:
 
+def parse_sort_columns(text: str) -> list[str] | None:
+    """
+    Converts a list of column names (eg, 'marca, -data') to the
+    arguments of `VehicleCollection.sorted_by` (eg, `['make', '-date']`).
+    Returns `None` if a name isn't valid.
+    """
+    columns = []
+    for name in text.split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        descending = name.startswith('-')
+        column = SORT_COLUMNS.get(name.lstrip('-').strip())
+        if column is None:
+            return None
+        columns.append(f"-{column}" if descending else column)
+    return columns
+#:
+
 def exec_search_by_id():
     enter_menu("PESQUISA POR MATRÍCULA")
     license_plate = accept(
@@ -121,6 +292,28 @@ def exec_search_by_id():
     pause()
 #:
 
+def exec_search_by_plate_pattern():
+    enter_menu("PESQUISA POR MATRÍCULA PARCIAL")
+    show_msg("Use ? para os caracteres desconhecidos (ex: ??-XY-?? ou 10-??-2?).")
+    pattern = accept(
+        msg = "Indique a matrícula parcial: ",
+        error_msg = "Matrícula parcial {} inválida! Tente novamente.",
+        check_fn = lambda pattern: validate_plate_pattern(pattern.upper()),
+        convert_fn = str.upper,
+    )
+    print()
+
+    if vehicles := vehicles_collection.search_by_plate_pattern(pattern):
+        show_msg(f"Foram encontrados {len(vehicles)} veículos:")
+        print()
+        show_table_with_vehicles(vehicles)
+    else:
+        show_msg(f"Não foram encontrados veículos com matrícula {pattern}.")
+
+    print()
+    pause()
+#:
+
 def exec_search_by_make():
     enter_menu("PESQUISA POR MARCA")
     make = accept(
@@ -128,15 +321,174 @@ def exec_search_by_make():
         error_msg = "Marca {} inválida! Tente novamente",
         check_fn = Vehicle.validate_make,
     )
+    model = accept(
+        msg = "Indique o modelo (ENTER para todos): ",
+        error_msg = "Modelo {} inválido! Tente novamente",
+        check_fn = lambda model: not model or Vehicle.validate_model(model),
+    )
+    print()
+
+    if model:
+        vehicles = vehicles_collection.search_by_make_model(make, model)
+        desc = f"{make} {model}"
+    else:
+        vehicles = vehicles_collection.search_by_make(make)
+        desc = f"da marca {make}"
+
+    if not vehicles:
+        show_msg(f"Não foram encontrados veículos {desc}.")
+        # Maybe the make (or model) has a typo
+        vehicles = vehicles_collection.search_by_make_fuzzy(make, model or None)
+        desc = "com marca e modelo semelhantes" if model else "de marcas semelhantes"
+
+    if vehicles:
+        show_msg(f"Foram encontrados {len(vehicles)} veículos {desc}:")
+        print()
+        show_table_with_vehicles(vehicles)
+
+    print()
+    pause()
+#:
+
+def exec_search_by_date():
+    enter_menu("PESQUISA POR DATA DE REGISTO")
+    show_msg("Indique um ano (AAAA) ou um intervalo de datas (AAAA-MM-DD).")
+    start = accept(
+        msg = "Ano ou data inicial: ",
+        error_msg = "Ano ou data {} inválido! Tente novamente.",
+        check_fn = lambda value: is_year(value) or Vehicle.validate_date(value),
+    )
+    if is_year(start):
+        year = int(start)
+        vehicles = vehicles_collection.search_by_year(year)
+        period = f"de {year}"
+    else:
+        end = accept(
+            msg = "Data final: ",
+            error_msg = "Data {} inválida! Tente novamente.",
+            check_fn = lambda value: Vehicle.validate_date(value) and value >= start,
+        )
+        vehicles = vehicles_collection.search_by_date(
+            datetime.date.fromisoformat(start),
+            datetime.date.fromisoformat(end),
+        )
+        period = f"entre {start} e {end}"
+    print()
+
+    if vehicles:
+        show_msg(f"Foram encontrados {len(vehicles)} veículos registados {period}:")
+        print()
+        show_table_with_vehicles(vehicles)
+    else:
+        show_msg(f"Não foram encontrados veículos registados {period}.")
+
+    print()
+    pause()
+#:
+
+def exec_search_from_file():
+    enter_menu("PESQUISA DE MATRÍCULAS DE FICHEIRO")
+    show_msg("Ficheiro com uma matrícula por linha.")
+    file_path = accept(
+        msg = "Caminho para o ficheiro com as matrículas: ",
+        error_msg = "Caminho {} inválido",
+        check_fn = lambda p: valid_path_for_file(p, check_r = True),
+    )
+    print()
+
+    with open(file_path, 'rt', encoding = 'UTF-8') as file:
+        result = vehicles_collection.get_many(relevant_lines(file))
+
+    if result.found:
+        show_msg(f"Foram encontrados {len(result.found)} veículos:")
+        print()
+        show_table_with_vehicles(list(result.found.values()))
+    else:
+        show_msg("Não foi encontrado nenhum veículo.")
+
+    if result.missing:
+        print()
+        show_msg(f"Matrículas não encontradas ({len(result.missing)}):")
+        for license_plate in result.missing[:MAX_MISSING_SHOWN]:
+            show_msg(f"  {license_plate}")
+        if len(result.missing) > MAX_MISSING_SHOWN:
+            show_msg(f"  ... e mais {len(result.missing) - MAX_MISSING_SHOWN}")
+
+    print()
+    pause()
+#:
+
+def exec_inspections_due():
+    enter_menu("INSPECÇÕES A REALIZAR")
+    days = accept(
+        msg = f"Número de dias (até {MAX_INSPECTION_WINDOW_DAYS}) [{INSPECTION_WINDOW_DAYS}]: ",
+        error_msg = "Número de dias {} inválido! Tente novamente.",
+        check_fn = lambda value: not value.strip() or (
+            value.strip().isdigit() and 0 < int(value) <= MAX_INSPECTION_WINDOW_DAYS
+        ),
+        convert_fn = lambda value: int(value) if value.strip() else INSPECTION_WINDOW_DAYS,
+    )
     print()
 
-    if vehicles := vehicles_collection.search(lambda veh: veh.make == make):
-        show_msg("Foram encontrados os veículos:")
+    if due := vehicles_collection.inspections_due_within(days):
+        show_msg(f"Há {len(due)} inspecções a realizar nos próximos {days} dias:")
         print()
-        show_table_with_vehicles(VehicleCollection(vehicles))
+        show_table(
+            [
+                InspectionRow(
+                    item.due_date,
+                    item.age,
+                    item.vehicle.license_plate,
+                    item.vehicle.make,
+                    item.vehicle.model,
+                )
+                for item in due
+            ],
+            col_defs = INSPECTIONS_COL_DEFS,
+        )
     else:
-        show_msg(f"Não foram encontrados veículos da marca {make}.")
+        show_msg(f"Não há inspecções a realizar nos próximos {days} dias.")
+
+    print()
+    pause()
+#:
+
+def is_year(value: str) -> bool:
+    return len(value) == 4 and value.isdigit() and int(value) >= 1
+#:
+
+def exec_reports():
+    enter_menu("RELATÓRIOS DA FROTA")
+    analytics = FleetAnalytics.from_columns(vehicles_collection.fleet_columns())
+    if len(analytics) == 0:
+        show_msg("Catálogo vazio.")
+        print()
+        pause()
+        return
+
+    percentiles = analytics.age_percentiles()
+    show_msg(f"{len(analytics)} viaturas a {analytics.today.isoformat()}")
+    show_msg("Idade (anos): " + "  ".join(
+        f"P{percent}: {age:.1f}" for percent, age in percentiles.items()
+    ))
+    print()
+
+    show_msg("DISTRIBUIÇÃO POR IDADE")
+    show_table(analytics.age_histogram(bin_width = 5), col_defs = AGE_BINS_COL_DEFS)
+    print()
 
+    last_year = analytics.today.year
+    years = range(last_year - REPORT_YEARS + 1, last_year + 1)
+    counts = {(row.make, row.year): row.count for row in analytics.counts_by_make_year(years)}
+    makes = sorted({make for make, _ in counts})
+    show_msg("VIATURAS POR MARCA E ANO DE REGISTO")
+    show_msg(f"{'Marca':<20} | " + " | ".join(f"{year:>6}" for year in years))
+    for make in makes:
+        show_msg(f"{make:<20} | " + " | ".join(f"{counts.get((make, year), 0):>6}" for year in years))
+    print()
+
+    show_msg("IDADE MEDIANA POR MODELO")
+    show_table(analytics.median_age_by_model(), col_defs = MODEL_AGES_COL_DEFS)
     print()
     pause()
 #:
@@ -179,8 +531,49 @@ def exec_add_new_vehicle():
     pause()
 #:
 
+def exec_import():
+    enter_menu("IMPORTAR VIATURAS DE FICHEIRO")
+    file_path = accept(
+        msg = "Caminho para o ficheiro CSV a importar: ",
+        error_msg = "Caminho {} inválido",
+        check_fn = lambda p: valid_path_for_file(p, check_r = True),
+    )
+    policy = accept(
+        msg = f"Em caso de conflito ({'/'.join(IMPORT_POLICIES)}): ",
+        error_msg = "Opção {} inválida! Tente novamente.",
+        check_fn = lambda p: p.strip().lower() in IMPORT_POLICIES,
+        convert_fn = lambda p: p.strip().lower(),
+    )
+    print()
+
+    try:
+        report = vehicles_collection.import_csv(file_path, policy)
+    # Invalid lines raise `InvalidLine` (a `ValueError` with the file
+    # and line number); other invalid values raise a `ValueError` or an
+    # `ArithmeticError` (eg, `decimal.InvalidOperation`)
+    except (ValueError, ArithmeticError, DuplicateValue) as ex:
+        show_msg("Erro ao importar viaturas:")
+        show_msg(ex)
+    else:
+        show_msg(f"Importação de {file_path} concluída.")
+        show_msg(f"  Inseridos  : {report.inserted}")
+        show_msg(f"  Alterados  : {report.updated}")
+        show_msg(f"  Ignorados  : {report.skipped}")
+
+    print()
+    pause()
+#:
+
 def exec_save():
+    global save_job
     enter_menu("GUARDAR CATÁLOGO DE VIATURAS")
+    if save_job and not save_job.done:
+        show_msg("Já existe uma gravação em curso:")
+        show_msg(save_job.status_msg())
+        print()
+        pause()
+        return
+
     file_path = accept(
         msg = "Caminho para o ficheiro onde guardar o catálogo: ",
         error_msg = "Caminho {} inválido",
@@ -189,8 +582,38 @@ def exec_save():
     if path_exists(file_path) and not confirm("Caminho existe. Deseja escrever por cima? "):
         pause("Volte a tentar novamente...")
         return 
-    vehicles_collection.export_to_csv(file_path)
-    show_msg(f"Colecção de viaturas  exportada para {file_path}")
+    format_name = accept(
+        msg = f"Formato ({'/'.join(FORMATS)}) [csv]: ",
+        error_msg = "Formato {} inválido! Tente novamente.",
+        check_fn = lambda f: f.strip().lower() in ('', *FORMATS),
+        convert_fn = lambda f: f.strip().lower() or 'csv',
+    )
+    formatter = make_formatter(format_name, VehicleCollection.schema.codec, VEHICLES_COL_DEFS)
+    save_job = BackgroundSave(vehicles_collection.snapshot(), file_path, formatter).start()
+    show_msg(f"A guardar colecção de viaturas em {file_path} em segundo plano.")
+    show_msg("Pode continuar a usar o programa (opção S para acompanhar a gravação).")
+
+    print()
+    pause()
+#:
+
+def exec_save_status():
+    global save_job
+    enter_menu("ESTADO DA GRAVAÇÃO")
+    if not save_job:
+        show_msg("Não há nenhuma gravação em curso.")
+        print()
+        pause()
+        return
+
+    status_width = 0
+    while not save_job.wait(timeout = 0.2):
+        status = save_job.status_msg()
+        status_width = max(status_width, len(status))
+        show_msg(status.ljust(status_width), end = '\r', flush = True)
+    show_msg(save_job.status_msg().ljust(status_width))
+    save_job = None
+
     print()
     pause()
 #:
@@ -198,21 +621,17 @@ def exec_save():
 def exec_end():
     cls()
     print()
+    if save_job and not save_job.done:
+        show_msg("A aguardar que a gravação termine...", indent = 0)
+        save_job.wait()
+        show_msg(save_job.status_msg(), indent = 0)
     show_msg("O programa vai terminar...", indent = 0)
     print()
     sys.exit(0)
 #:
 
 def show_table_with_vehicles(vehicles: VehicleCollection):
-    show_table(
-        vehicles,
-        col_defs = {
-            'license_plate': {'name': 'Matrícula', 'align': '^', 'width': 10},
-            'make': {'name': 'Marca', 'align': '<', 'width': 20},
-            'model': {'name': 'Modelo', 'align': '<', 'width': 20},
-            'date': {'name': 'Data', 'align': '>', 'width': 12, 'convert_fn': str},
-        },
-    )
+    show_table(vehicles, col_defs = VEHICLES_COL_DEFS)
 #:
 
 def enter_menu(title: str):
@@ -0,0 +1,153 @@
+"""
+The columns of the fleet reports (see `analytics.FleetAnalytics`): the
+registration date (as an ordinal) and the make and model codes of
+every vehicle, each in an `array`. They're kept as a secondary index
+of a `VehicleCollection`, so they're up to date after every change and
+the reports never visit the `Vehicle` objects (except once, if the
+index is built for a collection that already has vehicles). This
+module provides:
+
+- `FleetColumns`: the columns (usable in
+  `record_store.StoreSchema.indexes`)
+
+- `ValueDictionary`: assigns codes to the distinct values of a column
+
+"""
+
+from array import array
+import sys
+import threading
+
+import numpy as np
+
+
+__all__ = [
+    'FleetColumns',
+    'ValueDictionary',
+]
+
+
+# Date ordinals are below 3652060 and codes below the number of distinct
+# makes (or models), so 32 bit ints suffice
+INT32_TYPECODE = 'i' if array('i').itemsize == 4 else 'l'
+
+
+class ValueDictionary:
+    """
+    Maps each distinct value of a column to a code (0, 1, 2, ... in
+    order of arrival) and back. Codes are never reused, so they stay
+    valid after the rows with that value are removed.
+    """
+    def __init__(self):
+        self._codes: dict = {}
+        self._values: list = []
+    #:
+
+    def encode(self, value) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+    #:
+
+    def decode(self, code: int):
+        return self._values[code]
+    #:
+
+    def codes_where(self, match_fn) -> set[int]:
+        """
+        Codes of the values for which `match_fn` is true.
+        """
+        return {code for code, value in enumerate(self._values) if match_fn(value)}
+    #:
+
+    def __len__(self) -> int:
+        return len(self._values)
+    #:
+
+    def memory_usage(self) -> int:
+        return (
+            sys.getsizeof(self._codes) + sys.getsizeof(self._values)
+            + sum(sys.getsizeof(value) for value in self._values)
+        )
+    #:
+#:
+
+class FleetColumns:
+    """
+    One row per vehicle, in no particular order. A vehicle is added at
+    the end of the columns and a removed one is overwritten by the last
+    row, so both changes are O(1). `columns` copies the columns into
+    NumPy arrays, under a lock, so the copy is consistent even while
+    vehicles are being added or removed.
+    """
+    def __init__(self):
+        self.makes = ValueDictionary()
+        self.models = ValueDictionary()
+        self._dates = array(INT32_TYPECODE)
+        self._make_codes = array(INT32_TYPECODE)
+        self._model_codes = array(INT32_TYPECODE)
+        self._rows: dict = {}      # key -> row
+        self._keys: list = []      # row -> key
+        self._lock = threading.Lock()
+    #:
+
+    def add(self, key, vehicle):
+        with self._lock:
+            self._rows[key] = len(self._keys)
+            self._keys.append(key)
+            self._dates.append(vehicle.date.toordinal())
+            self._make_codes.append(self.makes.encode(vehicle.make))
+            self._model_codes.append(self.models.encode(vehicle.model))
+    #:
+
+    def remove(self, key, vehicle):
+        with self._lock:
+            row = self._rows.pop(key)
+            last_key = self._keys.pop()
+            if last_key != key:
+                # The last row fills the hole
+                self._rows[last_key] = row
+                self._keys[row] = last_key
+                for column in (self._dates, self._make_codes, self._model_codes):
+                    column[row] = column[-1]
+            for column in (self._dates, self._make_codes, self._model_codes):
+                column.pop()
+    #:
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._keys.clear()
+            for column in (self._dates, self._make_codes, self._model_codes):
+                del column[:]
+    #:
+
+    def columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Copies of the date (ordinal), make code and model code columns,
+        as `int32` arrays (decode the codes with `makes` and `models`).
+        """
+        with self._lock:
+            return tuple(
+                np.array(column, dtype = np.int32)
+                for column in (self._dates, self._make_codes, self._model_codes)
+            )
+    #:
+
+    def __len__(self) -> int:
+        return len(self._keys)
+    #:
+
+    def memory_usage(self) -> int:
+        return (
+            sys.getsizeof(self._rows) + sys.getsizeof(self._keys)
+            + sum(
+                sys.getsizeof(column)
+                for column in (self._dates, self._make_codes, self._model_codes)
+            )
+            + self.makes.memory_usage() + self.models.memory_usage()
+        )
+    #:
+#:
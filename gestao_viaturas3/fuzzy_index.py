@@ -0,0 +1,185 @@
+"""
+Approximate (fuzzy) lookup of text values, for values typed by hand
+with typos (eg, 'Mercedez' or 'Porshe'). The distinct values of a
+field are kept in a BK-tree, which uses the triangle inequality of the
+edit (Levenshtein) distance to skip most values when searching for
+those within distance k of a query. Since a field like a vehicle make
+has few distinct values, queries never look at the records. This
+module provides:
+
+- `edit_distance`: Levenshtein distance between two strings
+
+- `BKTree`: the tree of distinct values
+
+- `FuzzyIndex`: a secondary index (usable in
+  `record_store.StoreSchema.indexes`) with the distinct values of a
+  field, kept up to date as records are added and removed
+
+"""
+
+from operator import attrgetter
+import sys
+
+
+__all__ = [
+    'edit_distance',
+    'BKTree',
+    'FuzzyIndex',
+    'fuzzy_index',
+]
+
+
+def edit_distance(text1: str, text2: str) -> int:
+    """
+    Minimum number of single character insertions, deletions and
+    substitutions that turn `text1` into `text2`.
+
+    >>> edit_distance('mercedez', 'mercedes')
+    1
+    >>> edit_distance('porshe', 'porsche')
+    1
+    """
+    if len(text1) < len(text2):
+        text1, text2 = text2, text1
+    prev_row = list(range(len(text2) + 1))
+    for i, char1 in enumerate(text1, 1):
+        row = [i]
+        for j, char2 in enumerate(text2, 1):
+            row.append(min(
+                prev_row[j] + 1,                       # deletion
+                row[j - 1] + 1,                        # insertion
+                prev_row[j - 1] + (char1 != char2),    # substitution
+            ))
+        prev_row = row
+    return prev_row[-1]
+#:
+
+class BKTree:
+    """
+    Each node is a `[value, {distance: child}]` list; every value in
+    the subtree of `child` is at distance `distance` from `value`.
+    Values can't be removed from a BK-tree without rebuilding it, so
+    `FuzzyIndex` keeps values no longer in use and filters them out.
+    """
+    def __init__(self, distance_fn = edit_distance):
+        self.distance_fn = distance_fn
+        self._root: list | None = None
+        self._size = 0
+    #:
+
+    def add(self, value):
+        if self._root is None:
+            self._root = [value, {}]
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            distance = self.distance_fn(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [value, {}]
+                self._size += 1
+                return
+            node = child
+    #:
+
+    def search(self, value, max_distance: int) -> list[tuple[int, object]]:
+        """
+        `(distance, value)` pairs for the values within `max_distance`
+        of `value`, closest first.
+        """
+        found = []
+        pending = [self._root] if self._root else []
+        while pending:
+            node_value, children = pending.pop()
+            distance = self.distance_fn(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, node_value))
+            # By the triangle inequality, only children at a distance in
+            # [distance - max_distance, distance + max_distance] of this
+            # node may hold matches
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    pending.append(child)
+        found.sort()
+        return found
+    #:
+
+    def __len__(self) -> int:
+        return self._size
+    #:
+#:
+
+class FuzzyIndex:
+    """
+    Keeps the distinct values of `key_fn(record)` (and how many records
+    have each one) in a `BKTree`. Queries are converted with
+    `convert_fn` (eg, `str.casefold`, if `key_fn` casefolds).
+    """
+    def __init__(self, key_fn, convert_fn = None):
+        self.key_fn = key_fn
+        self.convert_fn = convert_fn or (lambda value: value)
+        self._tree = BKTree()
+        self._counts: dict[object, int] = {}
+    #:
+
+    def add(self, key, rec):
+        value = self.key_fn(rec)
+        count = self._counts.get(value, 0)
+        if count == 0:
+            self._tree.add(value)
+        self._counts[value] = count + 1
+    #:
+
+    def remove(self, key, rec):
+        value = self.key_fn(rec)
+        count = self._counts[value] - 1
+        if count:
+            self._counts[value] = count
+        else:
+            # The value stays in the tree, and is ignored by `near`,
+            # until it's added again
+            del self._counts[value]
+    #:
+
+    def clear(self):
+        self._tree = BKTree()
+        self._counts.clear()
+    #:
+
+    def near(self, value, max_distance: int) -> list[tuple[object, int]]:
+        """
+        `(value, distance)` pairs for the values (in use) within
+        `max_distance` of `value`. Closest values come first and, at the
+        same distance, those with more records.
+        """
+        counts = self._counts
+        found = [
+            (distance, -counts[found_value], found_value)
+            for distance, found_value in self._tree.search(self.convert_fn(value), max_distance)
+            if found_value in counts
+        ]
+        found.sort()
+        return [(found_value, distance) for distance, _, found_value in found]
+    #:
+
+    def memory_usage(self) -> int:
+        return sys.getsizeof(self._counts) + len(self._tree) * (
+            sys.getsizeof([None, None]) + sys.getsizeof({})
+        )
+    #:
+#:
+
+def fuzzy_index(field_name: str, convert_fn = None):
+    """
+    Returns a function that creates a `FuzzyIndex` over `field_name`
+    (whose values are converted with `convert_fn`, if given), to be
+    used in `StoreSchema.indexes`.
+    """
+    get_field = attrgetter(field_name)
+    if convert_fn is None:
+        return lambda: FuzzyIndex(get_field)
+    return lambda: FuzzyIndex(lambda rec: convert_fn(get_field(rec)), convert_fn)
+#:
@@ -0,0 +1,239 @@
+"""
+Ingests batches of new registrations dropped, as CSV files, in a
+directory (eg, by regional offices) into a `VehicleCollection`. Files
+are parsed in parallel by a pool of processes and applied, in name
+order, with one of the `record_store.IMPORT_POLICIES` for plates
+already in the collection. A JSON checkpoint in the directory records
+the files already ingested, so they aren't ingested again after a
+restart. This module provides:
+
+- `DropFolderIngestor`: scans (once, or repeatedly with `watch`) a
+  directory for new files and ingests them
+
+- `IngestReport`: the outcome of ingesting one file
+
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import json
+import os
+import pathlib
+import sys
+import time
+from typing import Iterable
+
+from vehicles import (
+    Vehicle,
+    VehicleCollection,
+    IMPORT_POLICIES,
+    DuplicateValue,
+    LoadError,
+)
+from gestao_comum.record_store import CancelToken
+
+
+__all__ = [
+    'DropFolderIngestor',
+    'IngestReport',
+]
+
+
+CHECKPOINT_NAME = '.ingested.json'
+DEFAULT_PATTERN = '*.csv'
+# Files modified less than this many seconds ago may still be being
+# written, and are left for the next scan
+DEFAULT_SETTLE_TIME = 1.0
+DEFAULT_WATCH_INTERVAL = 2.0
+
+IngestReport = namedtuple('IngestReport', 'file inserted updated skipped errors')
+IngestReport.__doc__ = """
+Outcome of ingesting one file:
+    - file: name of the file
+    - inserted, updated, skipped: as in `record_store.ImportReport`
+    - errors: `vehicles.LoadError`s for the lines that were rejected
+      (with policy 'insert', a conflict rejects the whole file and is
+      reported with line number 0)
+"""
+
+
+class DropFolderIngestor:
+    def __init__(
+            self,
+            vehicles: VehicleCollection,
+            dir_path: str,
+            policy = 'skip',
+            max_workers: int | None = None,
+            pattern = DEFAULT_PATTERN,
+            settle_time = DEFAULT_SETTLE_TIME,
+    ):
+        if policy not in IMPORT_POLICIES:
+            raise ValueError(f"{policy=} inválida (deve ser uma de {IMPORT_POLICIES})")
+        self.vehicles = vehicles
+        self.policy = policy
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pattern = pattern
+        self.settle_time = settle_time
+        self._dir = pathlib.Path(dir_path)
+        self._checkpoint_path = self._dir / CHECKPOINT_NAME
+        # file name -> {'size', 'mtime_ns', 'inserted', ...} of each
+        # file already ingested
+        self._ingested: dict[str, dict] = self._read_checkpoint()
+    #:
+
+    @property
+    def ingested_files(self) -> list[str]:
+        return sorted(self._ingested)
+    #:
+
+    def pending_files(self) -> list[pathlib.Path]:
+        """
+        Files in the directory not yet ingested (or modified since they
+        were), and not modified in the last `settle_time` seconds.
+        """
+        return [path for path, _ in self._pending()]
+    #:
+
+    def scan(self) -> list[IngestReport]:
+        """
+        Ingests the pending files. Files are parsed in parallel (by up
+        to `max_workers` processes) and applied in name order, as soon
+        as each one and those before it are parsed. The checkpoint is
+        updated after each file. Plates repeated within a file follow
+        the policy too (eg, with 'update' the last line wins).
+        """
+        # The size and time recorded in the checkpoint are those from
+        # before the file was read: if it changes while being read, the
+        # next scan ingests it again
+        pending = self._pending()
+        if not pending:
+            return []
+        reports = []
+        if self.max_workers == 1 or len(pending) == 1:
+            for path, stat in pending:
+                duplicates = []
+                vehicles, errors = VehicleCollection.bulk_load(str(path), duplicates = duplicates)
+                reports.append(self._apply(path, stat, [*vehicles, *duplicates], errors))
+            return reports
+
+        with ProcessPoolExecutor(max_workers = min(self.max_workers, len(pending))) as executor:
+            futures = [executor.submit(_parse_file, str(path)) for path, _ in pending]
+            for (path, stat), future in zip(pending, futures):
+                rows, errors = future.result()
+                reports.append(self._apply(path, stat, _to_vehicles(rows), errors))
+        return reports
+    #:
+
+    def watch(
+            self,
+            cancel_token: CancelToken,
+            interval = DEFAULT_WATCH_INTERVAL,
+            report_fn = None,
+    ):
+        """
+        Scans the directory every `interval` seconds until
+        `cancel_token` is cancelled (eg, by another thread). Each
+        `IngestReport` is passed to `report_fn`, if given.
+        """
+        while not cancel_token.cancelled:
+            for report in self.scan():
+                if report_fn:
+                    report_fn(report)
+            cancel_token.wait(interval)
+    #:
+
+    def _pending(self) -> list[tuple[pathlib.Path, os.stat_result]]:
+        now = time.time()
+        pending = []
+        for path in sorted(self._dir.glob(self.pattern)):
+            stat = path.stat()
+            if now - stat.st_mtime < self.settle_time:
+                continue
+            done = self._ingested.get(path.name)
+            if done and (done['size'], done['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            pending.append((path, stat))
+        return pending
+    #:
+
+    def _apply(
+            self,
+            path: pathlib.Path,
+            stat: os.stat_result,
+            vehicles: Iterable[Vehicle],
+            errors: list[LoadError],
+    ) -> IngestReport:
+        inserted = updated = skipped = 0
+        try:
+            inserted, updated, skipped = self.vehicles.bulk_import(vehicles, self.policy)
+        except DuplicateValue as ex:
+            errors = [LoadError(0, '', ex), *errors]
+        report = IngestReport(path.name, inserted, updated, skipped, errors)
+        self._ingested[path.name] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'inserted': inserted,
+            'updated': updated,
+            'skipped': skipped,
+            'errors': len(errors),
+        }
+        self._write_checkpoint()
+        return report
+    #:
+
+    def _read_checkpoint(self) -> dict[str, dict]:
+        if not self._checkpoint_path.exists():
+            return {}
+        with open(self._checkpoint_path, 'rt', encoding = 'UTF-8') as file:
+            return json.load(file)['files']
+    #:
+
+    def _write_checkpoint(self):
+        tmp_path = self._checkpoint_path.with_name(f'{CHECKPOINT_NAME}.tmp')
+        with open(tmp_path, 'wt', encoding = 'UTF-8') as file:
+            json.dump({'files': self._ingested}, file, indent = 2)
+        os.replace(tmp_path, self._checkpoint_path)
+    #:
+#:
+
+def _parse_file(csv_path: str) -> tuple[list[tuple], list[LoadError]]:
+    """
+    Runs in a worker process. The vehicles in `csv_path`, as
+    `(license_plate, make, model, date ordinal)` rows (those with a
+    plate repeated in the file last, in file order), and the errors of
+    the lines that were rejected. Rows of strings and ints are several
+    times cheaper to send back to the parent process than `Vehicle`
+    objects, whose unpickling would otherwise limit the speedup of
+    adding workers.
+    """
+    duplicates = []
+    vehicles, errors = VehicleCollection.bulk_load(csv_path, duplicates = duplicates)
+    return [
+        (vehicle.license_plate, vehicle.make, vehicle.model, vehicle.date.toordinal())
+        for vehicle in (*vehicles, *duplicates)
+    ], errors
+#:
+
+def _to_vehicles(rows: list[tuple]) -> list[Vehicle]:
+    # The rows were validated by the worker, so the `Vehicle`s are built
+    # without validating them again
+    new_vehicle = Vehicle.__new__
+    from_ordinal = datetime.date.fromordinal
+    intern = sys.intern
+    dates: dict[int, datetime.date] = {}
+    vehicles = []
+    for plate, make, model, date_ord in rows:
+        date = dates.get(date_ord)
+        if date is None:
+            date = dates[date_ord] = from_ordinal(date_ord)
+        vehicle = new_vehicle(Vehicle)
+        vehicle.__dict__.update(
+            license_plate = plate,
+            make = intern(make),
+            model = intern(model),
+            date = date,
+        )
+        vehicles.append(vehicle)
+    return vehicles
+#:
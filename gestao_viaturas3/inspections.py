@@ -0,0 +1,167 @@
+"""
+Periodic inspection schedule of vehicles. Under Portuguese rules, a
+light vehicle is inspected 4 years after its registration, then every
+2 years until it's 8 years old, and then every year. Every inspection
+is thus due on an anniversary of the registration date, and whether
+it's due in a given year only depends on the year of registration.
+This allows keeping vehicles in order of registration once and for
+all, instead of by next due date, which changes after each
+inspection. This module provides:
+
+- `next_inspection`: next inspection date of a vehicle
+
+- `InspectionIndex`: a secondary index (usable in
+  `record_store.StoreSchema.indexes`) that finds the vehicles due for
+  inspection in a date window without scanning them
+
+- `InspectionDue`: a vehicle due for inspection
+
+"""
+
+from collections import namedtuple
+import calendar
+import datetime
+from operator import attrgetter
+from typing import Iterator
+
+from gestao_comum.record_store import SortedIndex
+
+
+__all__ = [
+    'next_inspection',
+    'is_inspection_age',
+    'InspectionIndex',
+    'InspectionDue',
+]
+
+
+FIRST_INSPECTION_AGE = 4
+# Inspections are every 2 years until this age, and yearly afterwards
+ANNUAL_INSPECTION_AGE = 8
+# Ages, before `ANNUAL_INSPECTION_AGE`, with an inspection (oldest first)
+BIENNIAL_AGES = tuple(range(ANNUAL_INSPECTION_AGE - 2, FIRST_INSPECTION_AGE - 1, -2))
+
+InspectionDue = namedtuple('InspectionDue', 'due_date age vehicle')
+InspectionDue.__doc__ = """
+`vehicle` is due for its inspection at `age` years on `due_date`.
+"""
+
+
+def is_inspection_age(age: int) -> bool:
+    """
+    Whether a vehicle is inspected when it turns `age` years old.
+
+    >>> [age for age in range(12) if is_inspection_age(age)]
+    [4, 6, 8, 9, 10, 11]
+    """
+    if age < ANNUAL_INSPECTION_AGE:
+        return age >= FIRST_INSPECTION_AGE and (age - FIRST_INSPECTION_AGE) % 2 == 0
+    return True
+#:
+
+def anniversary(reg_date: datetime.date, year: int) -> datetime.date:
+    """
+    The anniversary of `reg_date` in `year`. Registrations on February
+    29 have their anniversary on February 28 of common years.
+    """
+    if reg_date.month == 2 and reg_date.day == 29 and not calendar.isleap(year):
+        return datetime.date(year, 2, 28)
+    return reg_date.replace(year = year)
+#:
+
+def next_inspection(reg_date: datetime.date, on_or_after: datetime.date) -> datetime.date:
+    """
+    Date of the first inspection, on or after `on_or_after`, of a
+    vehicle registered on `reg_date`.
+
+    >>> next_inspection(datetime.date(2020, 3, 10), datetime.date(2025, 1, 1))
+    datetime.date(2026, 3, 10)
+    >>> next_inspection(datetime.date(2010, 3, 10), datetime.date(2025, 3, 11))
+    datetime.date(2026, 3, 10)
+    """
+    year = max(on_or_after.year, reg_date.year + FIRST_INSPECTION_AGE)
+    while (
+        not is_inspection_age(year - reg_date.year)
+        or anniversary(reg_date, year) < on_or_after
+    ):
+        year += 1
+    return anniversary(reg_date, year)
+#:
+
+class InspectionIndex(SortedIndex):
+    """
+    Keeps vehicles sorted by registration date (as a `(year, month,
+    day)` tuple). In a calendar year, only the vehicles registered in
+    some years are due for inspection (those at an inspection age), and
+    the ones with an anniversary in a window of days have consecutive
+    entries, found with two binary searches per registration year. So
+    only the vehicles due are scanned, plus two binary searches for each
+    registration year with vehicles due (one per year of the fleet's
+    age span).
+    """
+    def __init__(self):
+        super().__init__(lambda vehicle: _date_key(vehicle.date))
+    #:
+
+    def due_between(self, start: datetime.date, end: datetime.date) -> list[InspectionDue]:
+        """
+        Vehicles with an inspection due between `start` and `end`
+        (inclusive), sorted by due date (and then by registration date
+        and license plate). A vehicle appears once per inspection in
+        the window.
+        """
+        oldest = self._oldest_year()
+        if oldest is None:
+            return []
+        due = []
+        for year in range(start.year, end.year + 1):
+            first = max(start, datetime.date(year, 1, 1))
+            last = min(end, datetime.date(year, 12, 31))
+            last_day = (last.month, last.day)
+            # Vehicles registered on February 29 are due on February 28
+            # of common years (their entries follow those of February 28)
+            if last_day == (2, 28) and not calendar.isleap(year):
+                last_day = (2, 29)
+            # Vehicles due this year, registration year by registration
+            # year (oldest first), each year sorted by due date and plate
+            year_due = []
+            # Many vehicles share each due date, which is built only once
+            due_dates: dict[tuple[int, int], datetime.date] = {}
+            for reg_year in _due_registration_years(year, oldest):
+                age = year - reg_year
+                for vehicle in self.range((reg_year, first.month, first.day), (reg_year, *last_day)):
+                    reg_date = vehicle.date
+                    reg_day = (reg_date.month, reg_date.day)
+                    due_date = due_dates.get(reg_day)
+                    if due_date is None:
+                        due_date = due_dates[reg_day] = anniversary(reg_date, year)
+                    year_due.append(InspectionDue(due_date, age, vehicle))
+            # The sort merges the sorted runs (one per registration year)
+            # and is stable: vehicles due on the same date stay in order
+            # of registration
+            year_due.sort(key = attrgetter('due_date'))
+            due.extend(year_due)
+        return due
+    #:
+
+    def _oldest_year(self) -> int | None:
+        with self._lock:
+            entries = self._sorted_entries()
+            return entries[0][0][0] if entries else None
+    #:
+#:
+
+def _due_registration_years(year: int, oldest: int) -> Iterator[int]:
+    """
+    Years of registration, from `oldest` on, of the vehicles with an
+    inspection in `year` (in ascending order).
+    """
+    yield from range(oldest, year - ANNUAL_INSPECTION_AGE + 1)
+    for age in BIENNIAL_AGES:
+        if year - age >= oldest:
+            yield year - age
+#:
+
+def _date_key(reg_date: datetime.date) -> tuple[int, int, int]:
+    return reg_date.year, reg_date.month, reg_date.day
+#:
@@ -0,0 +1,494 @@
+"""
+Splits a vehicle registry into several CSV files (partitions), one per
+registration year. A small JSON manifest records, for each partition,
+its file, number of vehicles and first and last registration dates.
+Since most queries are limited to a few registration years, they only
+need to read the partitions of those years. This module provides:
+
+- `PartitionedVehicleCollection`: presents the `VehicleCollection` API
+  on top of a directory of partitions. Partitions are only loaded when
+  needed (eg, `search_by_date` only reads the partitions whose dates
+  overlap the requested ones) and only modified partitions are written
+  back on `save`.
+
+"""
+
+import datetime
+import itertools
+import json
+import os
+import pathlib
+import sys
+from typing import Iterable
+
+from vehicles import (
+    VehicleCollection,
+    Vehicle,
+    ImportReport,
+    GetManyResult,
+    IMPORT_POLICIES,
+    DuplicateValue,
+    parsed_records,
+    CSV_DELIM,
+)
+from gestao_comum.utils import memory_usage_report
+
+
+__all__ = [
+    'PartitionedVehicleCollection',
+]
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class PartitionedVehicleCollection:
+    """
+    Date queries (`search_by_date`, `search_by_year`, and `search` and
+    `load` with a date range) only load the partitions that may hold
+    matching vehicles. License plates aren't related to registration
+    years, so operations by plate (`search_by_id`, `append`,
+    `remove_by_id`, `bulk_import`) need every partition loaded, and
+    load those not yet in memory.
+    """
+    def __init__(self, dir_path: str):
+        self._dir = pathlib.Path(dir_path)
+        # year -> file name, for every partition stored on disk
+        self._files: dict[int, str] = {}
+        # year -> {'count', 'min_date', 'max_date'}, as in the manifest,
+        # for partitions not modified since the last save
+        self._stats: dict[int, dict] = {}
+        self._partitions: dict[int, VehicleCollection] = {}
+        self._dirty: set[int] = set()
+    #:
+
+    @classmethod
+    def open(cls, dir_path: str) -> 'PartitionedVehicleCollection':
+        """
+        Opens an existing partitioned registry. Only the manifest is
+        read; partitions are loaded on demand.
+        """
+        dir_ = pathlib.Path(dir_path)
+        with open(dir_ / MANIFEST_NAME, 'rt', encoding = 'UTF-8') as file:
+            manifest = json.load(file)
+        vehicles = cls(dir_path)
+        for partition in manifest['partitions']:
+            year = partition['year']
+            vehicles._files[year] = partition['file']
+            vehicles._stats[year] = {
+                'count': partition['count'],
+                'min_date': datetime.date.fromisoformat(partition['min_date']),
+                'max_date': datetime.date.fromisoformat(partition['max_date']),
+            }
+        return vehicles
+    #:
+
+    @classmethod
+    def create(cls, dir_path: str, vehicles: Iterable[Vehicle]) -> 'PartitionedVehicleCollection':
+        """
+        Creates a new partitioned registry in `dir_path` with the given
+        vehicles and saves it.
+        """
+        os.makedirs(dir_path, exist_ok = True)
+        partitioned = cls(dir_path)
+        partitioned.bulk_import(vehicles, 'insert')
+        partitioned.save()
+        return partitioned
+    #:
+
+    @classmethod
+    def from_csv(
+            cls,
+            csv_path: str,
+            dir_path: str,
+            csv_delim = CSV_DELIM,
+            encoding = 'UTF-8',
+    ) -> 'PartitionedVehicleCollection':
+        """
+        Splits the (single file) registry in `csv_path` into partitions
+        stored in `dir_path`.
+        """
+        vehicles = VehicleCollection.from_csv(csv_path, csv_delim, encoding)
+        return cls.create(dir_path, vehicles)
+    #:
+
+    def load(self, start: datetime.date | None = None, end: datetime.date | None = None):
+        """
+        Loads the partitions not yet in memory with vehicles that may
+        have been registered between `start` and `end` (inclusive;
+        `None` means no limit).
+        """
+        for year in self.partitions_between(start, end):
+            self._partition(year)
+    #:
+
+    def load_all(self):
+        self.load()
+    #:
+
+    def partitions_between(
+            self,
+            start: datetime.date | None,
+            end: datetime.date | None,
+    ) -> list[int]:
+        """
+        Years of the partitions (on disk or in memory) that may hold
+        vehicles registered between `start` and `end`. Partitions not
+        yet loaded are pruned using the dates in the manifest.
+        """
+        years = []
+        for year in sorted(self._files.keys() | self._partitions.keys()):
+            if year in self._stats and year not in self._dirty:
+                min_date, max_date = self._stats[year]['min_date'], self._stats[year]['max_date']
+            else:
+                min_date, max_date = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+            if (start is None or max_date >= start) and (end is None or min_date <= end):
+                years.append(year)
+        return years
+    #:
+
+    def save(self):
+        """
+        Writes back the partitions modified since they were loaded (or
+        since the last save) and the manifest.
+        """
+        for year in sorted(self._dirty):
+            partition = self._partitions[year]
+            file_name = self._files.get(year) or self._partition_file_name(year)
+            path = self._dir / file_name
+            if len(partition) == 0:
+                if path.exists():
+                    path.unlink()
+                self._files.pop(year, None)
+                self._stats.pop(year, None)
+                continue
+            tmp_path = path.with_name(f'{path.name}.tmp')
+            partition.export_to_csv(str(tmp_path))
+            os.replace(tmp_path, path)
+            self._files[year] = file_name
+            dates = [vehicle.date for vehicle in partition]
+            self._stats[year] = {'count': len(dates), 'min_date': min(dates), 'max_date': max(dates)}
+        self._dirty.clear()
+        self._write_manifest()
+    #:
+
+    def export_to_csv(self, csv_path: str, csv_delim = CSV_DELIM, encoding = 'UTF-8'):
+        if len(self) == 0:
+            raise ValueError("Coleccção vazia")
+        with open(csv_path, 'wt', encoding = encoding) as file:
+            for vehicle in self:
+                print(vehicle.to_csv(csv_delim), file=file)
+    #:
+
+    def import_csv(
+            self,
+            csv_path: str,
+            policy = 'skip',
+            csv_delim = CSV_DELIM,
+            encoding = 'UTF-8',
+    ) -> ImportReport:
+        with open(csv_path, 'rt', encoding = encoding) as file:
+            return self.bulk_import(
+                parsed_records(file, lambda line: Vehicle.from_csv(line, csv_delim)),
+                policy,
+            )
+    #:
+
+    def bulk_import(self, vehicles: Iterable[Vehicle], policy = 'skip') -> ImportReport:
+        """
+        Same as `VehicleCollection.bulk_import`. A vehicle updated with
+        a date of another year moves to the partition of that year.
+        """
+        if policy not in IMPORT_POLICIES:
+            raise ValueError(f"{policy=} inválida (deve ser uma de {IMPORT_POLICIES})")
+        vehicles = list(vehicles)
+        self.load_all()
+        plate_years = self._plate_years()
+
+        if policy == 'insert':
+            seen = set()
+            for vehicle in vehicles:
+                plate = vehicle.license_plate
+                if plate in seen or plate in plate_years:
+                    raise DuplicateValue(f'Viatura com matricula {plate} já adicionada')
+                seen.add(plate)
+
+        inserted = updated = skipped = 0
+        # Duplicates within `vehicles` are resolved first (the last one
+        # wins with 'update', the first one with 'skip'), so that each
+        # plate ends up in a single partition
+        batch: dict[str, Vehicle] = {}
+        for vehicle in vehicles:
+            plate = vehicle.license_plate
+            if plate not in batch:
+                batch[plate] = vehicle
+            elif policy == 'update':
+                batch[plate] = vehicle
+                updated += 1
+            else:
+                skipped += 1
+
+        moved = 0
+        groups: dict[int, list[Vehicle]] = {}
+        for plate, vehicle in batch.items():
+            old_year = plate_years.get(plate)
+            if old_year is not None and old_year != vehicle.year:
+                if policy == 'skip':
+                    skipped += 1
+                    continue
+                self._partitions[old_year].remove_by_id(plate)
+                self._dirty.add(old_year)
+                moved += 1
+            groups.setdefault(vehicle.year, []).append(vehicle)
+
+        for year, group in groups.items():
+            report = self._partition(year, create = True).bulk_import(group, policy)
+            if report.inserted or report.updated:
+                self._dirty.add(year)
+            inserted += report.inserted
+            updated += report.updated
+            skipped += report.skipped
+        # Vehicles moved to the partition of another year were inserted
+        # there, but were updated
+        return ImportReport(inserted - moved, updated + moved, skipped)
+    #:
+
+    def append(self, vehicle: Vehicle):
+        if not isinstance(vehicle, Vehicle):
+            raise TypeError(f"{vehicle!r} não é do tipo Vehicle")
+        if self.search_by_id(vehicle.license_plate):
+            raise DuplicateValue(f'Viatura com matricula {vehicle.license_plate} já adicionada')
+        self._partition(vehicle.year, create = True).append(vehicle)
+        self._dirty.add(vehicle.year)
+    #:
+
+    def search_by_id(self, license_plate: str) -> Vehicle | None:
+        # Loaded partitions first: the vehicle may be in one of them
+        for partition in self._partitions.values():
+            if vehicle := partition.search_by_id(license_plate):
+                return vehicle
+        if len(self._partitions) < len(self._files):
+            self.load_all()
+            return self.search_by_id(license_plate)
+        return None
+    #:
+
+    def get_many(self, license_plates: Iterable[str]) -> GetManyResult:
+        """
+        Same as `VehicleCollection.get_many`. The loaded partitions are
+        probed first; the others are only loaded if some plates weren't
+        found.
+        """
+        plates = list(dict.fromkeys(license_plates))
+        found_in_partitions = {}
+        remaining = plates
+        unloaded = [year for year in sorted(self._files) if year not in self._partitions]
+        for year in [*self._partitions, *unloaded]:
+            if not remaining:
+                break
+            result = self._partition(year).get_many(remaining)
+            found_in_partitions.update(result.found)
+            remaining = result.missing
+        found = {plate: found_in_partitions[plate] for plate in plates if plate in found_in_partitions}
+        return GetManyResult(found, remaining)
+    #:
+
+    def search(
+            self,
+            find_fn,
+            start: datetime.date | None = None,
+            end: datetime.date | None = None,
+    ):
+        """
+        Vehicles for which `find_fn` is true. If `start` (or `end`) is
+        given, only vehicles registered since `start` (or until `end`)
+        are considered, and only their partitions are loaded.
+        """
+        for vehicle in self._vehicles_between(start, end):
+            if (
+                    (start is None or vehicle.date >= start)
+                    and (end is None or vehicle.date <= end)
+                    and find_fn(vehicle)
+            ):
+                yield vehicle
+    #:
+
+    def search_by_date(
+            self,
+            start: datetime.date | None,
+            end: datetime.date | None,
+    ) -> list[Vehicle]:
+        """
+        Vehicles registered between `start` and `end` (inclusive),
+        sorted by date. `None` means no limit.
+        """
+        vehicles = []
+        for year in self.partitions_between(start, end):
+            vehicles.extend(self._partition(year).search_by_date(start, end))
+        return vehicles
+    #:
+
+    def search_by_year(self, year: int) -> list[Vehicle]:
+        return self.search_by_date(datetime.date(year, 1, 1), datetime.date(year, 12, 31))
+    #:
+
+    def search_by_make(
+            self,
+            make: str,
+            start: datetime.date | None = None,
+            end: datetime.date | None = None,
+    ) -> list[Vehicle]:
+        """
+        Vehicles of `make` (ignoring case), registered between `start`
+        and `end` if given.
+        """
+        return self._search_partitions('search_by_make', (make,), start, end)
+    #:
+
+    def search_by_make_model(
+            self,
+            make: str,
+            model: str,
+            start: datetime.date | None = None,
+            end: datetime.date | None = None,
+    ) -> list[Vehicle]:
+        return self._search_partitions('search_by_make_model', (make, model), start, end)
+    #:
+
+    def __iter__(self):
+        self.load_all()
+        for year in sorted(self._partitions):
+            yield from self._partitions[year]
+    #:
+
+    def __len__(self) -> int:
+        return (
+            sum(stats['count'] for year, stats in self._stats.items() if year not in self._partitions)
+            + sum(len(partition) for partition in self._partitions.values())
+        )
+    #:
+
+    def remove_by_id(self, license_plate: str) -> Vehicle | None:
+        self.load_all()
+        for year, partition in self._partitions.items():
+            if vehicle := partition.remove_by_id(license_plate):
+                self._dirty.add(year)
+                return vehicle
+        return None
+    #:
+
+    def memory_usage(self, deep = True) -> dict:
+        """
+        Bytes used by the partitions loaded in memory (partitions not
+        loaded use no memory), broken down as described in
+        `utils.memory_usage_report`. Indexes: 'partitions' (the indexes
+        of all loaded partitions) and 'manifest' (the in memory copy of
+        the manifest and the set of dirty partitions).
+        """
+        partitions = self._partitions.values()
+        return memory_usage_report(
+            itertools.chain.from_iterable(partitions),
+            indexes = {
+                'partitions': sum(
+                    sum(partition.memory_usage(deep = False)['indexes'].values())
+                    for partition in partitions
+                ),
+                'manifest': sum(
+                    sys.getsizeof(container)
+                    for container in (self._files, self._stats, self._partitions, self._dirty)
+                ),
+            },
+            deep = deep,
+        )
+    #:
+
+    @property
+    def loaded_partitions(self) -> list[int]:
+        return sorted(self._partitions)
+    #:
+
+    @property
+    def dirty_partitions(self) -> list[int]:
+        return sorted(self._dirty)
+    #:
+
+    def _search_partitions(
+            self,
+            method_name: str,
+            args: tuple,
+            start: datetime.date | None,
+            end: datetime.date | None,
+    ) -> list[Vehicle]:
+        vehicles = []
+        for year in self.partitions_between(start, end):
+            vehicles.extend(
+                vehicle
+                for vehicle in getattr(self._partition(year), method_name)(*args)
+                if (start is None or vehicle.date >= start) and (end is None or vehicle.date <= end)
+            )
+        return vehicles
+    #:
+
+    def _vehicles_between(self, start: datetime.date | None, end: datetime.date | None):
+        for year in self.partitions_between(start, end):
+            yield from self._partition(year)
+    #:
+
+    def _plate_years(self) -> dict[str, int]:
+        return {
+            vehicle.license_plate: year
+            for year, partition in self._partitions.items()
+            for vehicle in partition
+        }
+    #:
+
+    def _partition(self, year: int, create = False) -> VehicleCollection | None:
+        """
+        Returns the partition of `year`, loading it from disk if needed.
+        If the partition doesn't exist, returns `None` or, if `create`
+        is `True`, a new empty partition.
+        """
+        if year in self._partitions:
+            return self._partitions[year]
+        if year in self._files:
+            partition = _load_partition(str(self._dir / self._files[year]))
+        elif create:
+            partition = VehicleCollection()
+        else:
+            return None
+        self._partitions[year] = partition
+        return partition
+    #:
+
+    def _partition_file_name(self, year: int) -> str:
+        return f'vehicles_{year:04d}.csv'
+    #:
+
+    def _write_manifest(self):
+        partitions = []
+        for year in sorted(self._files):
+            stats = self._stats[year]
+            partitions.append({
+                'year': year,
+                'file': self._files[year],
+                'count': stats['count'],
+                'min_date': stats['min_date'].isoformat(),
+                'max_date': stats['max_date'].isoformat(),
+            })
+        manifest = {'partitions': partitions}
+        path = self._dir / MANIFEST_NAME
+        tmp_path = path.with_name(f'{path.name}.tmp')
+        with open(tmp_path, 'wt', encoding = 'UTF-8') as file:
+            json.dump(manifest, file, indent = 2)
+        os.replace(tmp_path, path)
+    #:
+
+    def _dump(self):
+        for vehicle in self:
+            print(vehicle)
+    #:
+#:
+
+def _load_partition(csv_path: str) -> VehicleCollection:
+    return VehicleCollection.from_csv(csv_path)
+#:
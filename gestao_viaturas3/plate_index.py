@@ -0,0 +1,158 @@
+"""
+A positional index over license plates (`DD-LL-DD`) to answer
+partial plate queries like '??-XY-??' or '10-??-2?', where '?' stands
+for any character. Every vehicle gets a slot number and, for each of
+the six plate characters, the index keeps one bitset per possible
+character: the bitset for ('X' at position 3) has the bits of the
+slots whose plate has an 'X' there. A query intersects (ANDs) the
+bitsets of its known characters, so it never scans the plates. This
+module provides:
+
+- `PlateIndex`: the index (usable in `record_store.StoreSchema.indexes`)
+
+- `validate_plate_pattern`: checks a partial plate
+
+"""
+
+import re
+import string
+import sys
+
+
+__all__ = [
+    'PlateIndex',
+    'validate_plate_pattern',
+    'WILDCARD',
+]
+
+
+WILDCARD = '?'
+# Position of each character in a plate and the characters allowed there
+PLATE_POSITIONS = (
+    (0, string.digits),
+    (1, string.digits),
+    (3, string.ascii_uppercase),
+    (4, string.ascii_uppercase),
+    (6, string.digits),
+    (7, string.digits),
+)
+# Bitsets grow (at least) by this many slots
+MIN_GROWTH = 1024
+
+
+def validate_plate_pattern(pattern: str) -> bool:
+    return bool(re.fullmatch(r'[0-9?]{2}-[A-Z?]{2}-[0-9?]{2}', pattern))
+#:
+
+class PlateIndex:
+    """
+    Bitsets are `bytearray`s (bit `slot % 8` of byte `slot // 8`), so
+    adding or removing a plate sets or clears six bits. Slots of
+    removed plates are reused. Queries convert the bitsets to `int`s,
+    whose `&` runs in C over whole machine words.
+    """
+    def __init__(self):
+        # (position, {character: bitset}) for each plate character
+        self._positions = tuple(
+            (pos, {char: bytearray() for char in chars})
+            for pos, chars in PLATE_POSITIONS
+        )
+        self._capacity = 0                # slots available in each bitset
+        self._recs: list = []             # slot -> record (or None, if free)
+        self._slots: dict[str, int] = {}  # plate -> slot
+        self._free: list[int] = []
+    #:
+
+    def add(self, plate: str, rec):
+        if self._free:
+            slot = self._free.pop()
+            self._recs[slot] = rec
+        else:
+            slot = len(self._recs)
+            self._recs.append(rec)
+            if slot >= self._capacity:
+                self._grow()
+        self._slots[plate] = slot
+        byte, bit = divmod(slot, 8)
+        mask = 1 << bit
+        for pos, bitsets in self._positions:
+            bitsets[plate[pos]][byte] |= mask
+    #:
+
+    def remove(self, plate: str, rec):
+        slot = self._slots.pop(plate)
+        byte, bit = divmod(slot, 8)
+        mask = ~(1 << bit) & 0xFF
+        for pos, bitsets in self._positions:
+            bitsets[plate[pos]][byte] &= mask
+        self._recs[slot] = None
+        self._free.append(slot)
+    #:
+
+    def clear(self):
+        for bitset in self._all_bitsets():
+            bitset.clear()
+        self._capacity = 0
+        self._recs.clear()
+        self._slots.clear()
+        self._free.clear()
+    #:
+
+    def match(self, pattern: str) -> list:
+        """
+        Records whose plate matches `pattern` (eg, '10-??-2?'), in slot
+        order. Raises `ValueError` if `pattern` isn't a valid partial
+        plate.
+        """
+        if not validate_plate_pattern(pattern):
+            raise ValueError(f"Padrão de matrícula inválido: {pattern}")
+        known = [
+            bitsets[pattern[pos]]
+            for pos, bitsets in self._positions
+            if pattern[pos] != WILDCARD
+        ]
+        if not known:
+            return [rec for rec in self._recs if rec is not None]
+
+        # Sparsest bitsets (more zero bytes) first: the intersection
+        # becomes empty, and stops, sooner
+        known.sort(key = lambda bitset: bitset.count(0), reverse = True)
+        matches = int.from_bytes(known[0], 'little')
+        for bitset in known[1:]:
+            if not matches:
+                return []
+            matches &= int.from_bytes(bitset, 'little')
+
+        recs = self._recs
+        found = []
+        data = matches.to_bytes(self._capacity // 8, 'little')
+        for nonzero in re.finditer(rb'[^\x00]', data):
+            byte_no = nonzero.start()
+            byte = data[byte_no]
+            for bit in range(8):
+                if byte >> bit & 1:
+                    found.append(recs[byte_no * 8 + bit])
+        return found
+    #:
+
+    def memory_usage(self) -> int:
+        return (
+            sum(sys.getsizeof(bitset) for bitset in self._all_bitsets())
+            + sys.getsizeof(self._recs)
+            + sys.getsizeof(self._slots)
+            + sys.getsizeof(self._free)
+        )
+    #:
+
+    def _grow(self):
+        extra = max(self._capacity, MIN_GROWTH) // 8
+        for bitset in self._all_bitsets():
+            bitset.extend(bytes(extra))
+        self._capacity += extra * 8
+    #:
+
+    def _all_bitsets(self):
+        for _, bitsets in self._positions:
+            yield from bitsets.values()
+    #:
+#:
@@ -0,0 +1,92 @@
+"""
+Tests of `ingestion.DropFolderIngestor`, namely plates repeated within
+a file under each import policy.
+"""
+
+import pytest
+
+from ingestion import CHECKPOINT_NAME, DropFolderIngestor
+from vehicles import Vehicle, VehicleCollection
+
+
+BATCH = (
+    '10-XY-20|Opel|Astra|2019-10-15\n'
+    '44-CD-55|Seat|Ibiza|2020-01-02\n'
+    '44-CD-55|Seat|Leon|2020-01-02\n'
+    '55-EF-66|Fiat|Punto|2018-07-08\n'
+)
+
+
+def make_vehicles() -> VehicleCollection:
+    return VehicleCollection([Vehicle('10-XY-20', 'Opel', 'Corsa XL', '2019-10-15')])
+#:
+
+def ingest(dir_path, policy: str, vehicles: VehicleCollection, max_workers = 1) -> list:
+    ingestor = DropFolderIngestor(
+        vehicles,
+        dir_path,
+        policy = policy,
+        max_workers = max_workers,
+        settle_time = 0,
+    )
+    return ingestor.scan()
+#:
+
+
+def test_update_last_line_wins(tmp_path):
+    (tmp_path / 'a.csv').write_text(BATCH, encoding = 'UTF-8')
+    vehicles = make_vehicles()
+    [report] = ingest(tmp_path, 'update', vehicles)
+    assert (report.file, report.inserted, report.updated, report.skipped, report.errors) == ('a.csv', 2, 2, 0, [])
+    assert vehicles.search_by_id('10-XY-20').model == 'Astra'
+    assert vehicles.search_by_id('44-CD-55').model == 'Leon'
+    assert len(vehicles) == 3
+#:
+
+def test_skip_first_line_wins(tmp_path):
+    (tmp_path / 'a.csv').write_text(BATCH, encoding = 'UTF-8')
+    vehicles = make_vehicles()
+    [report] = ingest(tmp_path, 'skip', vehicles)
+    assert (report.inserted, report.updated, report.skipped, report.errors) == (2, 0, 2, [])
+    assert vehicles.search_by_id('10-XY-20').model == 'Corsa XL'
+    assert vehicles.search_by_id('44-CD-55').model == 'Ibiza'
+#:
+
+@pytest.mark.parametrize('batch', [
+    BATCH,
+    BATCH.replace('10-XY-20', '11-XY-20'),     # only the plate repeated in the file
+])
+def test_insert_rejects_the_whole_file(tmp_path, batch):
+    (tmp_path / 'a.csv').write_text(batch, encoding = 'UTF-8')
+    vehicles = make_vehicles()
+    [report] = ingest(tmp_path, 'insert', vehicles)
+    assert (report.inserted, report.updated, report.skipped) == (0, 0, 0)
+    assert [error.line_no for error in report.errors] == [0]
+    assert len(vehicles) == 1
+#:
+
+def test_invalid_lines_are_reported(tmp_path):
+    (tmp_path / 'a.csv').write_text(
+        '66-GH-77|Opel|Corsa|2019-02-30\n'
+        '77-IJ-88|Opel|Corsa|2019-02-28\n',
+        encoding = 'UTF-8',
+    )
+    vehicles = make_vehicles()
+    [report] = ingest(tmp_path, 'skip', vehicles)
+    assert report.inserted == 1
+    assert [error.line_no for error in report.errors] == [1]
+#:
+
+def test_files_are_ingested_once(tmp_path):
+    (tmp_path / 'a.csv').write_text(BATCH, encoding = 'UTF-8')
+    (tmp_path / 'b.csv').write_text('66-GH-77|Renault|Clio|2021-03-08\n', encoding = 'UTF-8')
+    vehicles = make_vehicles()
+    reports = ingest(tmp_path, 'update', vehicles, max_workers = 2)
+    assert [(report.file, report.inserted) for report in reports] == [('a.csv', 2), ('b.csv', 1)]
+    assert vehicles.search_by_id('44-CD-55').model == 'Leon'
+    assert (tmp_path / CHECKPOINT_NAME).exists()
+
+    ingestor = DropFolderIngestor(vehicles, tmp_path, policy = 'update', settle_time = 0)
+    assert ingestor.ingested_files == ['a.csv', 'b.csv']
+    assert ingestor.scan() == []
+#:
@@ -0,0 +1,94 @@
+"""
+Tests of `partitioned_vehicles.PartitionedVehicleCollection`: saving
+and reopening a registry through its manifest.
+"""
+
+import datetime
+import json
+
+import pytest
+
+from partitioned_vehicles import MANIFEST_NAME, PartitionedVehicleCollection
+from vehicles import DuplicateValue, ImportReport, Vehicle
+
+
+def make_vehicles() -> list[Vehicle]:
+    return [
+        Vehicle('10-XY-20', 'Opel', 'Corsa XL', '2019-10-15'),
+        Vehicle('20-PQ-15', 'Mercedes', '300SL', '2017-05-31'),
+        Vehicle('22-XQ-15', 'Porsche', 'XL', '2017-01-02'),
+        Vehicle('33-AB-44', 'Renault', 'Clio', '2021-03-08'),
+    ]
+#:
+
+def read_manifest(dir_path) -> dict:
+    with open(dir_path / MANIFEST_NAME, 'rt', encoding = 'UTF-8') as file:
+        return json.load(file)
+#:
+
+
+def test_create_and_open(tmp_path):
+    PartitionedVehicleCollection.create(tmp_path, make_vehicles())
+    manifest = read_manifest(tmp_path)
+    assert [
+        (partition['year'], partition['count'], partition['min_date'], partition['max_date'])
+        for partition in manifest['partitions']
+    ] == [
+        (2017, 2, '2017-01-02', '2017-05-31'),
+        (2019, 1, '2019-10-15', '2019-10-15'),
+        (2021, 1, '2021-03-08', '2021-03-08'),
+    ]
+    for partition in manifest['partitions']:
+        assert (tmp_path / partition['file']).exists()
+
+    vehicles = PartitionedVehicleCollection.open(tmp_path)
+    assert len(vehicles) == 4
+    assert vehicles.loaded_partitions == []
+    assert sorted(vehicle.license_plate for vehicle in vehicles.search_by_year(2017)) == ['20-PQ-15', '22-XQ-15']
+    assert vehicles.loaded_partitions == [2017]
+    vehicle = vehicles.search_by_id('33-AB-44')
+    assert (vehicle.make, vehicle.model, vehicle.date) == ('Renault', 'Clio', datetime.date(2021, 3, 8))
+#:
+
+def test_create_rejects_repeated_plates(tmp_path):
+    with pytest.raises(DuplicateValue):
+        PartitionedVehicleCollection.create(
+            tmp_path,
+            [*make_vehicles(), Vehicle('10-XY-20', 'Fiat', 'Punto', '2005-06-07')],
+        )
+#:
+
+def test_get_many(tmp_path):
+    PartitionedVehicleCollection.create(tmp_path, make_vehicles())
+    vehicles = PartitionedVehicleCollection.open(tmp_path)
+    result = vehicles.get_many(['22-XQ-15', '99-ZZ-99', '10-XY-20', '99-ZZ-99'])
+    assert list(result.found) == ['22-XQ-15', '10-XY-20']
+    assert result.missing == ['99-ZZ-99']
+#:
+
+def test_save_after_changes(tmp_path):
+    PartitionedVehicleCollection.create(tmp_path, make_vehicles())
+    vehicles = PartitionedVehicleCollection.open(tmp_path)
+    report = vehicles.bulk_import(
+        [
+            Vehicle('44-CD-55', 'Seat', 'Ibiza', '2019-12-24'),
+            Vehicle('10-XY-20', 'Opel', 'Astra', '2019-10-15'),
+        ],
+        'update',
+    )
+    assert report == ImportReport(1, 1, 0)
+    vehicles.remove_by_id('33-AB-44')
+    assert vehicles.dirty_partitions == [2019, 2021]
+    vehicles.save()
+    assert vehicles.dirty_partitions == []
+
+    manifest = read_manifest(tmp_path)
+    assert [(partition['year'], partition['count']) for partition in manifest['partitions']] == [(2017, 2), (2019, 2)]
+    assert manifest['partitions'][1]['max_date'] == '2019-12-24'
+
+    vehicles = PartitionedVehicleCollection.open(tmp_path)
+    assert len(vehicles) == 4
+    assert vehicles.search_by_id('10-XY-20').model == 'Astra'
+    assert vehicles.search_by_id('33-AB-44') is None
+    assert sorted(vehicle.license_plate for vehicle in vehicles.search_by_year(2019)) == ['10-XY-20', '44-CD-55']
+#:
@@ -4,15 +4,68 @@ stored in a CSV file. This modules provides two types to represent
 vehicles in memory:
 
     - `Vehicle`: a product in memory
-    - `VehicleCollection`: manages a collection of vehicles in memory
+    - `VehicleCollection`: manages a collection of vehicles in memory (a
+      `record_store.RecordStore` of vehicles keyed by license plate)
+    - `LoadError`: a line rejected by `VehicleCollection.bulk_load`
 """
 
+from collections import namedtuple
 import datetime
+import mmap
 import re
-from typing import Iterable, TextIO
+import sys
+from typing import TextIO
+
+from gestao_comum.record_codec import RecordCodec, Field
+from gestao_comum import record_store
+from gestao_comum.record_store import (
+    RecordStore,
+    StoreSchema,
+    hash_index,
+    sorted_index,
+    ImportReport,
+    GetManyResult,
+    IMPORT_POLICIES,
+    DuplicateValue,
+    InvalidLine,
+)
+from plate_index import PlateIndex, validate_plate_pattern
+from fuzzy_index import fuzzy_index
+from inspections import InspectionIndex, InspectionDue, next_inspection
+from fleet_columns import FleetColumns
 
 
 CSV_DELIM = '|'
+COMMENT_PREFIXES = ('##', '//')
+# Maximum edit distance for fuzzy make/model searches
+FUZZY_DISTANCE = 2
+# Default and maximum windows, in days, for upcoming inspections
+INSPECTION_WINDOW_DAYS = 30
+MAX_INSPECTION_WINDOW_DAYS = 10 * 366
+# Columns vehicles can be sorted by, and the `SortedIndex` with the
+# vehicles in the order of each one
+SORT_INDEXES = {
+    'license_plate': 'plate_order',
+    'make': 'make_order',
+    'model': 'model_order',
+    'date': 'date',
+}
+
+LICENSE_PLATE_RE = re.compile(r'[0-9]{2}-[A-Z]{2}-[0-9]{2}')
+
+# A whole line of the CSV file with a (typical) valid vehicle. It
+# accepts a subset of the lines accepted by `Vehicle`: lines it doesn't
+# match (eg, makes with non ASCII letters, or comments) are handled by
+# the regular parser.
+BULK_LINE_RE = re.compile(
+    rb'^([0-9]{2}-[A-Z]{2}-[0-9]{2})'
+    rb'\|([A-Za-z0-9]+(?: [A-Za-z0-9]+)*)'
+    rb'\|([A-Za-z0-9]+(?: [A-Za-z0-9]+)*)'
+    rb'\|([0-9]{4}-[0-9]{2}-[0-9]{2})\r?$',
+    re.MULTILINE,
+)
+
+LoadError = namedtuple('LoadError', 'line_no line error')
 
 
 
@@ -48,22 +101,13 @@ class Vehicle:
 
     @classmethod
     def from_csv(cls, csv: str, csv_delim = CSV_DELIM) -> 'Vehicle':
-        attrs = csv.split(csv_delim)
-        return cls(
-            license_plate = attrs[0],
-            make = attrs[1],
-            model = attrs[2],
-            date = attrs[3],
-        )
+        codec = VEHICLE_CODEC if csv_delim == CSV_DELIM else VEHICLE_CODEC.for_delim(csv_delim)
+        return cls(*codec.parse(csv))
     #:
 
     def to_csv(self, csv_delim = CSV_DELIM) -> str:
-        return csv_delim.join((
-            self.license_plate,
-            self.make,
-            self.model,
-            str(self.date),
-        ))
+        codec = VEHICLE_CODEC if csv_delim == CSV_DELIM else VEHICLE_CODEC.for_delim(csv_delim)
+        return codec.format(self)
     #:
 
     @property
@@ -71,6 +115,14 @@ class Vehicle:
         return self.date.year
     #:
 
+    def next_inspection(self, on_or_after: datetime.date | None = None) -> datetime.date:
+        """
+        Date of the next periodic inspection (on or after
+        `on_or_after`, by default today).
+        """
+        return next_inspection(self.date, on_or_after or datetime.date.today())
+    #:
+
     def __str__(self):
         return f'Viatura[matricula: {self.license_plate} | {self.make} {self.model}]'
     #:
@@ -82,7 +134,7 @@ class Vehicle:
 
     @staticmethod
     def validate_license_plate(matricula: str) -> bool:
-        return bool(re.fullmatch(r'[0-9]{2}-[A-Z]{2}-[0-9]{2}', matricula))
+        return bool(LICENSE_PLATE_RE.fullmatch(matricula))
     #:
 
     @staticmethod
@@ -123,88 +175,321 @@ class Vehicle:
     #:
 #:
 
+VEHICLE_CODEC = RecordCodec(
+    (
+        Field('license_plate', str, strip = False),
+        # Makes and models repeat across many rows, so each distinct
+        # value is interned (stored once)
+        Field('make', str, converter = sys.intern, strip = False),
+        Field('model', str, converter = sys.intern, strip = False),
+        # `Vehicle` receives the date as an ISO string and converts it
+        Field('date', str, formatter = datetime.date.isoformat, strip = False),
+    ),
+    CSV_DELIM,
+)
+
+
 class InvalidAttr(ValueError):
     """
     Invalid Attribute.
     """
 #:
 
-class VehicleCollection:
-    def __init__(self, vehicles: Iterable[Vehicle] = ()):
-        self._vehicles: dict[str, Vehicle] = {}
-        for vehicle in vehicles:
-            self._vehicles[vehicle.license_plate] = vehicle
-    #:
+class VehicleCollection(RecordStore):
+    schema = StoreSchema(
+        record_type = Vehicle,
+        key = 'license_plate',
+        codec = VEHICLE_CODEC,
+        indexes = {
+            # Makes and models are looked up ignoring case
+            'make': hash_index('make', convert_fn = str.casefold),
+            'make_model': hash_index('make', 'model', convert_fn = str.casefold),
+            'plate': PlateIndex,
+            # Distinct makes and models, for searches with typos
+            'make_fuzzy': fuzzy_index('make', convert_fn = str.casefold),
+            'model_fuzzy': fuzzy_index('model', convert_fn = str.casefold),
+            'date': sorted_index('date', datetime.date.toordinal),
+            'inspection': InspectionIndex,
+            # Columns of the fleet reports (see `analytics`)
+            'fleet_columns': FleetColumns,
+            # Sort orders of the listings (see `sorted_by`); makes and
+            # models are sorted ignoring case
+            'plate_order': sorted_index('license_plate'),
+            'make_order': sorted_index('make', str.casefold),
+            'model_order': sorted_index('model', str.casefold),
+        },
+        comment_prefixes = COMMENT_PREFIXES,
+        duplicate_msg = 'Viatura com matricula {} já adicionada',
+    )
 
     @classmethod
-    def from_csv(cls, csv_path: str, csv_delim = CSV_DELIM, encoding = 'UTF-8') -> 'VehicleCollection':
-        vehicles = VehicleCollection()
-        with open(csv_path, 'rt', encoding = encoding) as file:
-            for line in relevant_lines(file):
-                vehicles.append(Vehicle.from_csv(line, csv_delim))
+    def bulk_load(
+            cls,
+            csv_path: str,
+            encoding = 'UTF-8',
+            duplicates: list[Vehicle] | None = None,
+    ) -> tuple['VehicleCollection', list[LoadError]]:
+        """
+        A faster `from_csv` for large files. The file is memory mapped
+        and its lines are matched, and validated, by a single pass of
+        `BULK_LINE_RE` over the bytes. Lines it doesn't match (or whose
+        date is invalid) are parsed like `from_csv` does. Thus, the
+        collection is the same `from_csv` loads but, instead of raising
+        an exception at the first invalid line (or duplicate plate), the
+        line is skipped and reported in the returned list of errors.
+        If `duplicates` is a list, the vehicles whose plate repeats an
+        earlier line are appended to it (in file order) instead of being
+        reported as errors, eg, to apply an import policy to them.
+        `encoding` must be ASCII compatible (eg, UTF-8 or Latin-1).
+        """
+        store = cls()
+        errors: list[LoadError] = []
+        with open(csv_path, 'rb') as file:
+            if file.seek(0, 2) == 0:
+                return store, errors
+            with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                with store._lock:
+                    store._bulk_load(data, encoding, errors, duplicates)
+        return store, errors
+    #:
+
+    def _bulk_load(
+            self,
+            data: mmap.mmap,
+            encoding: str,
+            errors: list[LoadError],
+            duplicates: list[Vehicle] | None,
+    ):
+        # Only called on a new (and thus unshared and unindexed) store,
+        # so vehicles go straight into `_records`
+        records = self._records
+        new_vehicle = Vehicle.__new__
+        from_iso = datetime.date.fromisoformat
+        # Makes, models and dates repeat a lot: each distinct value is
+        # decoded once (and shared, like the interned strings that
+        # `VEHICLE_CODEC` produces)
+        texts: dict[bytes, str] = {}
+        dates: dict[bytes, datetime.date] = {}
+        line_no = 0      # number of the line before `pos`
+        pos = 0          # start of the first line not yet loaded
+        for match in BULK_LINE_RE.finditer(data):
+            if match.start() > pos:
+                line_no = self._load_slow(
+                    data[pos:match.start()], line_no, encoding, errors, duplicates
+                )
+            pos = match.end() + 1
+            line_no += 1
+            plate, make, model, date = match.groups()
+            plate = plate.decode()
+            if date in dates:
+                date = dates[date]
+            else:
+                try:
+                    # The regex validated everything but the date
+                    date = dates[date] = from_iso(date.decode())
+                except ValueError:
+                    line_no = self._load_slow(
+                        match.group(), line_no - 1, encoding, errors, duplicates
+                    )
+                    continue
+            if plate in records and duplicates is None:
+                errors.append(LoadError(
+                    line_no,
+                    match.group().decode(encoding).strip(),
+                    DuplicateValue(self.schema.duplicate_msg.format(plate)),
+                ))
+                continue
+            if make not in texts:
+                texts[make] = sys.intern(make.decode())
+            if model not in texts:
+                texts[model] = sys.intern(model.decode())
+            vehicle = new_vehicle(Vehicle)
+            vehicle.__dict__.update(
+                license_plate = plate,
+                make = texts[make],
+                model = texts[model],
+                date = date,
+            )
+            if plate in records:
+                duplicates.append(vehicle)
+            else:
+                records[plate] = vehicle
+        if pos < len(data):
+            self._load_slow(data[pos:], line_no, encoding, errors, duplicates)
+    #:
+
+    def _load_slow(
+            self,
+            text: bytes,
+            line_no: int,
+            encoding: str,
+            errors: list[LoadError],
+            duplicates: list[Vehicle] | None,
+    ) -> int:
+        """
+        Loads the lines in `text` (which follow line `line_no`) like
+        `from_csv`. Returns the number of the last line.
+        """
+        parse = self.schema.codec.parse
+        for line in text.decode(encoding).split('\n'):
+            line_no += 1
+            line = line.strip()
+            if not line or line.startswith(self.schema.comment_prefixes):
+                continue
+            try:
+                vehicle = Vehicle(*parse(line))
+                if duplicates is not None and vehicle.license_plate in self._records:
+                    duplicates.append(vehicle)
+                else:
+                    self.append(vehicle)
+            except (ValueError, DuplicateValue) as ex:
+                errors.append(LoadError(line_no, line, ex))
+        # `text` ends with the terminator of its last line, which isn't
+        # followed by another line
+        return line_no - 1 if text.endswith(b'\n') else line_no
+    #:
+
+    def search_by_make(self, make: str) -> list[Vehicle]:
+        return self.search_by('make', make)
+    #:
+
+    def search_by_plate_pattern(self, pattern: str) -> list[Vehicle]:
+        """
+        Vehicles whose license plate matches `pattern`, where '?' stands
+        for any character (eg, '??-XY-??' or '10-??-2?').
+        """
+        return self.index('plate').match(pattern)
+    #:
+
+    def search_by_make_model(self, make: str, model: str) -> list[Vehicle]:
+        return self.search_by('make_model', (make, model))
+    #:
+
+    def similar_makes(self, make: str, max_distance = FUZZY_DISTANCE) -> list[tuple[str, int]]:
+        """
+        `(make, distance)` pairs for the (casefolded) makes within edit
+        distance `max_distance` of `make`, closest first.
+        """
+        return self.index('make_fuzzy').near(make, max_distance)
+    #:
+
+    def similar_models(self, model: str, max_distance = FUZZY_DISTANCE) -> list[tuple[str, int]]:
+        return self.index('model_fuzzy').near(model, max_distance)
+    #:
+
+    def search_by_make_fuzzy(
+            self,
+            make: str,
+            model: str | None = None,
+            max_distance = FUZZY_DISTANCE,
+    ) -> list[Vehicle]:
+        """
+        Vehicles whose make (and model, if given) is within edit
+        distance `max_distance` of `make` (and `model`), ignoring case.
+        Vehicles of the closest makes (and models) come first.
+        """
+        makes = self.similar_makes(make, max_distance)
+        if model is None:
+            ranked = [(distance, make, None) for make, distance in makes]
+        else:
+            models = self.similar_models(model, max_distance)
+            ranked = sorted(
+                (make_distance + model_distance, make, model)
+                for make, make_distance in makes
+                for model, model_distance in models
+            )
+        vehicles = []
+        for _, make, model in ranked:
+            if model is None:
+                vehicles.extend(self.search_by_make(make))
+            else:
+                vehicles.extend(self.search_by_make_model(make, model))
         return vehicles
     #:
 
-    def export_to_csv(self, csv_path: str, csv_delim = CSV_DELIM, encoding = 'UTF-8'):
-        if len(self._vehicles) == 0:
-            raise ValueError("Coleccção vazia")
-        with open(csv_path, 'wt', encoding = encoding) as file:
-            for vehicle in self._vehicles.values():
-                print(vehicle.to_csv(csv_delim), file=file)
+    def count_by_make(self, make: str) -> int:
+        return self.count_by('make', make)
     #:
 
-    def append(self, viat: Vehicle):
-        if self.search_by_id(viat.license_plate):
-            raise DuplicateValue(f'Viatura com matricula {viat.license_plate} já adicionada')
-        self._vehicles[viat.license_plate] = viat
-    # :
+    def count_by_make_model(self, make: str, model: str) -> int:
+        return self.count_by('make_model', (make, model))
+    #:
 
-    def search_by_id(self, license_plate: str) -> Vehicle | None:
-        return self._vehicles.get(license_plate)
+    def search_by_date(
+            self,
+            start: datetime.date | None,
+            end: datetime.date | None,
+    ) -> list[Vehicle]:
+        """
+        Vehicles registered between `start` and `end` (inclusive),
+        sorted by date. `None` means no limit.
+        """
+        return self.search_range('date', start, end)
     #:
 
-    def search(self, find_fn):
-        for vehicle in self._vehicles.values():
-            if find_fn(vehicle):
-                yield vehicle
+    def search_by_year(self, year: int) -> list[Vehicle]:
+        return self.search_by_date(datetime.date(year, 1, 1), datetime.date(year, 12, 31))
     #:
 
-    def __iter__(self):
-        for vehicle in self._vehicles.values():
-            yield vehicle
+    def sorted_by(self, *columns: str) -> list[Vehicle]:
+        """
+        Vehicles sorted by `columns` (of `SORT_INDEXES`), the first being
+        the most significant; a column prefixed with '-' sorts in
+        descending order (eg, `sorted_by('make', '-date')`). Ties are
+        sorted by license plate. The order of each column is kept by an
+        index built on first use (see `RecordStore.sorted_by`).
+        """
+        index_names = []
+        for column in columns:
+            name = column.lstrip('-')
+            if name not in SORT_INDEXES:
+                raise ValueError(f"Coluna {name} inválida (deve ser uma de {tuple(SORT_INDEXES)})")
+            index_names.append(column[:-len(name)] + SORT_INDEXES[name])
+            if name == 'license_plate':
+                # Plates are unique, so any other column is irrelevant
+                break
+        return super().sorted_by(*index_names)
     #:
 
-    def __len__(self) -> int:
-        return len(self._vehicles)
+    def inspections_due(self, start: datetime.date, end: datetime.date) -> list[InspectionDue]:
+        """
+        Inspections due between `start` and `end` (inclusive), sorted by
+        due date. See `inspections.InspectionIndex`.
+        """
+        return self.index('inspection').due_between(start, end)
     #:
 
-    def remove_by_id(self, license_plate: str) -> Vehicle | None:
-        vehicle = self._vehicles.get(license_plate)
-        if vehicle:
-            del self._vehicles[license_plate]
-        return vehicle
+    def inspections_due_within(
+            self,
+            days = INSPECTION_WINDOW_DAYS,
+            today: datetime.date | None = None,
+    ) -> list[InspectionDue]:
+        """
+        Inspections due in the next `days` days (`today` included), or
+        until the last representable date.
+        """
+        today = today or datetime.date.today()
+        if days > (datetime.date.max - today).days:
+            return self.inspections_due(today, datetime.date.max)
+        return self.inspections_due(today, today + datetime.timedelta(days = days - 1))
     #:
 
-    def _dump(self):
-        for viat in self._vehicles.values():
-            print(viat)
+    def fleet_columns(self) -> FleetColumns:
+        """
+        The registration date, make and model columns of the fleet
+        reports (see `analytics.FleetAnalytics.from_columns`), kept up to
+        date as vehicles are added and removed.
+        """
+        return self.index('fleet_columns')
     #:
 #:
 
 def relevant_lines(file: TextIO):
-    for line in file:
-        line = line.strip()
-        if len(line) == 0:
-            continue
-        if line[:2] in ('##', '//'):
-            continue
-        yield line
+    return record_store.relevant_lines(file, COMMENT_PREFIXES)
 #:
 
-class DuplicateValue(Exception):
-    """
-    If there is a duplicate product in a ProductCollection.
-    """
+def parsed_records(file: TextIO, make_record):
+    return record_store.parsed_records(file, make_record, COMMENT_PREFIXES)
 #:
 
 """